@@ -422,10 +422,7 @@ class AddAssetWidget(QtWidgets.QDialog):
         # Description
         description = self.description_editor.text()
         description = base64.b64encode(description)
-        db.setValue(source, u'description', description)
-
-        if self._update:
-            self.descriptionUpdated.emit(self.description_editor.text())
+        values = {u'description': description}
 
         for k in (
             u'shotgun_type',
@@ -440,10 +437,13 @@ class AddAssetWidget(QtWidgets.QDialog):
         ):
             w = getattr(self, k + '_editor')
             if 'shotgun_type' in k.lower():
-                v = w.currentText()
+                values[k] = w.currentText()
             else:
-                v = w.text()
-            db.setValue(source, k, v)
+                values[k] = w.text()
+        db.setValues({source: values})
+
+        if self._update:
+            self.descriptionUpdated.emit(self.description_editor.text())
 
 
     @QtCore.Slot(unicode)
@@ -18,10 +18,41 @@ BookmarkDB instance.
     source = u'//server/myjob/data/shots/sh0010/scene/myscene.ma'
     value = db.value(source, u'description')
 
+The columns read for every file item, :const:`.PREFETCH_KEYS`, can be loaded
+for all rows at once with :func:`.BookmarkDB.prefetch`, and read from memory
+using :func:`.BookmarkDB.cached_value`.
+
+All statements are parameterised, so SQLite can reuse the parsed statements,
+and the rows read by :func:`.BookmarkDB.value` are cached per connection.
+The cached rows are discarded when another connection changes the database.
+Use :func:`.BookmarkDB.setValues` to set several columns, or the columns of
+many rows at once.
+
+The rows are keyed by integers derived from the path hashes, see
+:func:`.get_key`. The notes are kept in a separate `notes` table, together
+with the number of outstanding todos. The database is saved to
+:const:`.DATABASE`, and the values set in the database of earlier versions
+are copied when they change, see :const:`.SCHEMA_VERSION` and
+:func:`.BookmarkDB.sync`.
+
+Values set interactively, like descriptions, flags and notes, should be set
+with :func:`.BookmarkDB.queue_value`. The values are written by the
+bookmark's :class:`.Writer` thread, which collects the writes made in quick
+succession and commits them in a single transaction. Until then, the queued
+values are returned by :func:`.BookmarkDB.value`. Use
+:func:`.BookmarkDB.flush` to wait for the queued values to be written.
+
 """
 from contextlib import contextmanager
+import os
 import time
+import collections
+import threading
 import platform
+import struct
+import binascii
+import base64
+import json
 import sqlite3
 from sqlite3 import Error
 
@@ -34,7 +65,6 @@ from . import common
 KEYS = {
     u'data': (
         u'description',
-        u'notes',
         u'flags',
         u'thumbnail_stamp',
         u'user',
@@ -46,6 +76,12 @@ KEYS = {
         u'cut_out',
         u'url1',
         u'url2',
+        u'mtime',
+        u'size',
+    ),
+    u'notes': (
+        u'notes',
+        u'todo_count',
     ),
     u'info': (
         u'server',
@@ -74,10 +110,72 @@ KEYS = {
         u'url2',
     ),
 }
-"""Database table/column structure definition."""
+"""Database table/column structure definition.
+
+The columns of the `notes` table can also be accessed as columns of the
+`data` table.
+
+"""
+
+SCHEMA_VERSION = 2
+"""The version of the database layout, stored as the `user_version` of the
+database.
+
+Version 1 keyed the `data` rows by the hexadecimal path hashes and stored
+the notes in the `data` table. Version 2 uses integer keys, stores the notes
+and the number of outstanding todos in the `notes` table, and adds the
+`mtime` and `size` columns. They store the modification time and size of the
+source file a thumbnail was generated from, and are used to tell if the
+thumbnail is out of date.
+
+Earlier versions of Bookmarks can't read the version 2 layout, so it is
+saved to a separate file, :const:`.DATABASE`. The version 1 database is
+left untouched for the earlier versions. The rows they change are copied
+again whenever the version 1 database is modified, and replace the version 2
+values of the same rows.
+
+"""
+
+DATABASE = u'bookmark.v2.db'
+"""The name of the database file in the bookmark's ``.bookmark`` folder."""
+
+V1_DATABASE = u'bookmark.db'
+"""The name of the version 1 database file."""
+
+PREFETCH_KEYS = (u'description', u'flags', u'todo_count')
+"""The columns of the `data` table loaded by `BookmarkDB.prefetch()`."""
+
+CHECK_INTERVAL = 1.0
+"""The number of seconds the cached and prefetched rows are used before
+checking if another connection has changed the database."""
+
+ROW_CACHE_SIZE = 4096
+"""The maximum number of rows cached by `BookmarkDB.value()`."""
+
+STATEMENT_CACHE_SIZE = 128
+"""The number of parsed statements kept by each connection."""
+
+WRITE_DELAY = 0.25
+"""The number of seconds a `Writer` waits for more writes before committing."""
+
+RETRY_DELAY = 1.0
+"""The number of seconds a `Writer` waits before retrying a failed commit."""
+
+RETRIES = 5
+"""The number of times a `Writer` tries to commit the values before they're
+discarded."""
+
+UPSERT = sqlite3.sqlite_version_info >= (3, 24, 0)
+"""Whether the SQLite library supports `INSERT ... ON CONFLICT DO UPDATE`.
+
+Older versions insert the missing rows first and update them separately.
+
+"""
 
 
 DB_CONNECTIONS = {}
+WRITERS = {}
+_writers_lock = threading.Lock()
 
 
 def get_property(key, server=None, job=None, root=None, asset=None, asset_property=False):
@@ -218,6 +316,326 @@ def reset():
     DB_CONNECTIONS = {}
 
 
+def get_writer(path):
+    """Returns the :class:`.Writer` of a database.
+
+    Unlike the controllers, the writers are shared by all threads.
+
+    Args:
+        path (unicode): Path to a `bookmark.db` file.
+
+    """
+    k = path.lower()
+    with _writers_lock:
+        if k not in WRITERS:
+            WRITERS[k] = Writer(path)
+        return WRITERS[k]
+
+
+def flush(timeout=None):
+    """Waits for all writers to write their queued values.
+
+    Returns:
+        bool: `False` if the values weren't written before `timeout`.
+
+    """
+    with _writers_lock:
+        writers = WRITERS.values()
+    t = None if timeout is None else time.time() + timeout
+    for writer in writers:
+        _timeout = None if t is None else max(0.0, t - time.time())
+        if not writer.flush(_timeout):
+            return False
+    return True
+
+
+def shutdown(timeout=None):
+    """Writes the queued values and stops the writer threads."""
+    with _writers_lock:
+        writers = WRITERS.values()
+        WRITERS.clear()
+    for writer in writers:
+        writer.stop(timeout)
+
+
+def get_key(hash):
+    """Returns the integer row id of a hash returned by `common.get_hash()`.
+
+    The key is the first 8 bytes of the md5 digest as a signed 64-bit
+    integer, which SQLite uses as the rowid of the row, instead of keeping a
+    separate index of the hexadecimal hashes.
+
+    Args:
+        hash (str or int): A path hash, or an integer row id.
+
+    Returns:
+        int: The row id, or `None` if `hash` is not a valid hash.
+
+    """
+    if isinstance(hash, (int, long)):
+        return hash
+    hash = hash.strip()
+    if len(hash) == 32:
+        try:
+            return struct.unpack('>q', binascii.unhexlify(hash[:16]))[0]
+        except (TypeError, ValueError):
+            return None
+    try:
+        return int(hash)
+    except ValueError:
+        return None
+
+
+def count_todos(notes):
+    """Returns the number of outstanding todos of an encoded `notes` value."""
+    if not notes:
+        return 0
+    try:
+        d = json.loads(base64.b64decode(notes))
+        return len([k for k in d if d[k][u'text'] and not d[k][u'checked']])
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return 0
+
+
+def _table(table, key):
+    """Returns the name of the table storing the `key` column of `table`.
+
+    Raises:
+        ValueError: If `key` is not a valid column name.
+
+    """
+    if table == u'data' and key in KEYS[u'notes']:
+        return u'notes'
+    if key not in KEYS[table]:
+        raise ValueError(u'Key "{}" is invalid. Expected one of "{}"'.format(
+            key, u'", "'.join(KEYS[table])))
+    return table
+
+
+def _write_rows(_cursor, table, rows):
+    """Sets the columns of several rows.
+
+    The rows setting the same columns are written by a single statement. See
+    :const:`.UPSERT` for the statements used.
+
+    Args:
+        _cursor (sqlite3.Cursor): The cursor used to run the statements.
+        table (unicode): A table name.
+        rows (iterable): `(rowid, values)` tuples, where `values` is a dictionary
+            of column values keyed by column name.
+
+    """
+    groups = collections.OrderedDict()
+    for rowid, values in rows:
+        if not values:
+            continue
+        keys = tuple(k for k in KEYS[table] if k in values)
+        groups.setdefault(keys, []).append((rowid, values))
+
+    for keys, _rows in groups.iteritems():
+        if UPSERT:
+            sql = u'INSERT INTO {table} (id, {keys}) VALUES (?, {params}) ON CONFLICT(id) DO UPDATE SET {update};'.format(
+                table=table,
+                keys=u', '.join(keys),
+                params=u', '.join(u'?' for _ in keys),
+                update=u', '.join(u'{0}=excluded.{0}'.format(k) for k in keys)
+            )
+            _cursor.executemany(
+                sql, [[rowid, ] + [values[k] for k in keys] for rowid, values in _rows])
+            continue
+
+        _cursor.executemany(
+            u'INSERT OR IGNORE INTO {} (id) VALUES (?);'.format(table),
+            [(rowid, ) for rowid, _ in _rows]
+        )
+        _cursor.executemany(
+            u'UPDATE {} SET {} WHERE id=?;'.format(
+                table, u', '.join(u'{}=?'.format(k) for k in keys)),
+            [[values[k] for k in keys] + [rowid, ] for rowid, values in _rows]
+        )
+
+
+class Writer(object):
+    """Writes the values queued by `BookmarkDB.queue_value()` on a separate
+    thread.
+
+    The writes made within :const:`.WRITE_DELAY` seconds of each other are
+    committed in a single transaction, and only the last value set is
+    written when the same column is set more than once. The thread is started
+    by the first queued value.
+
+    Attributes:
+        generation (int): Incremented every time the values are committed.
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.generation = 0
+
+        self._pending = collections.OrderedDict()
+        self._writing = {}
+        self._flushing = 0
+        self._stopped = False
+        self._thread = None
+        self._condition = threading.Condition(threading.Lock())
+
+    def put(self, table, rowid, key, value):
+        """Queues a value to be written."""
+        with self._condition:
+            if self._stopped:
+                raise RuntimeError(u'The writer has been stopped.')
+            self._pending.setdefault((table, rowid), {})[key] = value
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+            self._condition.notify_all()
+
+    def discard(self, table, rowid, key):
+        """Removes a queued value, if it hasn't been picked up already."""
+        with self._condition:
+            values = self._pending.get((table, rowid))
+            if values:
+                values.pop(key, None)
+
+    def pending_value(self, table, rowid, key):
+        """Returns a value that is queued or being written.
+
+        Returns:
+            tuple: `True` and the value if the value is queued, otherwise
+            `False` and `None`.
+
+        """
+        if not self._pending and not self._writing:
+            return False, None
+        with self._condition:
+            for d in (self._pending, self._writing):
+                values = d.get((table, rowid))
+                if values and key in values:
+                    return True, values[key]
+        return False, None
+
+    def __len__(self):
+        with self._condition:
+            return sum(len(v) for v in self._pending.itervalues())
+
+    def flush(self, timeout=None):
+        """Waits for the queued values to be written.
+
+        Args:
+            timeout (float): The maximum number of seconds to wait for.
+
+        Returns:
+            bool: `False` if the values weren't written before `timeout`.
+
+        """
+        t = None if timeout is None else time.time() + timeout
+        with self._condition:
+            self._flushing += 1
+            self._condition.notify_all()
+            try:
+                while self._pending or self._writing:
+                    if t is None:
+                        self._condition.wait()
+                        continue
+                    remaining = t - time.time()
+                    if remaining <= 0.0:
+                        return False
+                    self._condition.wait(remaining)
+                return True
+            finally:
+                self._flushing -= 1
+
+    def stop(self, timeout=None):
+        """Writes the queued values and stops the thread."""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+            thread = self._thread
+        if thread:
+            thread.join(timeout)
+
+    def _take(self):
+        """Waits for values to write and returns them."""
+        with self._condition:
+            while not self._pending and not self._stopped:
+                self._condition.wait()
+            if not self._pending:
+                return None
+
+            # Waiting a little for more values to write
+            t = time.time() + WRITE_DELAY
+            while not self._stopped and not self._flushing:
+                remaining = t - time.time()
+                if remaining <= 0.0:
+                    break
+                self._condition.wait(remaining)
+
+            self._writing = self._pending
+            self._pending = collections.OrderedDict()
+            return self._writing
+
+    def _run(self):
+        connection = None
+        retries = 0
+        while True:
+            batch = self._take()
+            if batch is None:
+                break
+
+            try:
+                if connection is None:
+                    connection = sqlite3.connect(
+                        self.path,
+                        isolation_level=None,
+                        check_same_thread=False,
+                        cached_statements=STATEMENT_CACHE_SIZE
+                    )
+                _cursor = connection.cursor()
+                _cursor.execute(u'BEGIN IMMEDIATE')
+                tables = collections.OrderedDict()
+                for (table, rowid), values in batch.iteritems():
+                    tables.setdefault(table, []).append((rowid, values))
+                for table, rows in tables.iteritems():
+                    _write_rows(_cursor, table, rows)
+                connection.commit()
+                _cursor.close()
+                success = True
+                retries = 0
+            except Exception as e:
+                success = False
+                retries += 1
+                log.error(u'Failed to write to "{}"\n-> "{}"'.format(
+                    self.path, e))
+                if connection is not None:
+                    try:
+                        connection.rollback()
+                    except Error:
+                        pass
+
+            with self._condition:
+                if success:
+                    self.generation += 1
+                elif retries < RETRIES:
+                    # The values set since are newer than the failed ones
+                    for k, values in batch.iteritems():
+                        pending = self._pending.setdefault(k, {})
+                        for key, value in values.iteritems():
+                            pending.setdefault(key, value)
+                else:
+                    log.error(u'Discarded {} rows'.format(len(batch)))
+                    retries = 0
+                self._writing = {}
+                self._condition.notify_all()
+
+            if not success:
+                time.sleep(RETRY_DELAY)
+
+        if connection is not None:
+            connection.close()
+
+
 class BookmarkDB(QtCore.QObject):
     """Database connector used to interface with the SQLite database.
 
@@ -229,6 +647,13 @@ class BookmarkDB(QtCore.QObject):
         super(BookmarkDB, self).__init__(parent=parent)
 
         self._connection = None
+        self._prefetched = None
+        self._rows = collections.OrderedDict()
+        self._data_version = None
+        self._checked = 0.0
+        self._generation = 0
+        self._transaction = False
+        self._v1_mtime = None
         self._server = server.lower().encode(u'utf-8')
         self._server_u = server.lower()
         self._job = job.lower().encode(u'utf-8')
@@ -236,11 +661,19 @@ class BookmarkDB(QtCore.QObject):
         self._root = root.lower().encode(u'utf-8')
         self._root_u = root.lower()
         self._bookmark = server + u'/' + job + u'/' + root
-        self._database_path = u'{server}/{job}/{root}/.bookmark/bookmark.db'.format(
+        self._database_path = u'{server}/{job}/{root}/.bookmark/{db}'.format(
             server=server,
             job=job,
-            root=root
+            root=root,
+            db=DATABASE
         )
+        self._v1_database_path = u'{server}/{job}/{root}/.bookmark/{db}'.format(
+            server=server,
+            job=job,
+            root=root,
+            db=V1_DATABASE
+        )
+        self._writer = get_writer(self._database_path)
 
         # Let's make sure the parent folder exists before connecting
         _p = u'{}/.bookmark'.format(self._bookmark)
@@ -254,7 +687,8 @@ class BookmarkDB(QtCore.QObject):
             self._connection = sqlite3.connect(
                 self._database_path,
                 isolation_level=None,
-                check_same_thread=False
+                check_same_thread=False,
+                cached_statements=STATEMENT_CACHE_SIZE
             )
             self.init_tables()
 
@@ -276,6 +710,7 @@ class BookmarkDB(QtCore.QObject):
 
         """
         self._connection.execute(u'BEGIN')
+        self._transaction = True
         try:
             yield
         except:
@@ -283,6 +718,8 @@ class BookmarkDB(QtCore.QObject):
             raise
         else:
             self._connection.commit()
+        finally:
+            self._transaction = False
 
     def connection(self):
         return self._connection
@@ -294,15 +731,19 @@ class BookmarkDB(QtCore.QObject):
         The  `data` table stores file information of items inside the bookmark,
         whilst `info` contains information about the database itself.
 
+        The values of the version 1 database, if there's one, are copied
+        by :func:`.sync`. See :const:`.SCHEMA_VERSION`.
+
         """
         _cursor = self._connection.cursor()
         with self.transactions():
+            version = _cursor.execute(u'PRAGMA user_version;').fetchone()[0]
+
             # Main ``data`` table
             _cursor.execute("""
 CREATE TABLE IF NOT EXISTS data (
-    id TEXT PRIMARY KEY COLLATE NOCASE,
+    id INTEGER PRIMARY KEY,
     description TEXT,
-    notes TEXT,
     flags INTEGER DEFAULT 0,
     thumbnail_stamp REAL,
     user TEXT,
@@ -313,11 +754,27 @@ CREATE TABLE IF NOT EXISTS data (
     cut_in INT,
     cut_out INT,
     url1 TEXT,
-    url2 TEXT
+    url2 TEXT,
+    mtime REAL,
+    size INTEGER
 );
             """)
             self._patch_database(_cursor, u'data')
 
+            # The notes and the number of outstanding todos of the ``data`` rows
+            _cursor.execute("""
+CREATE TABLE IF NOT EXISTS notes (
+    id INTEGER PRIMARY KEY,
+    notes TEXT,
+    todo_count INTEGER NOT NULL DEFAULT 0
+);
+            """)
+            _cursor.execute("""
+CREATE INDEX IF NOT EXISTS notes_todo_count
+    ON notes (todo_count) WHERE todo_count > 0;
+            """)
+            self._patch_database(_cursor, u'notes')
+
             # Single-row ``info`` table
             _cursor.execute("""
 CREATE TABLE IF NOT EXISTS info (
@@ -337,15 +794,15 @@ CREATE TABLE IF NOT EXISTS info (
             INSERT OR IGNORE INTO info
                 (id, server, job, root, user, host, created)
             VALUES
-                ('{id}', '{server}', '{job}', '{root}', '{user}', '{host}', '{created}');
-            """.format(
-                id=self._bookmark,
-                server=self._server,
-                job=self._job,
-                root=self._root,
-                user=common.get_username(),
-                host=platform.node(),
-                created=time.time(),
+                (?, ?, ?, ?, ?, ?, ?);
+            """, (
+                self._bookmark,
+                self._server_u,
+                self._job_u,
+                self._root_u,
+                common.get_username(),
+                platform.node(),
+                time.time(),
             ))
 
             _cursor.execute("""
@@ -370,18 +827,105 @@ CREATE TABLE IF NOT EXISTS info (
                 );
             """)
             self._patch_database(_cursor, u'properties')
+
+            # The rows copied from the version 1 database
+            _cursor.execute("""
+CREATE TABLE IF NOT EXISTS v1_rows (
+    tbl TEXT NOT NULL,
+    id NOT NULL,
+    digest INTEGER NOT NULL,
+    PRIMARY KEY (tbl, id)
+) WITHOUT ROWID;
+            """)
+            _cursor.execute("""
+CREATE TABLE IF NOT EXISTS v1_sync (
+    id INTEGER PRIMARY KEY,
+    mtime REAL
+);
+            """)
+
+            if version < SCHEMA_VERSION:
+                _cursor.execute(
+                    u'PRAGMA user_version = {};'.format(SCHEMA_VERSION))
         _cursor.close()
 
-    def _patch_database(self, _cursor, table):
+        self.sync()
+
+    def sync(self):
+        """Copies the values set in the version 1 database since they were
+        last copied.
+
+        Earlier versions of Bookmarks keep using the version 1 database. When
+        its modification time changes, the rows that have changed since the
+        last import are copied, and their values replace the version 2
+        values. The rows are compared using the digests saved in the
+        `v1_rows` table. The version 1 database is only read.
+
+        Returns:
+            bool: `True` if values were copied.
+
+        """
+        try:
+            mtime = os.path.getmtime(self._v1_database_path)
+        except OSError:
+            return False
+        if mtime == self._v1_mtime:
+            return False
+
+        synced = False
+        _cursor = self._connection.cursor()
+        try:
+            # Databases can't be attached inside a transaction
+            _cursor.execute(
+                u'ATTACH DATABASE ? AS v1;', (self._v1_database_path,))
+            try:
+                _cursor.execute(u'BEGIN IMMEDIATE')
+                try:
+                    # Another connection might have copied the values already
+                    v = _cursor.execute(
+                        u'SELECT mtime FROM v1_sync WHERE id=0;').fetchone()
+                    if not v or v[0] != mtime:
+                        self._migrate_v1(_cursor)
+                        _cursor.execute(
+                            u'INSERT OR REPLACE INTO v1_sync (id, mtime) VALUES (0, ?);',
+                            (mtime,))
+                        synced = True
+                except:
+                    self._connection.rollback()
+                    raise
+                else:
+                    self._connection.commit()
+            finally:
+                _cursor.execute(u'DETACH DATABASE v1;')
+        except Error as e:
+            log.error(u'Failed to copy the values of "{}"\n-> "{}"'.format(
+                self._v1_database_path, e))
+            return False
+        finally:
+            _cursor.close()
+
+        self._v1_mtime = mtime
+
+        # Our own changes don't change the `data_version`
+        if synced:
+            self._rows.clear()
+            self._prefetched = None
+        return synced
+
+    def _patch_database(self, _cursor, table, keys=None):
         """For backwards compatibility, we will ALTER the database any of the
         required columns that are missing. This might happen if we have added new
         columns to the table definition but the database on the server is
         based on an older version of Bookmarks.
 
+        Args:
+            keys (tuple): The required columns. Defaults to `KEYS[table]`.
+
         """
+        keys = KEYS[table] if keys is None else keys
         info = _cursor.execute("""PRAGMA table_info('{}');""".format(table)).fetchall()
         columns = [c[1] for c in info]
-        missing = list(set(KEYS[table]) - set(columns))
+        missing = list(set(keys) - set(columns))
         for column in missing:
             try:
                 _cursor.execute('ALTER TABLE {} ADD COLUMN {};'.format(table, column))
@@ -390,6 +934,88 @@ CREATE TABLE IF NOT EXISTS info (
                 log.error(u'Failed to add missing column {}'.format(column))
                 pass # handle the error
 
+    def _migrate_v1(self, _cursor):
+        """Copies the changed rows of the attached version 1 database.
+
+        The `data` rows are copied using their integer keys, and the todos of
+        the notes are counted. Rows with invalid ids are dropped. A row is
+        only copied if its digest differs from the one saved when it was last
+        copied.
+
+        """
+        log.success(u'Copying the values of "{}" to "{}"'.format(
+            self._v1_database_path, self._database_path))
+
+        def columns(table):
+            info = _cursor.execute(
+                u'PRAGMA v1.table_info(\'{}\');'.format(table)).fetchall()
+            return [c[1] for c in info]
+
+        def changed_rows(table, keys, key=lambda x: x):
+            digests = dict(_cursor.execute(
+                u'SELECT id, digest FROM v1_rows WHERE tbl=?;', (table,)))
+            rows = _cursor.execute(u'SELECT id, {} FROM v1.{};'.format(
+                u', '.join(keys), table)).fetchall()
+            for row in rows:
+                rowid = key(row[0])
+                if rowid is None:
+                    continue
+                digest = binascii.crc32(repr(row[1:]))
+                if digests.get(rowid) == digest:
+                    continue
+                yield (rowid, ) + row[1:], digest, rowid in digests
+
+        tables = [f[0] for f in _cursor.execute(
+            u'SELECT name FROM v1.sqlite_master WHERE type=\'table\';')]
+
+        copied = []
+        if u'data' in tables:
+            _columns = columns(u'data')
+            keys = [f for f in KEYS[u'data'] if f in _columns]
+            if u'notes' in _columns:
+                keys.append(u'notes')
+
+            data = []
+            notes = []
+            for row, digest, exists in changed_rows(u'data', keys, key=get_key):
+                rowid = row[0]
+                values = dict(zip(keys, row[1:]))
+                if u'notes' in values:
+                    v = values.pop(u'notes')
+                    if v is not None or exists:
+                        notes.append(
+                            (rowid, {u'notes': v, u'todo_count': count_todos(v)}))
+                data.append((rowid, values))
+                copied.append((u'data', row[0], digest))
+            _write_rows(_cursor, u'data', data)
+            _write_rows(_cursor, u'notes', notes)
+
+        # The ``info`` row of the version 1 database replaces the new one
+        if u'info' in tables:
+            keys = [f for f in KEYS[u'info'] if f in columns(u'info')]
+            for row, digest, _ in changed_rows(u'info', keys):
+                if len(keys) != len(KEYS[u'info']) or None in row:
+                    continue
+                _cursor.execute(
+                    u'INSERT OR REPLACE INTO info (id, {}) VALUES (?, {});'.format(
+                        u', '.join(keys), u', '.join(u'?' for _ in keys)),
+                    row
+                )
+                copied.append((u'info', row[0], digest))
+
+        if u'properties' in tables:
+            keys = [f for f in KEYS[u'properties'] if f in columns(u'properties')]
+            properties = []
+            for row, digest, _ in changed_rows(u'properties', keys):
+                properties.append((row[0], dict(zip(keys, row[1:]))))
+                copied.append((u'properties', row[0], digest))
+            _write_rows(_cursor, u'properties', properties)
+
+        _cursor.executemany(
+            u'INSERT OR REPLACE INTO v1_rows (tbl, id, digest) VALUES (?, ?, ?);',
+            copied
+        )
+
     def value(self, source, key, table=u'data'):
         """Returns a value from the `bookmark.db`.
 
@@ -413,64 +1039,183 @@ CREATE TABLE IF NOT EXISTS info (
             raise TypeError(
                 u'Invalid type. Expected <type \'unicode or int\', got {}'.format(type(source)))
 
-        if key not in KEYS[table]:
-            raise ValueError(u'Key "{}" is invalid. Expected one of "{}"'.format(
-                key, u'", "'.join(KEYS[table])))
+        table = _table(table, key)
+        rowid = get_key(common.get_hash(source))
+        pending, v = self._writer.pending_value(table, rowid, key)
+        if pending:
+            return v
 
-        hash = common.get_hash(source)
+        row = self._row(table, rowid)
+        if row is None:
+            return None
+        return row.get(key)
+
+    def _check(self):
+        """Discards the cached and prefetched rows if another connection has
+        changed the database.
+
+        SQLite's `data_version` is checked at most every
+        :const:`.CHECK_INTERVAL` seconds, but the commits of our own
+        :class:`.Writer` are picked up straight away. The connections of the
+        worker threads also copy the values changed in the version 1 database,
+        see :func:`.sync`.
+
+        """
+        generation = self._writer.generation
+        if generation != self._generation:
+            self._rows.clear()
+            self._prefetched = None
+            self._generation = generation
+
+        t = time.time()
+        if t - self._checked < CHECK_INTERVAL:
+            return
+        self._checked = t
+
+        # Values set by earlier versions of Bookmarks are copied by the
+        # connections of the worker threads, so the gui thread isn't blocked
+        app = QtCore.QCoreApplication.instance()
+        if (
+            not self._transaction and
+            app and app.thread() != QtCore.QThread.currentThread()
+        ):
+            self.sync()
+
+        _cursor = self._connection.cursor()
+        _cursor.execute(u'PRAGMA data_version;')
+        version = _cursor.fetchone()[0]
+        _cursor.close()
+        if version != self._data_version:
+            self._rows.clear()
+            self._prefetched = None
+            self._data_version = version
+
+    def _row(self, table, rowid):
+        """Returns a row of `table` as a dictionary, or `None` if the row
+        doesn't exist.
+
+        The rows are cached, including the missing ones.
+
+        """
+        self._check()
+
+        k = (table, rowid)
+        if k in self._rows:
+            row = self._rows.pop(k)
+            self._rows[k] = row  # Moves the row to the end of the queue
+            return row
 
         _cursor = self._connection.cursor()
-        kw = {u'table': table, u'key': key, u'id': hash}
-        sql = u'SELECT {key} FROM {table} WHERE id=\'{id}\''.format(**kw)
-        _cursor.execute(sql.encode('utf-8'))
+        # The table name is validated by the callers
+        _cursor.execute(
+            u'SELECT * FROM {} WHERE id=?;'.format(table), (rowid,))
         res = _cursor.fetchone()
+        if res:
+            row = dict(zip((f[0] for f in _cursor.description), res))
+        else:
+            row = None
         _cursor.close()
 
-        if not res:
+        self._rows[k] = row
+        while len(self._rows) > ROW_CACHE_SIZE:
+            self._rows.popitem(last=False)
+        return row
+
+    def prefetch(self):
+        """Loads the :const:`.PREFETCH_KEYS` columns of all rows of the `data`
+        table using a single query per table.
+
+        The rows are kept in memory and reloaded when another connection
+        changes the database, see `_check()`. `setValue()` discards the rows
+        straight away.
+
+        Returns:
+            dict: Dictionaries of the column values keyed by the row ids.
+
+        """
+        self._check()
+        if self._prefetched is not None:
+            return self._prefetched
+
+        prefetched = {}
+        _cursor = self._connection.cursor()
+        for table in (u'data', u'notes'):
+            keys = [k for k in PREFETCH_KEYS if _table(u'data', k) == table]
+            _cursor.execute(u'SELECT id, {} FROM {};'.format(
+                u', '.join(keys), table))
+            for v in _cursor.fetchall():
+                prefetched.setdefault(v[0], {}).update(zip(keys, v[1:]))
+        _cursor.close()
+        self._prefetched = prefetched
+        return self._prefetched
+
+    def cached_value(self, source, key):
+        """Returns a value of the `data` table from the rows loaded by
+        `prefetch()`.
+
+        Args:
+            source (unicode): Path to a file.
+            key (unicode): One of :const:`.PREFETCH_KEYS`.
+
+        Returns:
+            data: The requested value or None.
+
+        """
+        if key not in PREFETCH_KEYS:
+            raise ValueError(u'Key "{}" is invalid. Expected one of "{}"'.format(
+                key, u'", "'.join(PREFETCH_KEYS)))
+
+        rowid = get_key(common.get_hash(source))
+        pending, v = self._writer.pending_value(
+            _table(u'data', key), rowid, key)
+        if pending:
+            return v
+
+        v = self.prefetch().get(rowid)
+        if v is None:
             return None
-        return res[0]
+        return v.get(key)
 
     def values(self, column=u'*', table=u'data'):
         """Returns all values from the `bookmark.db` of the given table.
 
         Args:
+            column (unicode): Optional column name, defaults to all columns.
             table (string): Optional table parameter, defaults to 'data'.
 
         Returns:
-            dict: The structured database data.
+            dict: The column values of the rows keyed by the row ids.
 
         """
-        _cursor = self._connection.cursor()
         if column != u'*':
-            _column = u'id,' + column
+            table = _table(table, column)
+            _column = u'id, ' + column
         else:
             _column = column
+
+        _cursor = self._connection.cursor()
         _cursor.execute("""SELECT {column} FROM {table};""".format(
             column=_column,
             table=table
         ))
 
         # Let's wrap the retrevied data into a more pythonic directory
-        _data = _cursor.fetchall()
-        _cursor.close()
-
+        keys = [f[0] for f in _cursor.description]
         data = {}
-        if column == u'*':
-            for v in _data:
-                data[v[0].strip()] = {
-                    u'description': v[1],
-                    u'notes': v[2],
-                    u'flags': v[3],
-                    u'thumbnail_stamp': v[4],
-                    u'user': v[5],
-                }
-        else:
-            for v in _data:
-                data[v[0].strip()] = {
-                    column: v[1],
-                }
+        for v in _cursor.fetchall():
+            data[v[0]] = dict(zip(keys[1:], v[1:]))
+        _cursor.close()
         return data
 
+    def todo_count(self):
+        """Returns the number of outstanding todos of all items."""
+        _cursor = self._connection.cursor()
+        _cursor.execute(
+            u'SELECT SUM(todo_count) FROM notes WHERE todo_count > 0;')
+        v = _cursor.fetchone()[0]
+        _cursor.close()
+        return v if v else 0
+
     def setValue(self, source, key, value, table=u'data'):
         """Sets a value in the database.
 
@@ -491,36 +1236,107 @@ CREATE TABLE IF NOT EXISTS info (
             key (unicode): A database column name.
             value (unicode or float): The value to set.
 
+        """
+        self.setValues({source: {key: unicode(value)}}, table=table)
+
+    def setValues(self, rows, table=u'data'):
+        """Sets several columns of several rows in the database.
+
+        The rows setting the same columns are written by a single statement.
+        The method uses a savepoint, so the rows are written in a single
+        transaction when called outside of the ``transactions`` context
+        manager.
+
+        Example:
+
+            .. code-block:: python
+
+                db.setValues({
+                    u'server/job/my/file.txt': {
+                        u'flags': common.MarkedAsArchived,
+                        u'description': u'hello world',
+                    },
+                    u'server/job/my/other.txt': {
+                        u'flags': common.MarkedAsArchived,
+                    },
+                })
+
+        Args:
+            rows (dict): The column values keyed by row id. The column values
+                are dictionaries keyed by column name.
+
+        """
+        tables = collections.OrderedDict()
+        for source, values in rows.iteritems():
+            if not isinstance(source, (unicode, int)):
+                raise TypeError(u'Invalid type.')
+
+            rowid = get_key(common.get_hash(source))
+            for key, value in values.iteritems():
+                _values = tables.setdefault(
+                    _table(table, key), collections.OrderedDict()).setdefault(rowid, {})
+                _values[key] = value
+                if key == u'notes' and u'todo_count' not in values:
+                    _values[u'todo_count'] = count_todos(value)
+
+        # Our own changes don't change the `data_version`
+        for _table_name, _rows in tables.iteritems():
+            for rowid, values in _rows.iteritems():
+                self._rows.pop((_table_name, rowid), None)
+
+                # The values set here are newer than the queued ones
+                for key in values:
+                    self._writer.discard(_table_name, rowid, key)
+        self._prefetched = None
+
+        _cursor = self._connection.cursor()
+        _cursor.execute(u'SAVEPOINT set_values;')
+        try:
+            for _table_name, _rows in tables.iteritems():
+                _write_rows(_cursor, _table_name, _rows.iteritems())
+        except:
+            _cursor.execute(u'ROLLBACK TO set_values;')
+            _cursor.execute(u'RELEASE set_values;')
+            raise
+        else:
+            _cursor.execute(u'RELEASE set_values;')
+        finally:
+            _cursor.close()
+
+    def queue_value(self, source, key, value, table=u'data'):
+        """Queues a value to be written by the bookmark's :class:`.Writer`.
+
+        Unlike `setValue()`, the method returns straight away. The value is
+        returned by `value()` whilst it is waiting to be written.
+
+        Example:
+
+            .. code-block:: python
+
+                source = u'server/job/my/file.txt'
+                db.queue_value(source, u'flags', common.MarkedAsArchived)
+                db.flush()
+
+        Args:
+            source (unicode or int): A row id.
+            key (unicode): A database column name.
+            value (unicode, int or float): The value to set.
+
         """
         if not isinstance(source, (unicode, int)):
             raise TypeError(u'Invalid type.')
 
-        if key not in KEYS[table]:
-            raise ValueError(u'Key "{}" is invalid. Expected one of {}'.format(
-                key, u', '.join(KEYS[table])))
-
-        hash = common.get_hash(source)
-        values = []
-
-        # Earlier versions of the SQLITE library lack `UPSERT` or `WITH`
-        # A workaround is found here:
-        # https://stackoverflow.com/questions/418898/sqlite-upsert-not-insert-or-replace
-        for k in KEYS[table]:
-            if k == key:
-                v = u'\n \'' + unicode(value) + u'\''
-            else:
-                v = u'\n(SELECT ' + k + u' FROM ' + table + \
-                    u' WHERE id =\'' + unicode(hash) + u'\')'
-            values.append(v)
-
-        kw = {
-            'hash': hash,
-            'allkeys': u', '.join(KEYS[table]),
-            'values': u','.join(values),
-            'table': table
-        }
-        sql = u'INSERT OR REPLACE INTO {table} (id, {allkeys}) VALUES (\'{hash}\', {values});'.format(
-            **kw)
-        _cursor = self._connection.cursor()
-        _cursor.execute(sql.encode('utf-8'))
-        _cursor.close()
+        table = _table(table, key)
+        rowid = get_key(common.get_hash(source))
+        if key == u'notes':
+            self._writer.put(table, rowid, u'todo_count', count_todos(value))
+        self._writer.put(table, rowid, key, value)
+
+    def flush(self, timeout=None):
+        """Waits for the values queued by `queue_value()` to be written.
+
+        Returns:
+            bool: `False` if the values weren't written before `timeout`.
+
+        """
+        return self._writer.flush(timeout)
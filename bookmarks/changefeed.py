@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+"""A debounced feed of file system changes.
+
+:class:`.ChangeFeed` wraps a `QFileSystemWatcher` and turns its raw
+`directoryChanged` notifications into a list of :class:`.Change` items
+describing exactly which files and folders have been added or removed, and
+which files have been modified.
+
+Notifications are collected for `delay` milliseconds before the changed
+directories are listed and compared to their last known contents, so a burst
+of changes, like a render writing hundreds of frames into the same folder,
+results in a single :class:`.Change` per directory. Changes are guaranteed to
+be reported at least every `max_delay` milliseconds.
+
+.. code-block:: python
+
+    feed = changefeed.ChangeFeed()
+    feed.changed.connect(model.apply_changes)
+    feed.watch({u'//server/job/root/asset/scenes': ([u'a.ma'], [u'subfolder'])})
+
+"""
+import os
+import time
+import threading
+import collections
+
+import _scandir
+from PySide2 import QtCore
+
+from . import log
+
+
+MAX_WATCHED = 4096
+"""The maximum number of directories a feed will watch."""
+
+
+Change = collections.namedtuple(
+    u'Change',
+    (
+        u'path',  # The path of the changed directory
+        u'mtime',  # The directory's modification time, or None if it was removed
+        u'files',  # The names of all files in the directory
+        u'dirs',  # The names of all subdirectories
+        u'added',  # `DirEntry` instances of the added files
+        u'removed',  # The names of the removed files
+        u'added_dirs',  # The names of the added subdirectories
+        u'removed_dirs',  # The names of the removed subdirectories
+        u'modified',  # `DirEntry` instances of the files with a new mtime or size
+    )
+)
+
+
+def _list_dir(path):
+    """Returns the mtime, file and directory entries of `path`."""
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return None, [], []
+
+    files = []
+    dirs = []
+    try:
+        for entry in _scandir.scandir(path):
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if is_dir:
+                dirs.append(entry)
+            else:
+                files.append(entry)
+    except OSError:
+        return None, [], []
+    return mtime, files, dirs
+
+
+class ChangeFeed(QtCore.QObject):
+    """Watches directories and reports changes to their contents.
+
+    The directories are listed on a separate thread and the `changed` signal
+    is emitted on the gui thread with a list of :class:`.Change` items.
+
+    A file is modified when its modification time or size differs from the
+    last time its directory was listed. Until a directory has been listed,
+    the files newer than the directory are considered modified.
+
+    Args:
+        recursive (bool): Watch new subdirectories and report the contents of
+            added and removed subdirectories.
+        delay (int): Milliseconds to wait for more notifications.
+        max_delay (int): The maximum milliseconds to defer reporting changes.
+
+    """
+    changed = QtCore.Signal(object)
+    _listed = QtCore.Signal(int, object, object)
+
+    def __init__(self, recursive=True, delay=500, max_delay=2000, parent=None):
+        super(ChangeFeed, self).__init__(parent=parent)
+        self.recursive = recursive
+        self.max_delay = max_delay
+
+        self.watcher = QtCore.QFileSystemWatcher(parent=self)
+
+        self.timer = QtCore.QTimer(parent=self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(delay)
+
+        self._snapshots = {}
+        self._stamps = {}
+        self._pending = set()
+        self._first_event = None
+        self._generation = 0
+        self._busy = False
+
+        self.watcher.directoryChanged.connect(self.directory_changed)
+        self.timer.timeout.connect(self.flush)
+        self._listed.connect(self.listed, QtCore.Qt.QueuedConnection)
+
+    def watch(self, snapshots):
+        """Starts watching the given directories.
+
+        Args:
+            snapshots (dict): Directory paths and a tuple of their known file
+                and subdirectory names.
+
+        """
+        self.clear()
+        for path, (files, dirs) in snapshots.iteritems():
+            self._add(path, files, dirs)
+
+    def clear(self):
+        """Stops watching all directories and drops all pending changes."""
+        self._generation += 1
+        self._snapshots = {}
+        self._stamps = {}
+        self._pending = set()
+        self._first_event = None
+        self.timer.stop()
+
+        paths = self.watcher.directories()
+        if paths:
+            self.watcher.removePaths(paths)
+
+    def directories(self):
+        """The watched directories."""
+        return self._snapshots.keys()
+
+    def _add(self, path, files, dirs):
+        path = path.replace(u'\\', u'/')
+        if path in self._snapshots:
+            self._snapshots[path] = (set(files), set(dirs))
+            return
+
+        if len(self._snapshots) >= MAX_WATCHED:
+            log.error(u'Too many directories to watch, skipping {}'.format(path))
+            return
+        self._snapshots[path] = (set(files), set(dirs))
+        self.watcher.addPath(path)
+
+    def _remove(self, path):
+        """Removes `path` and its watched subdirectories."""
+        prefix = path + u'/'
+        paths = [f for f in self._snapshots if f == path or f.startswith(prefix)]
+        for f in paths:
+            del self._snapshots[f]
+            self._stamps.pop(f, None)
+        if paths:
+            self.watcher.removePaths(paths)
+
+    @QtCore.Slot(unicode)
+    def directory_changed(self, path):
+        """Collects the changed directories until the feed is flushed."""
+        path = path.replace(u'\\', u'/')
+        if path not in self._snapshots:
+            return
+        self._pending.add(path)
+
+        if self._first_event is None:
+            self._first_event = time.time()
+
+        # Restarting the timer postpones the flush until the notifications stop,
+        # but never longer than `max_delay`
+        elapsed = (time.time() - self._first_event) * 1000.0
+        if not self.timer.isActive() or elapsed < self.max_delay:
+            self.timer.start()
+
+    @QtCore.Slot()
+    def flush(self):
+        """Lists the changed directories on a separate thread."""
+        if not self._pending:
+            return
+        if self._busy:
+            self.timer.start()
+            return
+
+        self._busy = True
+        pending = self._pending
+        self._pending = set()
+        self._first_event = None
+
+        snapshots = dict(self._snapshots)
+        stamps = dict(self._stamps)
+        generation = self._generation
+
+        def run():
+            changes = []
+            try:
+                for path in sorted(pending):
+                    if path in snapshots:
+                        self._diff(path, snapshots, stamps, changes)
+            except Exception as e:
+                log.error(u'Could not list changes:\n{}'.format(e))
+            self._listed.emit(generation, changes, stamps)
+
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+
+    def _diff(self, path, snapshots, stamps, changes):
+        """Compares `path` with its snapshot and adds the differences to `changes`.
+
+        The modification times and sizes of the listed files are stored in
+        `stamps`.
+
+        """
+        old_files, old_dirs = snapshots.get(path, (set(), set()))
+        old_stamps = stamps.get(path)
+        mtime, files, dirs = _list_dir(path)
+
+        names = set(f.name for f in files)
+        dir_names = set(f.name for f in dirs)
+
+        _stamps = {}
+        for f in files:
+            try:
+                stat = f.stat()
+            except OSError:
+                continue
+            _stamps[f.name] = (stat.st_mtime, stat.st_size)
+        if mtime is not None:
+            stamps[path] = _stamps
+
+        if old_stamps is None:
+            modified = [
+                f for f in files if f.name in old_files and
+                f.name in _stamps and _stamps[f.name][0] > mtime
+            ]
+        else:
+            modified = [
+                f for f in files if f.name in old_files and
+                f.name in old_stamps and f.name in _stamps and
+                _stamps[f.name] != old_stamps[f.name]
+            ]
+
+        change = Change(
+            path,
+            mtime,
+            sorted(names),
+            sorted(dir_names),
+            [f for f in files if f.name not in old_files],
+            sorted(old_files - names),
+            sorted(dir_names - old_dirs),
+            sorted(old_dirs - dir_names),
+            modified,
+        )
+        if (
+            mtime is not None and
+            not change.added and
+            not change.removed and
+            not change.added_dirs and
+            not change.removed_dirs and
+            not change.modified
+        ):
+            return
+        changes.append(change)
+
+        if not self.recursive:
+            return
+
+        # The removed directories' contents are reported as removed
+        for name in change.removed_dirs:
+            _path = path + u'/' + name
+            for f in [f for f in snapshots if f == _path or f.startswith(_path + u'/')]:
+                _files, _dirs = snapshots[f]
+                changes.append(
+                    Change(f, None, [], [], [], sorted(_files), [], sorted(_dirs), []))
+
+        # ...and the added directories' contents as added
+        for name in change.added_dirs:
+            self._diff(path + u'/' + name, snapshots, stamps, changes)
+
+    @QtCore.Slot(int, object, object)
+    def listed(self, generation, changes, stamps):
+        """Updates the snapshots and emits the `changed` signal."""
+        self._busy = False
+        if generation != self._generation:
+            return
+
+        for change in changes:
+            if change.mtime is None:
+                self._remove(change.path)
+                continue
+            if change.path in self._snapshots or self.recursive:
+                self._add(change.path, change.files, change.dirs)
+
+        # The stamps of the directories listed without changes are kept too
+        for path, v in stamps.iteritems():
+            if path in self._snapshots:
+                self._stamps[path] = v
+
+        if changes:
+            self.changed.emit(changes)
+        if self._pending:
+            self.timer.start()
@@ -43,6 +43,12 @@ ThumbnailThread = 1
 MAXITEMS = 999999
 """The maximum number of items a model is allowed to load."""
 
+FETCH_SIZE = 500
+"""The number of rows exposed at a time when lazy fetching is enabled."""
+
+FRAME_INTERVAL = 16
+"""The minimum interval, in milliseconds, between two row update flushes."""
+
 SEQPROXY = u'[0]'
 """"""
 
@@ -292,7 +298,7 @@ def proxy_path(v):
     """
     if isinstance(v, weakref.ref):
         v = v()[QtCore.Qt.StatusTipRole]
-    if isinstance(v, dict):
+    if isinstance(v, (dict, RowData)):
         v = v[QtCore.Qt.StatusTipRole]
     elif isinstance(v, QtCore.QModelIndex):
         v = v.data(QtCore.Qt.StatusTipRole)
@@ -509,13 +515,28 @@ def clear_favourites():
 def qlast_modified(n): return QtCore.QDateTime.fromMSecsSinceEpoch(n * 1000)
 
 
+NameKeyRegex = re.compile(ur'([0-9]+)', flags=re.UNICODE)
+
+
 def namekey(s):
-    """Key function used to sort alphanumeric filenames."""
+    """Key function used to sort alphanumeric filenames.
+
+    The name is split into runs of digits and non-digits, and the digit runs
+    are converted to integers so that, for instance, ``file_9`` is sorted
+    before ``file_10``. The key is meant to be computed once, when the item
+    is created, and saved as the item's `SortByNameRole` data.
+
+    Returns:
+        tuple: The alternating non-digit and integer runs of `s`.
+
+    """
     if SORT_WITH_BASENAME:
         s = s.split(u'/').pop()  # order by filename
-    elif len(s.split(u'/')) > 1:
+    elif u'/' in s:
         s = u'Ω' + s
-    return [int(f) if f.isdigit() else f for f in s]
+    v = NameKeyRegex.split(s)
+    v[1::2] = [int(f) for f in v[1::2]]
+    return tuple(v)
 
 
 def move_widget_to_available_geo(widget):
@@ -1028,6 +1049,146 @@ def walk(path):
                 yield entry
 
 
+def walker_threads():
+    """The number of directories :mod:`.walker` is allowed to list concurrently.
+
+    The value can be set in the preferences.
+
+    """
+    from . import settings
+    from . import walker
+
+    val = settings.local_settings.value(u'preferences/walker_threads')
+    if not isinstance(val, int) or val < 1:
+        return walker.DEFAULT_THREADS
+    return val
+
+
+def worker_threads(thread_type):
+    """The number of worker threads a model starts for `thread_type`.
+
+    The value can be set in the preferences.
+
+    Args:
+        thread_type (int): `InfoThread` or `ThumbnailThread`.
+
+    """
+    from . import settings
+    from . import threads
+
+    if thread_type == ThumbnailThread:
+        k = u'preferences/thumbnail_threads'
+        default = threads.THUMBNAIL_THREADS
+    else:
+        k = u'preferences/info_threads'
+        default = threads.INFO_THREADS
+
+    val = settings.local_settings.value(k)
+    if not isinstance(val, int) or val < 1:
+        return default
+    return val
+
+
+def prefetch_rows():
+    """The number of rows loaded ahead of the viewport when scrolling.
+
+    See :mod:`.prefetch`. The value can be set in the preferences.
+
+    """
+    from . import settings
+    from . import prefetch
+
+    val = settings.local_settings.value(u'preferences/prefetch_rows')
+    if not isinstance(val, int) or val < 0:
+        return prefetch.DEFAULT_ROWS
+    return val
+
+
+def sample_sequences():
+    """Whether the size of large sequences should be estimated first.
+
+    See :func:`.statcache.stat_sequence`. The value can be set in the
+    preferences.
+
+    """
+    from . import settings
+
+    val = settings.local_settings.value(u'preferences/sample_sequences')
+    if val is None:
+        return True
+    return bool(val)
+
+
+def lazy_fetch():
+    """Whether the file models should only expose their rows on demand.
+
+    When enabled the views only show the first :const:`.FETCH_SIZE` rows and
+    fetch more as they're scrolled to the bottom. The value can be set in the
+    preferences.
+
+    """
+    from . import settings
+
+    val = settings.local_settings.value(u'preferences/lazy_fetch')
+    if val is None:
+        return False
+    return bool(val)
+
+
+def dump_stats():
+    """Whether the worker queue statistics should be saved periodically.
+
+    See :func:`.threads.dump_stats`. The value can be set in the preferences.
+
+    """
+    from . import settings
+
+    val = settings.local_settings.value(u'preferences/dump_stats')
+    if val is None:
+        return False
+    return bool(val)
+
+
+def use_index_server():
+    """Whether the folders should be listed by the :mod:`.indexserver`.
+
+    The local listing is used when the server is not running. The value can
+    be set in the preferences.
+
+    """
+    from . import settings
+
+    val = settings.local_settings.value(u'preferences/index_server')
+    if val is None:
+        return False
+    return bool(val)
+
+
+def thumbnail_farm():
+    """Whether thumbnails should be generated by the :mod:`.thumbnailfarm`
+    worker processes.
+
+    The value can be set in the preferences. The worker processes are
+    only used by the standalone application, and only if a Python
+    interpreter is available to start them, see
+    :func:`.thumbnailfarm.get_executable`.
+
+    """
+    if not STANDALONE:
+        return False
+
+    from . import thumbnailfarm
+    if not thumbnailfarm.get_executable():
+        return False
+
+    from . import settings
+
+    val = settings.local_settings.value(u'preferences/thumbnail_farm')
+    if val is None:
+        return False
+    return bool(val)
+
+
 def rsc_path(f, n):
     """Helper function to retrieve a resource - file item"""
     path = u'{}/../rsc/{}.png'.format(f, n)
@@ -1183,5 +1344,177 @@ class FontDatabase(QtGui.QFontDatabase):
 
 
 class DataDict(dict):
-    """Subclassed dict type for weakref compatibility."""
-    pass
+    """Subclassed dict type for weakref compatibility.
+
+    `generation` is incremented by every change to the dictionary's items and
+    can be used to tell if cached information about the items is stale.
+
+    """
+    generation = 0
+
+    def __setitem__(self, k, v):
+        self.generation += 1
+        dict.__setitem__(self, k, v)
+
+    def __delitem__(self, k):
+        self.generation += 1
+        dict.__delitem__(self, k)
+
+    def clear(self):
+        self.generation += 1
+        dict.clear(self)
+
+    def pop(self, *args):
+        self.generation += 1
+        return dict.pop(self, *args)
+
+    def popitem(self):
+        self.generation += 1
+        return dict.popitem(self)
+
+    def setdefault(self, k, v=None):
+        self.generation += 1
+        return dict.setdefault(self, k, v)
+
+    def update(self, *args, **kwargs):
+        self.generation += 1
+        dict.update(self, *args, **kwargs)
+
+
+ROW_ROLES = (
+    QtCore.Qt.DisplayRole,
+    QtCore.Qt.DecorationRole,
+    QtCore.Qt.EditRole,
+    QtCore.Qt.ToolTipRole,
+    QtCore.Qt.StatusTipRole,
+    QtCore.Qt.SizeHintRole,
+    FlagsRole,
+    ParentPathRole,
+    DescriptionRole,
+    TodoCountRole,
+    FileDetailsRole,
+    SequenceRole,
+    FramesRole,
+    FileInfoLoaded,
+    ThumbnailLoaded,
+    StartpathRole,
+    EndpathRole,
+    TypeRole,
+    EntryRole,
+    IdRole,
+    AssetCountRole,
+    SortByNameRole,
+    SortByLastModifiedRole,
+    SortBySizeRole,
+    TextSegmentRole,
+)
+"""The roles stored in the slots of :class:`.RowData` instances."""
+
+_ROW_SLOTS = dict((role, '_{}'.format(int(role))) for role in ROW_ROLES)
+
+
+class RowData(object):
+    """A compact, dict-like container of a single row's data.
+
+    A `DataDict` with two dozen role keys takes up several kilobytes. Row
+    data is instead stored in the slots of the instance, each role taking up
+    a single pointer. Roles not in :const:`.ROW_ROLES` are stored in an
+    additional dictionary, created only when needed.
+
+    Instances can be used in place of `DataDict` row data:
+
+    .. code-block:: python
+
+        data[idx] = common.RowData({
+            QtCore.Qt.DisplayRole: u'my_file.ma',
+            common.IdRole: idx,
+        })
+        data[idx][common.IdRole]  # 0
+        weakref.ref(data[idx])
+
+    """
+    __slots__ = tuple(_ROW_SLOTS[f] for f in ROW_ROLES) + ('_extra', '__weakref__')
+
+    def __init__(self, data=None):
+        self._extra = None
+        if data:
+            self.update(data)
+
+    @staticmethod
+    def slot(role):
+        """Returns the name of the slot used to store `role` or `None`."""
+        return _ROW_SLOTS.get(role)
+
+    def __getitem__(self, role):
+        try:
+            return getattr(self, _ROW_SLOTS[role])
+        except AttributeError:
+            raise KeyError(role)
+        except KeyError:
+            if self._extra is None:
+                raise
+            return self._extra[role]
+
+    def __setitem__(self, role, value):
+        if role in _ROW_SLOTS:
+            setattr(self, _ROW_SLOTS[role], value)
+            return
+        if self._extra is None:
+            self._extra = {}
+        self._extra[role] = value
+
+    def __delitem__(self, role):
+        try:
+            delattr(self, _ROW_SLOTS[role])
+        except AttributeError:
+            raise KeyError(role)
+        except KeyError:
+            if self._extra is None:
+                raise
+            del self._extra[role]
+
+    def __contains__(self, role):
+        if role in _ROW_SLOTS:
+            return hasattr(self, _ROW_SLOTS[role])
+        return self._extra is not None and role in self._extra
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __repr__(self):
+        return '<RowData {!r}>'.format(dict(self.iteritems()))
+
+    def get(self, role, default=None):
+        name = _ROW_SLOTS.get(role)
+        if name is not None:
+            return getattr(self, name, default)
+        if self._extra is None:
+            return default
+        return self._extra.get(role, default)
+
+    def keys(self):
+        keys = [f for f in ROW_ROLES if hasattr(self, _ROW_SLOTS[f])]
+        if self._extra:
+            keys += self._extra.keys()
+        return keys
+
+    def values(self):
+        return [self[f] for f in self.keys()]
+
+    def iteritems(self):
+        for k in self.keys():
+            yield k, self[k]
+
+    def items(self):
+        return list(self.iteritems())
+
+    def update(self, data):
+        for k, v in data.iteritems():
+            name = _ROW_SLOTS.get(k)
+            if name is None:
+                self[k] = v
+                continue
+            setattr(self, name, v)
@@ -586,7 +586,7 @@ class DescriptionEditorWidget(LineEdit):
 
         # We'll encode the value so we can store it safely in the database
         v = base64.b64encode(self.text())
-        db.setValue(k, u'description', v)
+        db.queue_value(k, u'description', v)
 
         source_index = index.model().mapToSource(index)
         data = source_index.model().model_data()[source_index.row()]
@@ -0,0 +1,406 @@
+# -*- coding: utf-8 -*-
+"""A persistent, per-task-folder index of the files found on the server.
+
+Listing a large task folder, like a ``render`` folder with hundreds of
+thousands of frames, can take minutes over a network share. To avoid walking
+the whole tree every time a task folder is opened, :class:`.FileIndex`
+records each directory's modification time alongside its entries and saves
+them in the bookmark's ``.bookmark`` folder, next to ``bookmark.db``.
+
+When the task folder is opened again, the model is populated straight from
+the index and :func:`.FileIndex.reconcile` is used to bring it up-to-date:
+only directories whose modification time has changed will be re-listed.
+The first time a task folder is opened, :func:`.FileIndex.walk` builds the
+index whilst yielding the files of each directory as soon as it is listed.
+
+.. code-block:: python
+
+    index = fileindex.get(u'//server', u'job', u'root', u'asset/render')
+    for entry in index.entries():
+        print entry.path
+    if index.reconcile():
+        pass  # The index changed and the model should be reloaded
+
+Note:
+    The module does not depend on Qt so it can be used outside of a running
+    Bookmarks session, eg. by :mod:`.indexserver`.
+
+"""
+import os
+import json
+import zlib
+import hashlib
+import threading
+
+import _scandir
+
+from . import walker
+
+
+VERSION = 1
+"""The version of the index file format."""
+
+INDEXES = {}
+"""Cached FileIndex instances."""
+
+_lock = threading.RLock()
+
+
+def get(server, job, root, relative_path):
+    """Returns a cached :class:`.FileIndex` instance.
+
+    Args:
+        server (unicode): The `server` segment of the bookmark.
+        job (unicode): The `job` segment of the bookmark.
+        root (unicode): The `root` segment of the bookmark.
+        relative_path (unicode): The bookmark-relative path to index, eg. 'asset/scene'.
+
+    Returns:
+        FileIndex: The index of the given path.
+
+    """
+    for arg in (server, job, root, relative_path):
+        if not isinstance(arg, unicode):
+            raise TypeError(
+                u'Expected <type \'unicode\'>, got {}'.format(type(arg)))
+
+    bookmark = u'/'.join((server, job, root))
+    path = bookmark + u'/' + relative_path.strip(u'/')
+    k = path.lower()
+
+    with _lock:
+        if k not in INDEXES:
+            INDEXES[k] = FileIndex(bookmark, path)
+        return INDEXES[k]
+
+
+def reset():
+    """Removes all cached index instances."""
+    global INDEXES
+    with _lock:
+        INDEXES = {}
+
+
+class IndexEntry(object):
+    """A light-weight stand-in for `_scandir.DirEntry` instances.
+
+    Index entries are created from the saved index without touching the disk.
+    `stat()` is only called when the file information is requested, usually
+    by one of the worker threads.
+
+    """
+    __slots__ = ('name', 'path', '_is_dir', '_stat')
+
+    def __init__(self, dirpath, name, is_dir=False):
+        self.name = name
+        self.path = dirpath + u'/' + name
+        self._is_dir = is_dir
+        self._stat = None
+
+    def is_dir(self):
+        return self._is_dir
+
+    def is_file(self):
+        return not self._is_dir
+
+    def is_symlink(self):
+        return False
+
+    def stat(self):
+        if self._stat is None:
+            self._stat = os.stat(self.path)
+        return self._stat
+
+    def __repr__(self):
+        return u'<IndexEntry \'{}\'>'.format(self.name).encode('utf-8')
+
+
+class FileIndex(object):
+    """The index of a single task folder.
+
+    The index data is a dictionary keyed by root-relative directory paths.
+    Each value is a list of the directory's modification time, its files
+    and its subdirectories:
+
+    .. code-block:: python
+
+        {
+            u'': [1588170102.2, [u'a.ma', u'b.ma'], [u'subfolder']],
+            u'subfolder': [1588170104.0, [u'c.ma'], []],
+        }
+
+    Args:
+        bookmark (unicode): Path to the bookmark folder.
+        path (unicode): Path to the folder to index.
+
+    """
+
+    def __init__(self, bookmark, path):
+        self._bookmark = bookmark
+        self._path = path
+        self._data = None
+        self._lock = threading.RLock()
+
+        name = hashlib.md5(path.lower().encode(u'utf-8')).hexdigest()
+        self._index_path = u'{}/.bookmark/{}.index'.format(bookmark, name)
+
+    def path(self):
+        """The path of the indexed folder."""
+        return self._path
+
+    def index_path(self):
+        """The path of the index file."""
+        return self._index_path
+
+    def data(self):
+        """The index data. Loads the index file if it hasn't been loaded yet."""
+        with self._lock:
+            if self._data is None:
+                self._data = self._load()
+            return self._data
+
+    def exists(self):
+        """Returns `True` if the index contains data."""
+        return bool(self.data())
+
+    def _load(self):
+        if not os.path.isfile(self._index_path):
+            return {}
+        try:
+            with open(self._index_path, 'rb') as f:
+                data = json.loads(zlib.decompress(f.read()))
+            if data.get(u'version') != VERSION:
+                return {}
+            return data[u'dirs']
+        except (IOError, OSError, ValueError, KeyError, zlib.error):
+            # A corrupt or unreadable index is treated as empty
+            return {}
+
+    def save(self):
+        """Saves the current index data to the `.bookmark` folder."""
+        with self._lock:
+            data = {u'version': VERSION, u'dirs': self.data()}
+            _dir = os.path.dirname(self._index_path)
+            tmp = u'{}.{}.tmp'.format(self._index_path, os.getpid())
+            try:
+                if not os.path.isdir(_dir):
+                    os.makedirs(_dir)
+                with open(tmp, 'wb') as f:
+                    f.write(zlib.compress(json.dumps(data), 1))
+                if os.path.isfile(self._index_path):
+                    os.remove(self._index_path)
+                os.rename(tmp, self._index_path)
+            except (IOError, OSError):
+                if os.path.isfile(tmp):
+                    os.remove(tmp)
+                return False
+            return True
+
+    def relative_path(self, path):
+        """Returns the index key of the given absolute directory path.
+
+        Returns:
+            unicode: The relative path or `None` if `path` is not in the index.
+
+        """
+        path = path.replace(u'\\', u'/').rstrip(u'/')
+        if path.lower() == self._path.lower():
+            return u''
+        prefix = self._path.lower() + u'/'
+        if not path.lower().startswith(prefix):
+            return None
+        return path[len(prefix):]
+
+    def snapshots(self):
+        """Returns the absolute path, files and subdirectories of each
+        indexed directory.
+
+        Returns:
+            dict: Tuples of file and subdirectory names keyed by the
+            directory path.
+
+        """
+        with self._lock:
+            return dict(
+                (self._path + u'/' + rel if rel else self._path, (v[1], v[2]))
+                for rel, v in self.data().iteritems()
+            )
+
+    def update(self, path, mtime, files, dirs):
+        """Sets the contents of a single directory.
+
+        Args:
+            path (unicode): Absolute path to the directory.
+            mtime (float): The modification time of the directory.
+            files (list): The names of the directory's files.
+            dirs (list): The names of the directory's subdirectories.
+
+        """
+        rel = self.relative_path(path)
+        if rel is None:
+            return
+        with self._lock:
+            self.data()[rel] = [mtime, list(files), list(dirs)]
+
+    def remove(self, path):
+        """Removes a directory and its subdirectories from the index."""
+        rel = self.relative_path(path)
+        if rel is None:
+            return
+        with self._lock:
+            data = self.data()
+            if not rel:
+                data.clear()
+                return
+            prefix = rel + u'/'
+            for k in [f for f in data if f == rel or f.startswith(prefix)]:
+                del data[k]
+
+    def entries(self):
+        """Yields an :class:`.IndexEntry` for every file in the index.
+
+        The method does not touch the disk.
+
+        """
+        data = self.data()
+
+        def _entries(rel):
+            if rel not in data:
+                return
+            _, files, dirs = data[rel]
+            dirpath = self._path + u'/' + rel if rel else self._path
+            for name in files:
+                yield IndexEntry(dirpath, name)
+            for name in dirs:
+                _rel = rel + u'/' + name if rel else name
+                for entry in _entries(_rel):
+                    yield entry
+
+        for entry in _entries(u''):
+            yield entry
+
+    def reconcile(self, threads=walker.DEFAULT_THREADS, interrupt=None):
+        """Brings the index up-to-date with the disk.
+
+        Each indexed directory is checked using a single `stat` call and only
+        the directories with a changed modification time are re-listed.
+        Directories that no longer exist are removed from the index.
+
+        Args:
+            threads (int): The number of directories to check concurrently.
+            interrupt (callable): Returning `True` aborts the reconciliation.
+
+        Returns:
+            bool: `True` if the index has changed.
+
+        """
+        changed = [False, ]
+        for _ in self._reconcile(threads, interrupt, changed):
+            pass
+        return changed[0]
+
+    def walk(self, threads=walker.DEFAULT_THREADS, interrupt=None):
+        """Reconciles the index and yields an :class:`.IndexEntry` for every
+        file as soon as its directory has been checked.
+
+        Unlike calling `reconcile()` before `entries()`, the files are
+        yielded whilst the rest of the tree is still being listed, which is
+        used to build the index of a task folder the first time it is opened.
+
+        Args:
+            threads (int): The number of directories to check concurrently.
+            interrupt (callable): Returning `True` aborts the walk.
+
+        """
+        for dirpath, files, _ in self.walk_dirs(threads=threads, interrupt=interrupt):
+            for name in files:
+                yield IndexEntry(dirpath, name)
+
+    def walk_dirs(self, threads=walker.DEFAULT_THREADS, interrupt=None):
+        """Reconciles the index and yields the absolute path, the files and
+        the subdirectories of each directory as soon as it has been checked.
+
+        The index is saved once all directories have been checked.
+
+        Args:
+            threads (int): The number of directories to check concurrently.
+            interrupt (callable): Returning `True` aborts the walk.
+
+        """
+        for rel, record in self._reconcile(threads, interrupt, [False, ]):
+            dirpath = self._path + u'/' + rel if rel else self._path
+            yield dirpath, record[1], record[2]
+
+    def _reconcile(self, threads, interrupt, changed):
+        """Yields the relative path and the record of each directory as it's
+        checked.
+
+        The index is updated as the directories are checked, and saved once
+        all of them have been. `changed[0]` is set to `True` if the index
+        has changed.
+
+        """
+        data = self.data()
+        seen = set()
+
+        def children(rel, dirs):
+            return [rel + u'/' + f if rel else f for f in dirs]
+
+        def visit(rel):
+            path = self._path + u'/' + rel if rel else self._path
+            try:
+                mtime = os.stat(path).st_mtime
+            except OSError:
+                return (rel, None), []  # The directory has been removed
+
+            if rel in data and data[rel][0] == mtime:
+                return (rel, data[rel]), children(rel, data[rel][2])
+
+            files = []
+            dirs = []
+            try:
+                for entry in _scandir.scandir(path):
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    if not is_dir:
+                        files.append(entry.name)
+                        continue
+
+                    # Symlinked directories are not followed, the same
+                    # way `walker.walk()` handles them
+                    try:
+                        is_symlink = entry.is_symlink()
+                    except OSError:
+                        is_symlink = False
+                    if not is_symlink:
+                        dirs.append(entry.name)
+            except OSError:
+                # Keep the previous listing if the directory can't be read
+                if rel not in data:
+                    return (rel, None), []
+                return (rel, data[rel]), children(rel, data[rel][2])
+            return (rel, [mtime, files, dirs]), children(rel, dirs)
+
+        for rel, record in walker.iterdirs(
+                u'', visit, threads=threads, interrupt=interrupt):
+            if record is None:
+                continue
+            seen.add(rel)
+            if data.get(rel) != record:
+                with self._lock:
+                    data[rel] = record
+                changed[0] = True
+            yield rel, record
+
+        if interrupt and interrupt():
+            return
+
+        with self._lock:
+            for rel in [f for f in data if f not in seen]:
+                del data[rel]
+                changed[0] = True
+
+            if changed[0]:
+                self.save()
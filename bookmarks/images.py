@@ -8,13 +8,21 @@ Thumbnails:
 
     See ``ImageCache.oiio_make_thumbnail()`` for the OpenImageIO wrapper for
     generating thubmanails.
+    Thumbnails can also be generated in separate processes, see
+    ``thumbnailfarm``.
 
 All generated thumbnails and ui resources are cached in ``ImageCache``.
+The cache can be written by several thumbnail threads at the same time.
+The images loaded by the threads are converted to pixmaps by the
+``PixmapUploader`` when the gui thread is idle.
 
 """
 import uuid
 import os
+import time
+import threading
 import functools
+import collections
 import OpenImageIO
 import _scandir
 
@@ -23,6 +31,8 @@ from PySide2 import QtWidgets, QtGui, QtCore
 from . import log
 from . import common
 from . import defaultpaths
+from . import thumbnailfarm
+from . import shardedcache
 
 
 oiio_cache = OpenImageIO.ImageCache(shared=True)
@@ -37,12 +47,24 @@ ImageType = PixmapType + 1
 ResourcePixmapType = ImageType + 1
 ColorType = ResourcePixmapType + 1
 
+UPLOAD_BUDGET = 4
+"""The time, in milliseconds, the ``PixmapUploader`` spends converting images
+per event loop iteration."""
+
+_uploader = []
+_uploader_lock = threading.Lock()
+
 _capture_widget = None
 _library_widget = None
 _filedialog_widget = None
 _viewer_widget = None
 
 
+def _is_gui_thread():
+    app = QtWidgets.QApplication.instance()
+    return app is not None and app.thread() == QtCore.QThread.currentThread()
+
+
 @QtCore.Slot(QtCore.QModelIndex)
 @QtCore.Slot(unicode)
 def set_from_source(index, source):
@@ -78,6 +100,14 @@ def set_from_source(index, source):
         common_ui.ErrorBox(s, u'').open()
         raise RuntimeError(s)
 
+    # The thumbnail wasn't made from the item's file and must not be replaced
+    # when the file changes
+    from . import bookmark_db
+    pp = index.data(common.ParentPathRole)
+    db = bookmark_db.get_db(pp[0], pp[1], pp[2])
+    db.queue_value(index.data(QtCore.Qt.StatusTipRole), u'mtime', None)
+    db.queue_value(index.data(QtCore.Qt.StatusTipRole), u'size', None)
+
     # Flush and re-cache
     size = int(index.data(QtCore.Qt.SizeHintRole).height())
 
@@ -280,6 +310,15 @@ def oiio_get_buf(source, hash=None, force=False):
 
     # If all went well, we can initiate an ImageBuf
     i.close()
+
+    # Threads requesting the same file at the same time share the result. The
+    # gui thread doesn't wait for a worker that's reading the file already
+    return ImageCache.INTERNAL_DATA.coalesce(
+        (BufferType, hash), _oiio_read_buf, source, hash,
+        wait=not _is_gui_thread())
+
+
+def _oiio_read_buf(source, hash):
     buf = OpenImageIO.ImageBuf()
     buf.reset(source, 0, 0)
     if buf.has_error:
@@ -377,22 +416,21 @@ class ImageCache(QtCore.QObject):
     methods. Application resources are loaded by
     ``ImageCache.get_rsc_pixmap()``.
 
+    ``INTERNAL_DATA`` is a :class:`.shardedcache.ShardedCache`, so images and
+    colours can be loaded from several threads while the gui thread reads
+    them. Concurrent requests to load the same image are coalesced, and
+    the image is only decoded once.
+
     """
     COLOR_DATA = common.DataDict()
     RESOURCE_DATA = common.DataDict()
     PIXEL_DATA = common.DataDict()
-    INTERNAL_DATA = common.DataDict({
-        BufferType: common.DataDict(),
-        PixmapType: common.DataDict(),
-        ImageType: common.DataDict(),
-        ResourcePixmapType: common.DataDict(),
-        ColorType: common.DataDict(),
-    })
+    INTERNAL_DATA = shardedcache.ShardedCache()
 
     @classmethod
     def contains(cls, hash, cache_type):
         """Checks if the given hash exists in the database."""
-        return hash in cls.INTERNAL_DATA[cache_type]
+        return cls.INTERNAL_DATA.contains(hash, cache_type)
 
     @classmethod
     def value(cls, hash, cache_type, size=None):
@@ -402,13 +440,7 @@ class ImageCache(QtCore.QObject):
             hash (str): A hash value generated by `common.get_hash`
 
         """
-        if not cls.contains(hash, cache_type):
-            return None
-        if size is not None:
-            if size not in cls.INTERNAL_DATA[cache_type][hash]:
-                return None
-            return cls.INTERNAL_DATA[cache_type][hash][size]
-        return cls.INTERNAL_DATA[cache_type][hash]
+        return cls.INTERNAL_DATA.value(hash, cache_type, size=size)
 
     @classmethod
     def setValue(cls, hash, value, cache_type, size=None):
@@ -418,16 +450,12 @@ class ImageCache(QtCore.QObject):
         setting the new value. This only applies to Image- and PixmapTypes.
 
         """
-        if not cls.contains(hash, cache_type):
-            cls.INTERNAL_DATA[cache_type][hash] = common.DataDict()
-
         if cache_type == BufferType:
             if not isinstance(value, OpenImageIO.ImageBuf):
                 raise TypeError(
                     u'Invalid type. Expected <type \'ImageBuf\'>, got {}'.format(type(value)))
 
-            cls.INTERNAL_DATA[BufferType][hash] = value
-            return cls.INTERNAL_DATA[BufferType][hash]
+            return cls.INTERNAL_DATA.set_value(hash, value, BufferType)
 
         elif cache_type == ImageType:
             if not isinstance(value, QtGui.QImage):
@@ -439,8 +467,7 @@ class ImageCache(QtCore.QObject):
             if not isinstance(size, int):
                 size = int(size)
 
-            cls.INTERNAL_DATA[cache_type][hash][size] = value
-            return cls.INTERNAL_DATA[cache_type][hash][size]
+            return cls.INTERNAL_DATA.set_value(hash, value, cache_type, size=size)
 
         elif cache_type == PixmapType or cache_type == ResourcePixmapType:
             if not isinstance(value, QtGui.QPixmap):
@@ -450,25 +477,21 @@ class ImageCache(QtCore.QObject):
             if not isinstance(size, int):
                 size = int(size)
 
-            cls.INTERNAL_DATA[cache_type][hash][size] = value
-            return cls.INTERNAL_DATA[cache_type][hash][size]
+            return cls.INTERNAL_DATA.set_value(hash, value, cache_type, size=size)
 
         elif cache_type == ColorType:
             if not isinstance(value, QtGui.QColor):
                 raise TypeError(
                     u'Invalid type. Expected <type \'QColor\'>, got {}'.format(type(value)))
 
-            cls.INTERNAL_DATA[ColorType][hash] = value
-            return cls.INTERNAL_DATA[ColorType][hash]
+            return cls.INTERNAL_DATA.set_value(hash, value, ColorType)
         else:
             raise TypeError('Invalid cache type.')
 
     @classmethod
     def flush(cls, source):
         hash = common.get_hash(source)
-        for k in cls.INTERNAL_DATA:
-            if hash in cls.INTERNAL_DATA[k]:
-                del cls.INTERNAL_DATA[k][hash]
+        cls.INTERNAL_DATA.remove(hash)
 
     @classmethod
     def get_pixmap(cls, source, size, hash=None, force=False):
@@ -549,37 +572,21 @@ class ImageCache(QtCore.QObject):
 
     @classmethod
     def make_color(cls, source):
+        hash = common.get_hash(source)
+        return cls.INTERNAL_DATA.coalesce(
+            (ColorType, hash), cls._make_color, source, hash,
+            wait=not _is_gui_thread())
+
+    @classmethod
+    def _make_color(cls, source, hash):
         buf = oiio_get_buf(source)
         if not buf:
             return None
 
-        hash = common.get_hash(source)
-
-        stats = OpenImageIO.ImageBufAlgo.computePixelStats(buf)
-        if not stats:
-            return None
-        if stats.avg and len(stats.avg) > 3:
-            color = QtGui.QColor(
-                int(stats.avg[0] * 255),
-                int(stats.avg[1] * 255),
-                int(stats.avg[2] * 255),
-                a=240
-                # a=int(stats.avg[3] * 255)
-            )
-        elif stats.avg and len(stats.avg) == 3:
-            color = QtGui.QColor(
-                int(stats.avg[0] * 255),
-                int(stats.avg[1] * 255),
-                int(stats.avg[2] * 255),
-            )
-        elif stats.avg and len(stats.avg) < 3:
-            color = QtGui.QColor(
-                int(stats.avg[0] * 255),
-                int(stats.avg[0] * 255),
-                int(stats.avg[0] * 255),
-            )
-        else:
+        rgba = thumbnailfarm.average_color(buf)
+        if not rgba:
             return None
+        color = QtGui.QColor(*rgba)
 
         cls.setValue(hash, color, ColorType)
         return color
@@ -599,7 +606,8 @@ class ImageCache(QtCore.QObject):
             hash (str):         Use this hash key instead source to store the data.
 
         Returns:
-            QImage: The loaded and resized QImage, or `None` if loading fails.
+            QImage: The loaded and resized QImage, or `None` if loading fails,
+            or if another thread is loading it and the caller is the gui thread.
 
         """
         if not isinstance(source, unicode):
@@ -620,6 +628,22 @@ class ImageCache(QtCore.QObject):
             if data:
                 return data
 
+        # Threads requesting the same image at the same time share the result.
+        # The gui thread gets `None` instead of waiting for a worker to
+        # finish loading it, and the image is painted once it's loaded
+        return cls.INTERNAL_DATA.coalesce(
+            (ImageType, hash, size), cls._load_image, source, size, hash, force,
+            wait=not _is_gui_thread())
+
+    @classmethod
+    def _load_image(cls, source, size, hash, force):
+        # Another thread might have finished loading the image since we
+        # checked the cache
+        if not force:
+            data = cls.value(hash, ImageType, size=size)
+            if data:
+                return data
+
         # If not yet stored, load and save the data
         buf = oiio_get_buf(source, hash=hash, force=force)
         if not buf:
@@ -636,6 +660,11 @@ class ImageCache(QtCore.QObject):
 
         # ...and store
         cls.setValue(hash, image, ImageType, size=size)
+
+        # The pixmap will be created before the image is first painted
+        uploader = get_uploader()
+        if uploader:
+            uploader.request(hash, size, force=force)
         return image
 
     @staticmethod
@@ -747,117 +776,16 @@ class ImageCache(QtCore.QObject):
         """
         log.debug(u'Converting {}...'.format(source), cls)
 
-        def get_scaled_spec(source_spec):
-            w = source_spec.width
-            h = source_spec.height
-            factor = float(size) / max(float(w), float(h))
-            w *= factor
-            h *= factor
-
-            s = OpenImageIO.ImageSpec(int(w), int(h), 4, OpenImageIO.UINT8)
-            s.channelnames = (u'R', u'G', u'B', u'A')
-            s.alpha_channel = 3
-            s.attribute(u'oiio:ColorSpace', u'sRGB')
-            s.attribute(u'oiio:Gamma', u'0.454545')
-            return s
-
-        def shuffle_channels(buf, source_spec):
-            if int(source_spec.nchannels) < 3:
-                buf = OpenImageIO.ImageBufAlgo.channels(
-                    buf,
-                    (source_spec.channelnames[0], source_spec.channelnames[0],
-                     source_spec.channelnames[0]),
-                    (u'R', u'G', u'B')
-                )
-            elif int(source_spec.nchannels) > 4:
-                if source_spec.channelindex(u'A') > -1:
-                    buf = OpenImageIO.ImageBufAlgo.channels(
-                        buf, (u'R', u'G', u'B', u'A'), (u'R', u'G', u'B', u'A'))
-                else:
-                    buf = OpenImageIO.ImageBufAlgo.channels(
-                        buf, (u'R', u'G', u'B'), (u'R', u'G', u'B'))
-            return buf
-
-        def resize(buf, source_spec):
-            buf = OpenImageIO.ImageBufAlgo.resample(
-                buf, roi=destination_spec.roi, interpolate=True, nthreads=nthreads)
-            return buf
-
-        def flatten(buf, source_spec):
-            if source_spec.deep:
-                buf = OpenImageIO.ImageBufAlgo.flatten(buf, nthreads=nthreads)
-            return buf
-
-        def convert_color(buf, source_spec):
-            colorspace = source_spec.get_string_attribute(u'oiio:ColorSpace')
-            try:
-                if colorspace != u'sRGB':
-                    buf = OpenImageIO.ImageBufAlgo.colorconvert(
-                        buf, colorspace, u'sRGB')
-            except:
-                log.error(u'Could not convert the color profile')
-            return buf
-
         buf = oiio_get_buf(source)
         if not buf:
             return False
-        source_spec = buf.spec()
-        if source_spec.get_int_attribute(u'oiio:Movie') == 1:
-            accepted_codecs = (u'h.264', u'h264', u'mpeg-4', u'mpeg4')
-            codec_name = source_spec.get_string_attribute(u'ffmpeg:codec_name')
-            # [BUG] Not all codec formats are supported by ffmpeg. There does
-            # not seem to be (?) error handling and an unsupported codec will
-            # crash ffmpeg and the rest of the app.
-            if codec_name:
-                if not [f for f in accepted_codecs if f.lower() in codec_name.lower()]:
-                    log.debug(
-                        u'Unsupported movie format: {}'.format(codec_name))
-                    oiio_cache.invalidate(source, force=True)
-                    return False
-
-        destination_spec = get_scaled_spec(source_spec)
-        buf = shuffle_channels(buf, source_spec)
-        buf = flatten(buf, source_spec)
-        # buf = convert_color(buf, source_spec)
-        buf = resize(buf, source_spec)
-
-        if buf.nchannels > 3:
-            background_buf = OpenImageIO.ImageBuf(destination_spec)
-            OpenImageIO.ImageBufAlgo.checker(
-                background_buf,
-                12, 12, 1,
-                (0.3, 0.3, 0.3),
-                (0.2, 0.2, 0.2)
-            )
-            buf = OpenImageIO.ImageBufAlgo.over(buf, background_buf)
-
-        spec = buf.spec()
-        buf.set_write_format(OpenImageIO.UINT8)
-
-        # There seems to be a problem with the ICC profile exported from Adobe
-        # applications and the PNG library. The sRGB profile seems to be out of
-        # date and pnglib crashes when encounters an invalid profile. Removing
-        # the ICC profile seems to fix the issue.
-        _spec = OpenImageIO.ImageSpec()
-        _spec.from_xml(spec.to_xml())  # this doesn't copy the extra attributes
-        for i in spec.extra_attribs:
-            if i.name.lower() == u'iccprofile':
-                continue
-            try:
-                _spec[i.name] = i.value
-            except:
-                continue
-        spec = _spec
-
-        # On some dpx images I'm getting "GammaCorrectedinf"
-        if spec.get_string_attribute(u'oiio:ColorSpace') == u'GammaCorrectedinf':
-            spec[u'oiio:ColorSpace'] = u'sRGB'
-            spec[u'oiio:Gamma'] = u'0.454545'
+        if not thumbnailfarm.accepted_codec(buf.spec()):
+            log.debug(u'Unsupported movie format: {}'.format(
+                buf.spec().get_string_attribute(u'ffmpeg:codec_name')))
+            oiio_cache.invalidate(source, force=True)
+            return False
 
-        # Initiating a new spec with the modified spec
-        _buf = OpenImageIO.ImageBuf(spec)
-        _buf.copy_pixels(buf)
-        _buf.set_write_format(OpenImageIO.UINT8)
+        _buf = thumbnailfarm.convert(buf, size, nthreads=nthreads)
 
         if not QtCore.QFileInfo(QtCore.QFileInfo(destination).path()).isWritable():
             oiio_cache.invalidate(source, force=True)
@@ -869,7 +797,7 @@ class ImageCache(QtCore.QObject):
 
         if not success:
             s = u'{}\n{}'.format(
-                buf.geterror(),
+                _buf.geterror(),
                 OpenImageIO.geterror())
             log.error(s)
 
@@ -885,6 +813,108 @@ class ImageCache(QtCore.QObject):
         return True
 
 
+def get_uploader():
+    """Returns the shared ``PixmapUploader``.
+
+    The uploader is created on first use, and is moved to the gui thread.
+
+    Returns:
+        PixmapUploader: The uploader, or `None` if there's no QApplication.
+
+    """
+    with _uploader_lock:
+        if not _uploader:
+            app = QtWidgets.QApplication.instance()
+            if not app:
+                return None
+            uploader = PixmapUploader()
+            uploader.moveToThread(app.thread())
+            _uploader.append(uploader)
+        return _uploader[0]
+
+
+class PixmapUploader(QtCore.QObject):
+    """Converts cached images to pixmaps when the gui thread is idle.
+
+    QPixmaps can only be created in the gui thread, so the thumbnail threads
+    load QImages instead, and the pixmaps used to be created by
+    `ImageCache.get_pixmap()` when a thumbnail was first painted. A frame
+    showing a page of new thumbnails had to convert all of them.
+
+    The loaded images are queued using `request()` instead, and converted by
+    a zero-interval timer, which only fires when the event loop has no other
+    events to process. Each time it fires, conversions run for at most
+    `UPLOAD_BUDGET` milliseconds.
+
+    """
+    scheduled = QtCore.Signal()
+
+    def __init__(self, parent=None):
+        super(PixmapUploader, self).__init__(parent=parent)
+        self._queue = collections.deque()
+        self._lock = threading.Lock()
+        self._scheduled = False
+
+        self.timer = QtCore.QTimer(parent=self)
+        self.timer.setInterval(0)
+        self.timer.timeout.connect(self.process)
+
+        # Requests can come from any thread, but the timer is started in the
+        # uploader's thread
+        self.scheduled.connect(self.timer.start)
+
+    def __len__(self):
+        return len(self._queue)
+
+    def request(self, hash, size, force=False):
+        """Queues a cached image to be converted to a pixmap.
+
+        Args:
+            hash (str): The image's hash.
+            size (int): The image's size.
+            force (bool): Replace the pixmap if one is already cached.
+
+        """
+        with self._lock:
+            self._queue.append((hash, size, force))
+            if self._scheduled:
+                return
+            self._scheduled = True
+        self.scheduled.emit()
+
+    @QtCore.Slot()
+    def process(self, budget=UPLOAD_BUDGET):
+        """Converts queued images until `budget` milliseconds have passed.
+
+        Returns:
+            int: The number of converted images.
+
+        """
+        n = 0
+        t = time.time() + budget / 1000.0
+        while time.time() < t:
+            with self._lock:
+                if not self._queue:
+                    self._scheduled = False
+                    self.timer.stop()
+                    return n
+                hash, size, force = self._queue.popleft()
+
+            if not force and ImageCache.value(hash, PixmapType, size=size):
+                continue
+            image = ImageCache.value(hash, ImageType, size=size)
+            if not image:
+                continue
+
+            pixmap = QtGui.QPixmap()
+            pixmap.convertFromImage(image, flags=QtCore.Qt.ColorOnly)
+            if pixmap.isNull():
+                continue
+            ImageCache.setValue(hash, pixmap, PixmapType, size=size)
+            n += 1
+        return n
+
+
 class ScreenCapture(QtWidgets.QDialog):
     """A modal capture widget used to save a thumbnail.
 
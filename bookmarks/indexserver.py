@@ -0,0 +1,676 @@
+# -*- coding: utf-8 -*-
+"""A local service that lists and indexes folders for all running Bookmarks
+instances.
+
+Artists often run the standalone Bookmarks next to the one embedded in Maya,
+and each instance would list and watch the same job folders separately. When
+the ``Index server`` preference is enabled, the instances ask the
+:class:`.IndexServer` instead: the server owns the :mod:`.fileindex` indexes,
+lists the folders, reconciles the indexes and watches the indexed folders
+for changes, and streams the results back to every connected client.
+
+The server is started using:
+
+.. code-block:: bash
+
+    python -m bookmarks.indexserver
+
+The clients talk to the server over a `QLocalSocket` using newline separated
+JSON messages. Each request has an `id` and a `method`, and the server
+answers with one or more messages carrying the same `id`. The last message
+has `done` set. Change notifications are sent as messages with an `event`
+key and no `id`.
+
+.. code-block:: python
+
+    # Lists a folder, or uses scandir when the server is not running
+    for entry in indexserver.scandir(u'//server/job/root'):
+        print entry.name
+
+    # Yields the files of an indexed task folder
+    for entry in indexserver.walk(u'//server', u'job', u'root', u'asset/scenes'):
+        print entry.path
+
+The blocking :class:`.IndexClient` can be used from any thread, the
+:class:`.IndexWatcher` receives the change notifications on the gui thread.
+
+"""
+import os
+import sys
+import json
+import time
+import getpass
+import threading
+import functools
+
+import _scandir
+from PySide2 import QtCore, QtNetwork
+
+from . import log
+from . import common
+from . import walker
+from . import fileindex
+from . import changefeed
+
+
+TIMEOUT = 3000
+"""Milliseconds to wait for the server to answer a short request."""
+
+CHUNK_SIZE = 500
+"""The number of directories sent in a single `walk` message."""
+
+CHUNK_INTERVAL = 0.1
+"""Seconds after which the directories listed so far are sent."""
+
+RECONCILE_INTERVAL = 10.0
+"""Seconds to wait before an index is reconciled again."""
+
+MAX_LISTINGS = 4096
+"""The maximum number of folder listings the server keeps in memory."""
+
+
+def server_name():
+    """The name of the local socket. Each user runs their own server."""
+    try:
+        user = getpass.getuser()
+    except Exception:
+        user = u'user'
+    return u'{}IndexServer_{}'.format(common.PRODUCT, user)
+
+
+def _encode(msg):
+    return json.dumps(msg) + '\n'
+
+
+def _list_dir(path):
+    """Returns the mtime and the file and directory names of `path`."""
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return None, [], []
+
+    files = []
+    dirs = []
+    try:
+        for entry in _scandir.scandir(path):
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if is_dir:
+                dirs.append(entry.name)
+            else:
+                files.append(entry.name)
+    except OSError:
+        return None, [], []
+    return mtime, files, dirs
+
+
+def _dump_change(change):
+    return [
+        change.path,
+        change.mtime,
+        change.files,
+        change.dirs,
+        [f.name for f in change.added],
+        change.removed,
+        change.added_dirs,
+        change.removed_dirs,
+        [f.name for f in change.modified],
+    ]
+
+
+def _load_change(v):
+    path = v[0]
+    return changefeed.Change(
+        path, v[1], v[2], v[3],
+        [fileindex.IndexEntry(path, f) for f in v[4]],
+        v[5], v[6], v[7],
+        [fileindex.IndexEntry(path, f) for f in v[8]]
+    )
+
+
+class IndexServer(QtCore.QObject):
+    """The server answering the requests of the Bookmarks instances.
+
+    Folders are listed and indexed on separate threads, the replies are
+    written to the sockets on the thread the server lives on.
+
+    Args:
+        name (unicode): The name of the local socket, see :func:`.server_name`.
+        threads (int): The number of folders to list concurrently.
+
+    """
+    _reply = QtCore.Signal(int, object)
+    _reconciled = QtCore.Signal(unicode)
+
+    def __init__(self, name=None, threads=walker.DEFAULT_THREADS, parent=None):
+        super(IndexServer, self).__init__(parent=parent)
+        self.name = name if name else server_name()
+        self.threads = threads
+
+        self.server = QtNetwork.QLocalServer(parent=self)
+
+        self._next_id = 0
+        self._sockets = {}
+        self._buffers = {}
+        self._watchers = {}
+        self._feeds = {}
+        self._segments = {}
+        self._listings = {}
+        self._reconciled_at = {}
+        self._lock = threading.Lock()
+
+        self.server.newConnection.connect(self.new_connection)
+        self._reply.connect(self.send, QtCore.Qt.QueuedConnection)
+        self._reconciled.connect(self.reconciled, QtCore.Qt.QueuedConnection)
+
+    def listen(self):
+        """Starts the server.
+
+        Returns:
+            bool: `False` if the server is already running or couldn't start.
+
+        """
+        if is_running(name=self.name):
+            return False
+        # Removes the socket file left behind by a crashed server
+        QtNetwork.QLocalServer.removeServer(self.name)
+        return self.server.listen(self.name)
+
+    def close(self):
+        """Stops the server and disconnects all clients."""
+        self.server.close()
+        for feed in self._feeds.itervalues():
+            feed.clear()
+        self._feeds = {}
+        self._segments = {}
+        self._watchers = {}
+        for socket in self._sockets.values():
+            socket.disconnectFromServer()
+        self._sockets = {}
+        self._buffers = {}
+
+    @QtCore.Slot()
+    def new_connection(self):
+        while self.server.hasPendingConnections():
+            socket = self.server.nextPendingConnection()
+            cid = self._next_id
+            self._next_id += 1
+
+            self._sockets[cid] = socket
+            self._buffers[cid] = ''
+            socket.readyRead.connect(functools.partial(self.read, cid))
+            socket.disconnected.connect(functools.partial(self.disconnected, cid))
+
+    @QtCore.Slot(int)
+    def disconnected(self, cid):
+        socket = self._sockets.pop(cid, None)
+        self._buffers.pop(cid, None)
+        for k in self._watchers.keys():
+            self._unwatch(cid, k)
+        if socket is not None:
+            socket.deleteLater()
+
+    @QtCore.Slot(int)
+    def read(self, cid):
+        socket = self._sockets.get(cid)
+        if socket is None:
+            return
+
+        lines = (self._buffers[cid] + socket.readAll().data()).split('\n')
+        self._buffers[cid] = lines.pop()
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                msg = json.loads(line)
+            except ValueError:
+                self.send(cid, {u'error': u'Invalid request', u'done': True})
+                continue
+            self.handle(cid, msg)
+
+    @QtCore.Slot(int, object)
+    def send(self, cid, msg):
+        """Writes a message to the client's socket."""
+        socket = self._sockets.get(cid)
+        if socket is None:
+            return
+        socket.write(_encode(msg))
+        socket.flush()
+
+    def handle(self, cid, msg):
+        """Dispatches a request."""
+        rid = msg.get(u'id')
+        method = msg.get(u'method')
+
+        def run(func, *args):
+            def _run():
+                try:
+                    func(cid, rid, *args)
+                except Exception as e:
+                    self._reply.emit(
+                        cid, {u'id': rid, u'error': unicode(e), u'done': True})
+            thread = threading.Thread(target=_run)
+            thread.daemon = True
+            thread.start()
+
+        try:
+            if method == u'ping':
+                self.send(cid, {u'id': rid, u'done': True})
+            elif method == u'list':
+                run(self._list, msg[u'path'])
+            elif method == u'walk':
+                run(self._walk, msg[u'segments'])
+            elif method == u'watch':
+                self._watch(cid, msg[u'path'], msg.get(u'segments'))
+                self.send(cid, {u'id': rid, u'done': True})
+            elif method == u'unwatch':
+                self._unwatch(cid, msg[u'path'].lower())
+                self.send(cid, {u'id': rid, u'done': True})
+            else:
+                raise ValueError(u'Unknown method: {}'.format(method))
+        except Exception as e:
+            self.send(cid, {u'id': rid, u'error': unicode(e), u'done': True})
+
+    def _list(self, cid, rid, path):
+        """Lists a single folder. Unchanged folders are listed only once."""
+        k = path.lower()
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            mtime = None
+
+        with self._lock:
+            v = self._listings.get(k)
+        if mtime is None or v is None or v[0] != mtime:
+            v = _list_dir(path)
+            with self._lock:
+                if len(self._listings) >= MAX_LISTINGS:
+                    self._listings.clear()
+                self._listings[k] = v
+
+        if v[0] is None:
+            raise OSError(u'Could not list {}'.format(path))
+        self._reply.emit(
+            cid, {u'id': rid, u'files': v[1], u'dirs': v[2], u'done': True})
+
+    def _walk(self, cid, rid, segments):
+        """Sends the indexed directories of a folder.
+
+        A missing index is built whilst its directories are sent, as soon as
+        they are listed, and saved once the whole folder has been listed. An
+        existing index is sent straight away and reconciled afterwards. The
+        watching clients are notified if the index has changed.
+
+        """
+        index = fileindex.get(*segments)
+        exists = index.exists()
+        if exists:
+            it = (
+                (path, files, dirs)
+                for path, (files, dirs) in index.snapshots().iteritems()
+            )
+        else:
+            it = index.walk_dirs(threads=self.threads)
+
+        chunk = []
+        t = time.time()
+        for path, files, dirs in it:
+            chunk.append([path, files, dirs])
+            if len(chunk) >= CHUNK_SIZE or (time.time() - t) > CHUNK_INTERVAL:
+                self._reply.emit(cid, {u'id': rid, u'dirs': chunk})
+                chunk = []
+                t = time.time()
+        self._reply.emit(cid, {u'id': rid, u'dirs': chunk, u'done': True})
+
+        if not exists:
+            return
+
+        # Several clients opening the same folder only reconcile it once
+        k = index.path().lower()
+        with self._lock:
+            if time.time() - self._reconciled_at.get(k, 0) < RECONCILE_INTERVAL:
+                return
+            self._reconciled_at[k] = time.time()
+        if index.reconcile(threads=self.threads):
+            self._reconciled.emit(index.path())
+
+    def _watch(self, cid, path, segments):
+        k = path.lower()
+        self._watchers.setdefault(k, set()).add(cid)
+        if k in self._feeds:
+            return
+
+        feed = changefeed.ChangeFeed(recursive=bool(segments), parent=self)
+        feed.changed.connect(functools.partial(self.feed_changed, path, segments))
+        self._feeds[k] = feed
+        self._segments[k] = segments
+
+        if segments:
+            feed.watch(fileindex.get(*segments).snapshots())
+        else:
+            mtime, files, dirs = _list_dir(path)
+            if mtime is not None:
+                feed.watch({path: (files, dirs)})
+
+    def _unwatch(self, cid, k):
+        if k not in self._watchers:
+            return
+        self._watchers[k].discard(cid)
+        if self._watchers[k]:
+            return
+        del self._watchers[k]
+        self._segments.pop(k, None)
+        feed = self._feeds.pop(k, None)
+        if feed is not None:
+            feed.clear()
+            feed.deleteLater()
+
+    def broadcast(self, path, msg):
+        """Sends a message to the clients watching `path`."""
+        for cid in list(self._watchers.get(path.lower(), ())):
+            self.send(cid, msg)
+
+    def feed_changed(self, path, segments, changes):
+        """Updates the index and notifies the clients watching `path`."""
+        if segments:
+            index = fileindex.get(*segments)
+            for change in changes:
+                if change.mtime is None:
+                    index.remove(change.path)
+                else:
+                    index.update(
+                        change.path, change.mtime, change.files, change.dirs)
+            thread = threading.Thread(target=index.save)
+            thread.daemon = True
+            thread.start()
+
+        with self._lock:
+            for change in changes:
+                self._listings.pop(change.path.lower(), None)
+
+        self.broadcast(path, {
+            u'event': u'changes',
+            u'path': path,
+            u'changes': [_dump_change(f) for f in changes],
+        })
+
+    @QtCore.Slot(unicode)
+    def reconciled(self, path):
+        """Re-watches a reconciled index and notifies the watching clients."""
+        k = path.lower()
+        if self._segments.get(k):
+            self._feeds[k].watch(fileindex.get(*self._segments[k]).snapshots())
+        self.broadcast(path, {u'event': u'reconciled', u'path': path})
+
+
+class IndexClient(object):
+    """A blocking index server client.
+
+    The client can be used from any thread, but a client instance must only
+    be used by the thread that created it.
+
+    Args:
+        name (unicode): The name of the server's socket.
+        timeout (int): Milliseconds to wait for short requests.
+
+    """
+
+    def __init__(self, name=None, timeout=TIMEOUT):
+        self.name = name if name else server_name()
+        self.timeout = timeout
+        self.socket = None
+        self._buffer = ''
+        self._id = 0
+
+    def connect(self):
+        """Connects to the server.
+
+        Returns:
+            bool: `False` if the server is not running.
+
+        """
+        if self.socket is not None:
+            return True
+        socket = QtNetwork.QLocalSocket()
+        socket.connectToServer(self.name)
+        if not socket.waitForConnected(self.timeout):
+            return False
+        self.socket = socket
+        return True
+
+    def close(self):
+        if self.socket is None:
+            return
+        self.socket.disconnectFromServer()
+        self.socket = None
+        self._buffer = ''
+
+    def request(self, method, interrupt=None, timeout=None, **kwargs):
+        """Sends a request and yields the server's replies.
+
+        Args:
+            method (unicode): The requested method.
+            interrupt (callable): Returning `True` aborts waiting for replies.
+            timeout (int): Milliseconds to wait for each reply, or `None` to
+                wait for as long as the server is connected.
+
+        Raises:
+            IOError: When the server is not running or returned an error.
+
+        """
+        if not self.connect():
+            raise IOError(u'The index server is not running')
+
+        self._id += 1
+        rid = self._id
+        kwargs[u'id'] = rid
+        kwargs[u'method'] = method
+        self.socket.write(_encode(kwargs))
+        self.socket.flush()
+
+        while True:
+            msg = self._read(timeout, interrupt)
+            if msg is None:
+                return
+            if msg.get(u'id') != rid:
+                continue
+            if u'error' in msg:
+                raise IOError(msg[u'error'])
+            yield msg
+            if msg.get(u'done'):
+                return
+
+    def _read(self, timeout, interrupt):
+        t = time.time()
+        while '\n' not in self._buffer:
+            if interrupt and interrupt():
+                self.close()
+                return None
+            if self.socket.state() != QtNetwork.QLocalSocket.ConnectedState:
+                self.close()
+                raise IOError(u'The index server has disconnected')
+            if timeout is not None and (time.time() - t) * 1000.0 > timeout:
+                self.close()
+                raise IOError(u'The index server did not respond')
+            if self.socket.waitForReadyRead(250):
+                self._buffer += self.socket.readAll().data()
+        line, self._buffer = self._buffer.split('\n', 1)
+        return json.loads(line)
+
+
+def is_running(name=None):
+    """Returns `True` if the index server is accepting connections."""
+    client = IndexClient(name=name)
+    try:
+        return client.connect()
+    finally:
+        client.close()
+
+
+def scandir(path, name=None):
+    """Lists `path` using the index server.
+
+    Falls back to `_scandir.scandir` when the server is not running.
+
+    Returns:
+        list: :class:`.fileindex.IndexEntry` or `DirEntry` instances.
+
+    """
+    client = IndexClient(name=name)
+    try:
+        for msg in client.request(u'list', timeout=client.timeout, path=path):
+            return (
+                [fileindex.IndexEntry(path, f, is_dir=True) for f in msg[u'dirs']] +
+                [fileindex.IndexEntry(path, f) for f in msg[u'files']]
+            )
+    except IOError:
+        pass
+    finally:
+        client.close()
+    return list(_scandir.scandir(path))
+
+
+def walk(server, job, root, relative_path, interrupt=None, fallback=None, name=None):
+    """Yields the files of an indexed folder using the index server.
+
+    The server connection is made when the iteration starts, so the iterator
+    can be consumed by a different thread than the one calling the function.
+
+    Args:
+        server (unicode): The `server` segment of the bookmark.
+        job (unicode): The `job` segment of the bookmark.
+        root (unicode): The `root` segment of the bookmark.
+        relative_path (unicode): The bookmark-relative path of the folder.
+        interrupt (callable): Returning `True` aborts the walk.
+        fallback (callable): Returns the iterator used when the server is
+            not running. Defaults to reconciling the folder's index locally.
+
+    Yields:
+        fileindex.IndexEntry: A file entry.
+
+    """
+    client = IndexClient(name=name)
+    if not client.connect():
+        if fallback:
+            it = fallback()
+        else:
+            it = _local_walk(server, job, root, relative_path, interrupt)
+        for entry in it:
+            yield entry
+        return
+
+    try:
+        segments = [server, job, root, relative_path]
+        for msg in client.request(u'walk', interrupt=interrupt, segments=segments):
+            for path, files, _ in msg.get(u'dirs', ()):
+                for f in files:
+                    yield fileindex.IndexEntry(path, f)
+    finally:
+        client.close()
+
+
+def _local_walk(server, job, root, relative_path, interrupt):
+    index = fileindex.get(server, job, root, relative_path)
+    index.reconcile(interrupt=interrupt)
+    for entry in index.entries():
+        yield entry
+
+
+class IndexWatcher(QtCore.QObject):
+    """Receives the index server's change notifications.
+
+    The `changed` signal is emitted with the watched path and a list of
+    :class:`.changefeed.Change` items. `reconciled` is emitted when the
+    server has reconciled the watched folder's index and the folder should be
+    reloaded.
+
+    """
+    changed = QtCore.Signal(unicode, object)
+    reconciled = QtCore.Signal(unicode)
+
+    def __init__(self, name=None, parent=None):
+        super(IndexWatcher, self).__init__(parent=parent)
+        self.name = name if name else server_name()
+        self.socket = QtNetwork.QLocalSocket(parent=self)
+        self.socket.readyRead.connect(self.read)
+
+        self._buffer = ''
+        self._paths = set()
+
+    def is_connected(self):
+        return self.socket.state() == QtNetwork.QLocalSocket.ConnectedState
+
+    def watch(self, path, segments=None):
+        """Asks the server to watch `path`.
+
+        Args:
+            path (unicode): The path of the watched folder.
+            segments (tuple): The bookmark segments and the relative path of
+                an indexed folder. The indexed subfolders are watched too.
+
+        Returns:
+            bool: `False` if the server is not running.
+
+        """
+        if not self.is_connected():
+            self._buffer = ''
+            self.socket.connectToServer(self.name)
+            if not self.socket.waitForConnected(TIMEOUT):
+                return False
+
+        self._paths.add(path)
+        self.socket.write(_encode({
+            u'method': u'watch',
+            u'path': path,
+            u'segments': list(segments) if segments else None,
+        }))
+        self.socket.flush()
+        return True
+
+    def clear(self):
+        """Stops watching all paths."""
+        if self.is_connected():
+            for path in self._paths:
+                self.socket.write(_encode({u'method': u'unwatch', u'path': path}))
+            self.socket.flush()
+        self._paths = set()
+
+    @QtCore.Slot()
+    def read(self):
+        lines = (self._buffer + self.socket.readAll().data()).split('\n')
+        self._buffer = lines.pop()
+        for line in lines:
+            try:
+                msg = json.loads(line)
+            except ValueError:
+                continue
+            if msg.get(u'error'):
+                log.error(u'Index server error: {}'.format(msg[u'error']))
+                continue
+            event = msg.get(u'event')
+            if event == u'changes':
+                self.changed.emit(
+                    msg[u'path'], [_load_change(f) for f in msg[u'changes']])
+            elif event == u'reconciled':
+                self.reconciled.emit(msg[u'path'])
+
+
+def run(name=None):
+    """Runs the index server until the process is terminated."""
+    app = QtCore.QCoreApplication.instance()
+    if not app:
+        app = QtCore.QCoreApplication(sys.argv)
+
+    server = IndexServer(name=name)
+    if not server.listen():
+        sys.stderr.write(
+            u'Could not start the index server: {}\n'.format(
+                server.server.errorString()))
+        return 1
+    return app.exec_()
+
+
+if __name__ == '__main__':
+    sys.exit(run())
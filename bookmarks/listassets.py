@@ -14,6 +14,7 @@ from . import lists
 from . import contextmenu
 from . import bookmark_db
 from . import settings
+from . import indexserver
 
 
 class AssetsWidgetContextMenu(contextmenu.BaseContextMenu):
@@ -137,7 +138,7 @@ class AssetModel(lists.BaseModel):
 
             idx = len(self.INTERNAL_MODEL_DATA[task_folder][dtype])
             name = re.sub(ur'[_]{1,}', u' ', filename).strip(u'_')
-            self.INTERNAL_MODEL_DATA[task_folder][dtype][idx] = common.DataDict({
+            self.INTERNAL_MODEL_DATA[task_folder][dtype][idx] = common.RowData({
                 QtCore.Qt.DisplayRole: name,
                 QtCore.Qt.EditRole: filename,
                 QtCore.Qt.StatusTipRole: filepath,
@@ -178,7 +179,12 @@ class AssetModel(lists.BaseModel):
         """Yields DirEntry instances to be processed in __initdata__.
 
         """
-        for entry in _scandir.scandir(path):
+        if common.use_index_server():
+            scandir = indexserver.scandir
+        else:
+            scandir = _scandir.scandir
+
+        for entry in scandir(path):
             if entry.name.startswith(u'.'):
                 continue
             if not entry.is_dir():
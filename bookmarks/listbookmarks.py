@@ -2,8 +2,6 @@
 """The widget, model and context menu needed for interacting with bookmarks.
 
 """
-import json
-import base64
 import weakref
 import functools
 import _scandir
@@ -153,7 +151,7 @@ class BookmarksModel(lists.BaseModel):
             data = self.INTERNAL_MODEL_DATA[task_folder][common.FileItem]
             idx = len(data)
 
-            data[idx] = common.DataDict({
+            data[idx] = common.RowData({
                 QtCore.Qt.DisplayRole: text,
                 QtCore.Qt.EditRole: text,
                 QtCore.Qt.StatusTipRole: filepath,
@@ -207,20 +205,7 @@ class BookmarksModel(lists.BaseModel):
                 # Todos are a little more convoluted - the todo count refers to
                 # all the current outstanding todos af all assets, including
                 # the bookmark itself
-                n = 0
-                for v in db.values(u'notes').itervalues():
-                    if not v:
-                        continue
-                    if v[u'notes']:
-                        try:
-                            v = base64.b64decode(v[u'notes'])
-                            d = json.loads(v)
-                            n += len([k for k in d if not d[k]
-                                      [u'checked'] and d[k][u'text']])
-                        except (ValueError, TypeError):
-                            log.error(u'Error decoding JSON notes')
-
-                data[idx][common.TodoCountRole] = n
+                data[idx][common.TodoCountRole] = db.todo_count()
                 self.update_description(db, data[idx])
 
         self.activeChanged.emit(self.active_index())
@@ -52,16 +52,28 @@ class FavouritesModel(listfiles.FilesModel):
     def parent_path(self):
         return common.get_favourite_parent_paths() + (u'.',)
 
-    def _entry_iterator(self, path):
+    def file_index(self, task_folder=None):
+        """Favourites are not indexed or watched for changes."""
+        return None
+
+    def _entry_iterator(self, path, interrupt=None):
         """We're using the saved keys to find and return the DirEntries
         corresponding to the saved favourites.
 
+        The favourites are read on the gui thread, the returned iterator is
+        consumed by the `FilesLoader` thread.
+
         """
-        favourites = settings.local_settings.favourites()
+        return self._favourites_iterator(
+            settings.local_settings.favourites(), interrupt)
 
+    def _favourites_iterator(self, favourites, interrupt):
         d = []
 
         for k in favourites:
+            if interrupt and interrupt():
+                return
+
             file_info = QtCore.QFileInfo(k)
             _path = file_info.path()
 
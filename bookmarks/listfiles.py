@@ -2,7 +2,12 @@
 """The view and model used to browse files.
 
 """
-import _scandir
+import time
+import threading
+import itertools
+import functools
+import collections
+
 from PySide2 import QtWidgets, QtCore, QtGui
 
 from . import contextmenu
@@ -14,6 +19,11 @@ from . import settings
 from . import listdelegate
 from . import defaultpaths
 from . import images
+from . import fileindex
+from . import changefeed
+from . import walker
+from . import sequence
+from . import indexserver
 
 
 FILTER_EXTENSIONS = False
@@ -54,6 +64,350 @@ class FilesWidgetContextMenu(contextmenu.BaseContextMenu):
         self.add_refresh_menu()
 
 
+def dflags():
+    """The default flags to apply to the item."""
+    return (
+        QtCore.Qt.ItemNeverHasChildren |
+        QtCore.Qt.ItemIsEnabled |
+        QtCore.Qt.ItemIsSelectable)
+
+
+class FilesLoader(threading.Thread):
+    """The thread used by `FilesModel` to collect its rows.
+
+    The loader consumes an entry iterator and creates the ``FileItem`` and
+    ``SequenceItem`` rows of a single task folder. The rows are put in
+    batches into `self.batches` where they're picked up by the model on the
+    gui thread.
+
+    The first batches are small so the first rows appear as soon as possible,
+    later batches are larger to reduce the number of row insertions.
+
+    The entry iterator, `self.it`, must be set before the thread is started.
+
+    Args:
+        task_folder (unicode): The task folder to load.
+        parent_path (tuple): The model's `parent_path`.
+        favourites (set): The paths of the items marked as favourites.
+        extensions (tuple): The task folder's valid file extensions.
+        row_size (QtCore.QSize): The row size of the new items.
+
+    """
+    MIN_BATCH = 64
+    MAX_BATCH = 4096
+    BATCH_INTERVAL = 0.1  # seconds
+
+    def __init__(self, task_folder, parent_path, favourites, extensions, row_size):
+        super(FilesLoader, self).__init__()
+        self.daemon = True
+
+        self.it = None
+        self.task_folder = task_folder
+        self.parent_path = parent_path
+        self.favourites = favourites
+        self.extensions = extensions
+        self.row_size = row_size
+
+        self.batches = collections.deque()
+        self.count = 0
+        self.error = None
+        self.finished = False
+
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        """Stops the loader. Already collected batches are not removed."""
+        self._cancelled.set()
+
+    def is_cancelled(self):
+        return self._cancelled.is_set()
+
+    def run(self):
+        try:
+            self._run()
+        except Exception as e:
+            self.error = u'{}'.format(e)
+        finally:
+            self.finished = True
+
+    def _run(self):
+        parent_path = u'/'.join(self.parent_path).lower() + \
+            u'/' + self.task_folder
+
+        if not QtCore.QFileInfo(parent_path).exists():
+            return
+
+        sequences = {}
+        entries = []
+        size = self.MIN_BATCH
+        t = time.time()
+
+        for entry in self.it:
+            if self.is_cancelled():
+                return
+
+            # Let's limit the maximum number of items we load
+            if self.count >= common.MAXITEMS:
+                break
+
+            entries.append(entry)
+            if len(entries) >= size or (time.time() - t) > self.BATCH_INTERVAL:
+                self.batches.append(self.make_items(entries, sequences))
+                entries = []
+                size = min(size * 2, self.MAX_BATCH)
+                t = time.time()
+
+        if entries and not self.is_cancelled():
+            self.batches.append(self.make_items(entries, sequences))
+
+    def make_items(self, entries, sequences):
+        """Creates the row data of the given entries.
+
+        The sequence numbers of all entries are matched in one go using
+        `sequence.match()`.
+
+        Returns:
+            list: The rows returned by `make_item()`.
+
+        """
+        paths = [entry.path.lower().replace(u'\\', u'/') for entry in entries]
+        items = []
+        for entry, seq in itertools.izip(entries, sequence.match(paths)):
+            if self.count >= common.MAXITEMS:
+                break
+            v = self.make_item(entry, sequences, seq)
+            if not v:
+                continue
+            self.count += 1
+            items.append(v)
+        return items
+
+    def make_item(self, entry, sequences, seq):
+        """Creates the row data of a single file.
+
+        If the file is part of a sequence, the frame is added to the
+        sequence's row data found in `sequences`, or a new sequence is created
+        and added to `sequences`.
+
+        Args:
+            entry (DirEntry): The file's directory entry.
+            sequences (dict): The sequences found so far keyed by their
+                lowercase sequence path.
+            seq (SequenceMatch): The file's sequence match, see
+                `sequence.match()`.
+
+        Returns:
+            tuple: The file's `FileItem` row, its `SequenceItem` row and
+            `True` if the `SequenceItem` row is new, or `None` if the file
+            should be skipped.
+
+        """
+        task_folder = self.task_folder
+        server, job, root, asset = self.parent_path
+        parent_path = u'/'.join(self.parent_path).lower() + \
+            u'/' + task_folder
+
+        # skipping directories
+        if entry.is_dir():
+            return None
+        filename = entry.name.lower()
+
+        if filename[0] == u'.':
+            return None
+        if u'thumbs.db' in filename:
+            return None
+
+        filepath = entry.path.lower().replace(u'\\', u'/')
+        ext = filename.split(u'.')[-1]
+        if FILTER_EXTENSIONS and self.extensions and ext not in self.extensions:
+            return None
+
+        # Getting the fileroot
+        fileroot = filepath.replace(parent_path, u'')
+        fileroot = u'/'.join(fileroot.split(u'/')[:-1]).strip(u'/')
+
+        if u'[' in filename and common.is_collapsed(filepath):
+            log.error(u'"' + filename + u'" named incorrectly. Skipping.')
+            return None
+
+        flags = dflags()
+
+        if seq:
+            seqpath = sequence_path(seq)
+            if seqpath in self.favourites:
+                flags = flags | common.MarkedAsFavourite
+        else:
+            if filepath in self.favourites:
+                flags = flags | common.MarkedAsFavourite
+
+        parent_path_role = (server, job, root, asset,
+                            task_folder, fileroot)
+
+        item = common.RowData({
+            QtCore.Qt.DisplayRole: filename,
+            QtCore.Qt.EditRole: filename,
+            QtCore.Qt.StatusTipRole: filepath,
+            QtCore.Qt.SizeHintRole: self.row_size,
+            #
+            common.EntryRole: [entry, ],
+            common.FlagsRole: flags,
+            common.ParentPathRole: parent_path_role,
+            common.DescriptionRole: u'',
+            common.TodoCountRole: 0,
+            common.FileDetailsRole: u'',
+            common.SequenceRole: seq,
+            common.FramesRole: [],
+            common.FileInfoLoaded: False,
+            common.StartpathRole: None,
+            common.EndpathRole: None,
+            #
+            common.ThumbnailLoaded: False,
+            #
+            common.TypeRole: common.FileItem,
+            #
+            common.SortByNameRole: common.namekey(fileroot),
+            common.SortByLastModifiedRole: 0,
+            common.SortBySizeRole: 0,
+            #
+            common.IdRole: 0  # Set by the model when the row is inserted
+        })
+
+        # If the file in question is not a sequence, the same row is used
+        # by both data types
+        if not seq:
+            return item, item, True
+
+        # If the sequence has not yet been added to our dictionary
+        # of seqeunces we add it here
+        is_new = seqpath not in sequences
+        if is_new:  # ... and create it if it doesn't exist
+            seqname = seqpath.split(u'/')[-1]
+            flags = dflags()
+
+            if seqpath in self.favourites:
+                flags = flags | common.MarkedAsFavourite
+
+            sequences[seqpath] = common.RowData({
+                QtCore.Qt.DisplayRole: seqname,
+                QtCore.Qt.EditRole: seqname,
+                QtCore.Qt.StatusTipRole: seqpath,
+                QtCore.Qt.SizeHintRole: self.row_size,
+                common.EntryRole: [],
+                common.FlagsRole: flags,
+                common.ParentPathRole: parent_path_role,
+                common.DescriptionRole: u'',
+                common.TodoCountRole: 0,
+                common.FileDetailsRole: u'',
+                common.SequenceRole: seq,
+                common.FramesRole: [],
+                common.FileInfoLoaded: False,
+                common.StartpathRole: None,
+                common.EndpathRole: None,
+                #
+                common.ThumbnailLoaded: False,
+                #
+                common.TypeRole: common.SequenceItem,
+                common.SortByNameRole: common.namekey(seqpath),
+                common.SortByLastModifiedRole: 0,
+                common.SortBySizeRole: 0,  # Initializing with null-size
+                #
+                common.IdRole: 0
+            })
+
+        sequences[seqpath][common.FramesRole].append(seq.group(2))
+        sequences[seqpath][common.EntryRole].append(entry)
+        return item, sequences[seqpath], is_new
+
+
+def sequence_path(seq):
+    """Returns the lowercase sequence path of a `SequenceRole` match."""
+    return (seq.group(1) + common.SEQPROXY + seq.group(3) + u'.' + seq.group(4)).lower()
+
+
+def update_sequence_item(v, favourites):
+    """Updates a `SequenceItem` row after its frames have changed.
+
+    A sequence with only one frame is displayed as a single file and
+    a file that gained frames is changed back to a sequence.
+
+    """
+    _seq = v[common.SequenceRole]
+    if not _seq:
+        return
+
+    if len(v[common.FramesRole]) == 1:
+        # A sequence with only one element is not a sequence
+        filepath = _seq.group(
+            1) + v[common.FramesRole][0] + _seq.group(3) + u'.' + _seq.group(4)
+        filename = filepath.split(u'/')[-1]
+        v[QtCore.Qt.DisplayRole] = filename
+        v[QtCore.Qt.EditRole] = filename
+        v[QtCore.Qt.StatusTipRole] = filepath
+        v[common.TypeRole] = common.FileItem
+        v[common.SortByNameRole] = common.namekey(filepath)
+        v[common.SortByLastModifiedRole] = 0
+
+        flags = dflags()
+        if filepath.lower() in favourites:
+            flags = flags | common.MarkedAsFavourite
+        v[common.FlagsRole] = flags
+
+    elif len(v[common.FramesRole]) == 0:
+        v[common.TypeRole] = common.FileItem
+
+    elif v[common.TypeRole] != common.SequenceItem:
+        seqpath = sequence_path(_seq)
+        seqname = seqpath.split(u'/')[-1]
+        v[QtCore.Qt.DisplayRole] = seqname
+        v[QtCore.Qt.EditRole] = seqname
+        v[QtCore.Qt.StatusTipRole] = seqpath
+        v[common.TypeRole] = common.SequenceItem
+        v[common.SortByNameRole] = common.namekey(seqpath)
+
+        flags = dflags()
+        if seqpath in favourites:
+            flags = flags | common.MarkedAsFavourite
+        v[common.FlagsRole] = flags
+
+
+def reconciled_changes(known, entries):
+    """Returns the files added and removed by a file index reconciliation.
+
+    The files of the reconciled index are compared with the files of the
+    model's rows. The returned changes don't contain the directories'
+    listings and can't be used to update the index.
+
+    Args:
+        known (set): The lowercase paths of the model's `FileItem` rows.
+        entries (iterator): The file entries of the reconciled index.
+
+    Returns:
+        list: :class:`.changefeed.Change` items, one for each changed directory.
+
+    """
+    added = collections.defaultdict(list)
+    removed = collections.defaultdict(list)
+
+    seen = set()
+    for entry in entries:
+        path = entry.path.lower().replace(u'\\', u'/')
+        seen.add(path)
+        if path not in known:
+            added[path.rsplit(u'/', 1)[0]].append(entry)
+
+    for path in known - seen:
+        _dir, name = path.rsplit(u'/', 1)
+        removed[_dir].append(name)
+
+    return [
+        changefeed.Change(
+            path, None, [], [], added.get(path, []),
+            sorted(removed.get(path, [])), [], [], []
+        )
+        for path in sorted(set(added) | set(removed))
+    ]
+
+
 class FilesModel(lists.BaseModel):
     """The model used store individual and file sequences found in `parent_path`.
 
@@ -65,6 +419,9 @@ class FilesModel(lists.BaseModel):
         data = self.model_data() # the currently exposed dataset
         data == self.INTERNAL_MODEL_DATA[self.task_folder()][self.data_type()]
 
+    The rows are collected by a `FilesLoader` thread and inserted into the
+    model in batches, see `insert_loaded_rows()`.
+
     """
     DEFAULT_ROW_SIZE = QtCore.QSize(1, common.ROW_HEIGHT())
     val = settings.local_settings.value(u'widget/FilesModel/rowheight')
@@ -74,6 +431,37 @@ class FilesModel(lists.BaseModel):
 
     queue_type = threads.FileInfoQueue
     thumbnail_queue_type = threads.FileThumbnailQueue
+    supports_lazy_fetch = True
+
+    fileIndexChanged = QtCore.Signal(unicode)
+    loadFinished = QtCore.Signal()
+    _reconciled = QtCore.Signal(unicode, object)
+
+    def __init__(self, has_threads=True, parent=None):
+        super(FilesModel, self).__init__(
+            has_threads=has_threads, parent=parent)
+        self._reconcile_pending = False
+        self._loader = None
+
+        self.insert_timer = QtCore.QTimer(parent=self)
+        self.insert_timer.setInterval(15)
+        self.insert_timer.setSingleShot(False)
+        self.insert_timer.timeout.connect(self.insert_loaded_rows)
+
+        self._watched_task_folder = None
+        self._served = False
+        self.change_feed = changefeed.ChangeFeed(parent=self)
+        self.change_feed.changed.connect(self.apply_changes)
+
+        self.index_watcher = indexserver.IndexWatcher(parent=self)
+        self.index_watcher.changed.connect(self.index_server_changed)
+        self.index_watcher.reconciled.connect(self.index_server_reconciled)
+
+        self.fileIndexChanged.connect(
+            lambda: log.debug('fileIndexChanged -> file_index_changed', self))
+        self.fileIndexChanged.connect(self.file_index_changed)
+        self._reconciled.connect(
+            self.apply_reconciled_changes, QtCore.Qt.QueuedConnection)
 
     @property
     def parent_path(self):
@@ -84,15 +472,201 @@ class FilesModel(lists.BaseModel):
             settings.ACTIVE['asset'],
         )
 
-    def _entry_iterator(self, path):
-        for entry in _scandir.scandir(path):
-            if entry.is_dir():
-                for _entry in self._entry_iterator(entry.path):
-                    yield _entry
-            else:
+    def file_index(self, task_folder=None):
+        """Returns the :class:`.fileindex.FileIndex` of the given task folder.
+
+        Args:
+            task_folder (unicode): Defaults to the current task folder.
+
+        """
+        task_folder = task_folder if task_folder else self.task_folder()
+        if not task_folder or not all(self.parent_path):
+            return None
+        server, job, root, asset = self.parent_path
+        return fileindex.get(server, job, root, asset + u'/' + task_folder)
+
+    def _entry_iterator(self, path, interrupt=None):
+        """Returns an iterator of the files found in the current task folder.
+
+        The method is called on the gui thread but the returned iterator is
+        consumed by the `FilesLoader` thread.
+
+        The entries are read from the task folder's saved file index and the
+        disk is only walked when the index does not exist yet. In that case
+        the files are yielded as their directories are listed, and the index
+        is built as the walk progresses. An existing index is reconciled
+        with the disk after the model has been populated, see
+        `reconcile_file_index()`.
+
+        When the index server is enabled, the entries are requested from the
+        server and the local index is only used if the server is not running.
+
+        """
+        index = self.file_index()
+        threads = common.walker_threads()
+        if index is None:
+            return walker.walk(path, threads=threads, interrupt=interrupt)
+
+        if common.use_index_server():
+            server, job, root, asset = self.parent_path
+            return indexserver.walk(
+                server, job, root, asset + u'/' + self.task_folder(),
+                interrupt=interrupt,
+                fallback=functools.partial(
+                    self._index_iterator, index, threads, interrupt)
+            )
+        return self._index_iterator(index, threads, interrupt)
+
+    def _index_iterator(self, index, threads, interrupt):
+        if not index.exists():
+            for entry in index.walk(threads=threads, interrupt=interrupt):
                 yield entry
+            return
+
+        self._reconcile_pending = True
+        for entry in index.entries():
+            yield entry
+
+    @QtCore.Slot()
+    def reconcile_file_index(self):
+        """Checks the current task folder's file index against the disk.
+
+        The reconciliation is run on a separate thread and
+        `fileIndexChanged` is emitted if any of the indexed directories have
+        changed.
+
+        """
+        if not self._reconcile_pending:
+            return
+        self._reconcile_pending = False
+
+        task_folder = self.task_folder()
+        index = self.file_index(task_folder=task_folder)
+        if index is None:
+            return
+        threads = common.walker_threads()
+
+        def run():
+            try:
+                if index.reconcile(threads=threads):
+                    self.fileIndexChanged.emit(task_folder)
+            except Exception as e:
+                log.error(u'Could not reconcile the file index:\n{}'.format(e))
+
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+
+    def watch_task_folder(self, task_folder):
+        """Starts watching the directories of `task_folder` for changes.
+
+        The watched directories are taken from the task folder's file index
+        and the changes are applied by `apply_changes()`.
+
+        """
+        self.change_feed.clear()
+        self.index_watcher.clear()
+        self._watched_task_folder = None
+        self._served = False
+
+        index = self.file_index(task_folder=task_folder)
+        if index is None:
+            return
+
+        # The index server watches the folders and keeps the index up-to-date
+        if common.use_index_server():
+            server, job, root, asset = self.parent_path
+            segments = (server, job, root, asset + u'/' + self.task_folder())
+            if self.index_watcher.watch(index.path(), segments=segments):
+                self._watched_task_folder = task_folder
+                self._served = True
+                return
+
+        if not index.exists():
+            return
+        self._watched_task_folder = task_folder
+        self.change_feed.watch(index.snapshots())
+
+    @QtCore.Slot(unicode, object)
+    def index_server_changed(self, path, changes):
+        """Applies the changes reported by the index server."""
+        index = self.file_index(task_folder=self._watched_task_folder)
+        if index is None or index.path().lower() != path.lower():
+            return
+        self.apply_changes(changes)
+
+    @QtCore.Slot(unicode)
+    def index_server_reconciled(self, path):
+        """Updates the rows after the index server has reconciled the index."""
+        index = self.file_index(task_folder=self._watched_task_folder)
+        if index is None or index.path().lower() != path.lower():
+            return
+        self.fileIndexChanged.emit(self.task_folder())
+
+    @QtCore.Slot(unicode)
+    def file_index_changed(self, task_folder):
+        """Updates the rows after the file index has been reconciled.
+
+        The files of the reconciled index are compared with the model's rows
+        on a separate thread, and the added and removed files are applied by
+        `apply_reconciled_changes()`.
+
+        """
+        if task_folder != self.task_folder():
+            return
+        if self.is_loading():
+            return
+        index = self.file_index(task_folder=task_folder)
+        if index is None:
+            return
+
+        k = task_folder.lower()
+        if k not in self.INTERNAL_MODEL_DATA:
+            return
+        known = set(
+            v[QtCore.Qt.StatusTipRole]
+            for v in self.INTERNAL_MODEL_DATA[k][common.FileItem].itervalues()
+        )
+
+        # The index server's index is read from the server
+        if self._served:
+            server, job, root, asset = self.parent_path
+            entries = indexserver.walk(
+                server, job, root, asset + u'/' + task_folder,
+                fallback=index.entries
+            )
+        else:
+            entries = index.entries()
+
+        def run():
+            try:
+                changes = reconciled_changes(known, entries)
+            except Exception as e:
+                log.error(u'Could not compare the file index:\n{}'.format(e))
+                return
+            self._reconciled.emit(k, changes)
+
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+
+    @QtCore.Slot(unicode, object)
+    def apply_reconciled_changes(self, task_folder, changes):
+        """Applies the changes found by `file_index_changed()`.
+
+        The change feed is restarted with the reconciled directory listings.
+
+        """
+        if task_folder != (self.task_folder() or u'').lower():
+            return
+        if self.is_loading():
+            return
+        if changes:
+            self.apply_changes(
+                changes, task_folder=task_folder, update_index=False)
+        if self._watched_task_folder == task_folder and not self._served:
+            self.watch_task_folder(task_folder)
 
-    @lists.initdata
     def __initdata__(self):
         """The method is responsible for getting the bare-bones file and
         sequence definitions by running a file-iterator stemming from
@@ -108,6 +682,11 @@ class FilesModel(lists.BaseModel):
         Switching between the two datasets is done via emitting the
         ``dataTypeChanged`` signal.
 
+        The model is reset and emptied straight away and the files are
+        collected by a `FilesLoader` thread. The found rows are inserted in
+        batches by `insert_loaded_rows()` and the data is sorted once all the
+        files have been loaded.
+
         Note:
             Experiencing serious performance issues with the built-in
             QDirIterator on Mac OS X samba shares and the performance isn't
@@ -121,197 +700,433 @@ class FilesModel(lists.BaseModel):
         this is where scandir is evoked.
 
         """
-        def dflags():
-            """The default flags to apply to the item."""
-            return (
-                QtCore.Qt.ItemNeverHasChildren |
-                QtCore.Qt.ItemIsEnabled |
-                QtCore.Qt.ItemIsSelectable)
+        log.debug('__initdata__()', self)
+        self.cancel_load()
+        self.change_feed.clear()
+        self.index_watcher.clear()
+        self._watched_task_folder = None
+        self._served = False
+
+        self.beginResetModel()
+        self.reset_model_loaded()
+        self._interrupt_requested = False
+        self._reconcile_pending = False
 
         task_folder = self.task_folder()
         if not task_folder:
+            self.endResetModel()
             return
         task_folder = task_folder.lower()
 
-        SEQUENCE_DATA = common.DataDict()
-        MODEL_DATA = common.DataDict({
+        self.INTERNAL_MODEL_DATA[task_folder] = common.DataDict({
             common.FileItem: common.DataDict(),
             common.SequenceItem: common.DataDict(),
         })
+        self.endResetModel()
 
-        favourites = settings.local_settings.favourites()
-        sfavourites = set(favourites)
-
-        server, job, root, asset = self.parent_path
-        task_folder_extensions = defaultpaths.get_task_folder_extensions(
-            task_folder)
         parent_path = u'/'.join(self.parent_path).lower() + \
             u'/' + task_folder
+        loader = FilesLoader(
+            task_folder,
+            self.parent_path,
+            set(settings.local_settings.favourites()),
+            defaultpaths.get_task_folder_extensions(task_folder),
+            self.ROW_SIZE
+        )
+        loader.it = self._entry_iterator(
+            parent_path, interrupt=loader.is_cancelled)
+
+        self._loader = loader
+        loader.start()
+        self.insert_timer.start()
+
+    def is_loading(self):
+        """Returns `True` if the model is still collecting its rows."""
+        return self._loader is not None
+
+    @QtCore.Slot()
+    def cancel_load(self):
+        """Stops the current `FilesLoader` and removes its partial data."""
+        loader = self._loader
+        if loader is None:
+            return
 
-        nth = 987
-        c = 0
+        self._loader = None
+        self.insert_timer.stop()
+        loader.cancel()
 
-        if not QtCore.QFileInfo(parent_path).exists():
+        # The partial data must be reloaded the next time the task folder
+        # is shown
+        if loader.task_folder not in self.INTERNAL_MODEL_DATA:
             return
+        if self.is_exposed(loader.task_folder):
+            self.beginResetModel()
+            del self.INTERNAL_MODEL_DATA[loader.task_folder]
+            self.endResetModel()
+        else:
+            del self.INTERNAL_MODEL_DATA[loader.task_folder]
+
+    def is_exposed(self, task_folder):
+        """Returns `True` if the data of `task_folder` is exposed to the views."""
+        k = self.task_folder()
+        if k not in self.INTERNAL_MODEL_DATA:
+            return False
+        if task_folder not in self.INTERNAL_MODEL_DATA:
+            return False
+        return self.INTERNAL_MODEL_DATA[k] is self.INTERNAL_MODEL_DATA[task_folder]
+
+    @QtCore.Slot()
+    def set_interrupt_requested(self):
+        """Stops loading but keeps the rows already found."""
+        super(FilesModel, self).set_interrupt_requested()
+        if self._loader:
+            self._loader.cancel()
+
+    @QtCore.Slot()
+    def insert_loaded_rows(self):
+        """Inserts the rows found by the `FilesLoader` into the model.
+
+        The slot is called by `insert_timer` and only spends a few
+        milliseconds on the gui thread each time it's called. Only the rows of
+        the current data type emit the row insertion signals. New frames of
+        already inserted sequences are signalled with `dataChanged`.
 
-        for entry in self._entry_iterator(parent_path):
-            if self._interrupt_requested:
-                break
+        """
+        loader = self._loader
+        if loader is None:
+            self.insert_timer.stop()
+            return
 
-            # skipping directories
-            if entry.is_dir():
-                continue
-            filename = entry.name.lower()
+        if loader.task_folder not in self.INTERNAL_MODEL_DATA:
+            self.cancel_load()
+            return
+        data = self.INTERNAL_MODEL_DATA[loader.task_folder]
+
+        rows = {
+            common.FileItem: [],
+            common.SequenceItem: [],
+        }
+        updated = {}
+
+        t = time.time()
+        while loader.batches and (time.time() - t) < 0.008:
+            for item, seq_item, is_new in loader.batches.popleft():
+                rows[common.FileItem].append(item)
+                if is_new:
+                    rows[common.SequenceItem].append(seq_item)
+                else:
+                    updated[id(seq_item)] = seq_item
+
+        exposed = None
+        if self.is_exposed(loader.task_folder):
+            exposed = self.data_type()
+        self._apply_rows(data, rows, {}, updated, exposed)
+
+        if rows[common.FileItem]:
+            self.progressMessage.emit(
+                u'Loading files (found ' + unicode(loader.count) + u' items)...')
+
+        if loader.finished and not loader.batches:
+            self.finish_load()
+
+    def _apply_rows(self, data, added, removed, updated, exposed):
+        """Removes, appends and updates the rows of both data types.
+
+        Only the exposed data type emits the row insertion and removal
+        signals.
+
+        Args:
+            data (DataDict): The data of a task folder.
+            added (dict): Lists of new rows keyed by data type.
+            removed (dict): The `id()` of the rows to remove keyed by data type.
+            updated (dict): Changed `SequenceItem` rows keyed by their `id()`.
+            exposed (int): The data type shown by the views or `None`.
 
-            if filename[0] == u'.':
-                continue
-            if u'thumbs.db' in filename:
+        """
+        # The row ids of the shared FileItems must match the exposed data type
+        # so we'll update it last
+        for data_type in sorted(
+                (common.FileItem, common.SequenceItem), key=lambda k: k == exposed):
+            if removed.get(data_type):
+                self._remove_rows(
+                    data, data_type, removed[data_type], data_type == exposed)
+
+            if not added.get(data_type):
                 continue
+            first = len(data[data_type])
+            last = first + len(added[data_type]) - 1
+
+            # Rows appended after the fetched rows are not signalled
+            _first, _last = self.fetched_rows(first, last)
+            signal = data_type == exposed and _first <= _last
+
+            if signal:
+                self.beginInsertRows(QtCore.QModelIndex(), _first, _last)
+            for n, item in enumerate(added[data_type], first):
+                item[common.IdRole] = n
+                data[data_type][n] = item
+            if signal:
+                self.endInsertRows()
+
+        if any(added.itervalues()) or any(removed.itervalues()) or updated:
+            self.invalidate_sort_cache()
+
+        if exposed == common.SequenceItem and updated:
+            for item in updated.itervalues():
+                idx = item[common.IdRole]
+                if idx not in data[common.SequenceItem]:
+                    continue
+                if data[common.SequenceItem][idx] is not item:
+                    continue
+                index = self.index(idx, 0)
+                self.dataChanged.emit(index, index)
+
+    def _remove_rows(self, data, data_type, ids, exposed):
+        """Removes the rows whose `id()` is in `ids` and renumbers the rest."""
+        d = data[data_type]
+        rows = [n for n in xrange(len(d)) if id(d[n]) in ids]
+        if not rows:
+            return
 
-            filepath = entry.path.lower().replace(u'\\', u'/')
-            ext = filename.split(u'.')[-1]
-            if FILTER_EXTENSIONS and task_folder_extensions and ext not in task_folder_extensions:
-                continue
+        def rebuild(skip):
+            _d = common.DataDict()
+            for n in xrange(len(d)):
+                if n in skip:
+                    continue
+                idx = len(_d)
+                d[n][common.IdRole] = idx
+                _d[idx] = d[n]
+            data[data_type] = _d
+            return _d
+
+        # Contiguous row ranges
+        ranges = []
+        for n in rows:
+            if ranges and ranges[-1][1] == n - 1:
+                ranges[-1][1] = n
+            else:
+                ranges.append([n, n])
 
-            # Progress bar
-            c += 1
-            if not c % nth:
-                self.progressMessage.emit(
-                    u'Loading files (found ' + unicode(c) + u' items)...')
-                QtWidgets.QApplication.instance().processEvents()
+        if not exposed:
+            rebuild(set(rows))
+            return
 
-            # Getting the fileroot
-            fileroot = filepath.replace(parent_path, u'')
-            fileroot = u'/'.join(fileroot.split(u'/')[:-1]).strip(u'/')
+        # Removing a large number of scattered rows is cheaper with a reset
+        if len(ranges) > 32:
+            self.beginResetModel()
+            rebuild(set(rows))
+            self.endResetModel()
+            return
 
-            try:
-                seq = common.get_sequence(filepath)
-            except RuntimeError:
-                log.error(u'"' + filename + u'" named incorrectly. Skipping.')
+        for first, last in reversed(ranges):
+            _first, _last = self.fetched_rows(first, last)
+            if _first > _last:
+                d = rebuild(set(xrange(first, last + 1)))
                 continue
+            self.beginRemoveRows(QtCore.QModelIndex(), _first, _last)
+            d = rebuild(set(xrange(first, last + 1)))
+            self.unfetch_rows(_last - _first + 1)
+            self.endRemoveRows()
 
-            flags = dflags()
+    @QtCore.Slot(object)
+    def apply_changes(self, changes, task_folder=None, update_index=True):
+        """Applies the file system changes reported by `change_feed`.
 
-            if seq:
-                seqpath = seq.group(1) + common.SEQPROXY + \
-                    seq.group(3) + u'.' + seq.group(4)
-                seqpath = seqpath.lower()
-                if seqpath in sfavourites:
-                    flags = flags | common.MarkedAsFavourite
-            else:
-                if filepath in sfavourites:
-                    flags = flags | common.MarkedAsFavourite
+        Instead of reloading the whole task folder, the rows of the removed
+        files are removed and new rows are appended for the added files. New
+        frames of an existing sequence update the sequence's row. Files that
+        already have a row are not added again. The information and thumbnail
+        of the rows of modified files are loaded again.
 
-            parent_path_role = (server, job, root, asset,
-                                task_folder, fileroot)
+        The file index is updated with the new directory contents.
 
-            # Let's limit the maximum number of items we load
-            idx = len(MODEL_DATA[common.FileItem])
-            if idx >= common.MAXITEMS:
-                break
+        Args:
+            changes (list): :class:`.changefeed.Change` items.
+            task_folder (unicode): Defaults to the watched task folder.
+            update_index (bool): Update the file index with the changes.
 
-            MODEL_DATA[common.FileItem][idx] = common.DataDict({
-                QtCore.Qt.DisplayRole: filename,
-                QtCore.Qt.EditRole: filename,
-                QtCore.Qt.StatusTipRole: filepath,
-                QtCore.Qt.SizeHintRole: self.ROW_SIZE,
-                #
-                common.EntryRole: [entry, ],
-                common.FlagsRole: flags,
-                common.ParentPathRole: parent_path_role,
-                common.DescriptionRole: u'',
-                common.TodoCountRole: 0,
-                common.FileDetailsRole: u'',
-                common.SequenceRole: seq,
-                common.FramesRole: [],
-                common.FileInfoLoaded: False,
-                common.StartpathRole: None,
-                common.EndpathRole: None,
-                #
-                common.ThumbnailLoaded: False,
-                #
-                common.TypeRole: common.FileItem,
-                #
-                common.SortByNameRole: common.namekey(fileroot),
-                common.SortByLastModifiedRole: 0,
-                common.SortBySizeRole: 0,
-                #
-                common.IdRole: idx  # non-mutable
-            })
+        """
+        if self.is_loading():
+            return
+        task_folder = task_folder if task_folder else self._watched_task_folder
+        if not task_folder or task_folder not in self.INTERNAL_MODEL_DATA:
+            return
+        data = self.INTERNAL_MODEL_DATA[task_folder]
+
+        favourites = set(settings.local_settings.favourites())
+        factory = FilesLoader(
+            task_folder,
+            self.parent_path,
+            favourites,
+            defaultpaths.get_task_folder_extensions(task_folder),
+            self.ROW_SIZE
+        )
 
-            # If the file in question is a sequence, we will also save a reference
-            # to it in the sequence data dict
-            if seq:
-                # If the sequence has not yet been added to our dictionary
-                # of seqeunces we add it here
-                if seqpath not in SEQUENCE_DATA:  # ... and create it if it doesn't exist
-                    seqname = seqpath.split(u'/')[-1]
-                    flags = dflags()
-
-                    if seqpath in sfavourites:
-                        flags = flags | common.MarkedAsFavourite
-
-                    SEQUENCE_DATA[seqpath] = common.DataDict({
-                        QtCore.Qt.DisplayRole: seqname,
-                        QtCore.Qt.EditRole: seqname,
-                        QtCore.Qt.StatusTipRole: seqpath,
-                        QtCore.Qt.SizeHintRole: self.ROW_SIZE,
-                        common.EntryRole: [],
-                        common.FlagsRole: flags,
-                        common.ParentPathRole: parent_path_role,
-                        common.DescriptionRole: u'',
-                        common.TodoCountRole: 0,
-                        common.FileDetailsRole: u'',
-                        common.SequenceRole: seq,
-                        common.FramesRole: [],
-                        common.FileInfoLoaded: False,
-                        common.StartpathRole: None,
-                        common.EndpathRole: None,
-                        #
-                        common.ThumbnailLoaded: False,
-                        #
-                        common.TypeRole: common.SequenceItem,
-                        common.SortByNameRole: common.namekey(seqpath),
-                        common.SortByLastModifiedRole: 0,
-                        common.SortBySizeRole: 0,  # Initializing with null-size
-                        #
-                        common.IdRole: 0
-                    })
-
-                SEQUENCE_DATA[seqpath][common.FramesRole].append(seq.group(2))
-                SEQUENCE_DATA[seqpath][common.EntryRole].append(entry)
+        added = {
+            common.FileItem: [],
+            common.SequenceItem: [],
+        }
+        removed = {
+            common.FileItem: set(),
+            common.SequenceItem: set(),
+        }
+        updated = {}
+
+        removed_paths = set()
+        for change in changes:
+            for name in change.removed:
+                removed_paths.add(
+                    (change.path + u'/' + name).lower().replace(u'\\', u'/'))
+
+        # Removed files
+        if removed_paths:
+            for v in data[common.FileItem].itervalues():
+                if v[QtCore.Qt.StatusTipRole] in removed_paths:
+                    removed[common.FileItem].add(id(v))
+
+            for v in data[common.SequenceItem].itervalues():
+                if not v[common.SequenceRole]:
+                    if v[QtCore.Qt.StatusTipRole] in removed_paths:
+                        removed[common.SequenceItem].add(id(v))
+                    continue
+
+                frames = [
+                    (f, e) for f, e in zip(v[common.FramesRole], v[common.EntryRole])
+                    if e.path.lower().replace(u'\\', u'/') not in removed_paths
+                ]
+                if len(frames) == len(v[common.FramesRole]):
+                    continue
+                if not frames:
+                    removed[common.SequenceItem].add(id(v))
+                    continue
+                v[common.FramesRole] = [f[0] for f in frames]
+                v[common.EntryRole] = [f[1] for f in frames]
+                updated[id(v)] = v
+
+        # Modified files
+        modified = {}
+        for change in changes:
+            for entry in change.modified:
+                modified[entry.path.lower().replace(u'\\', u'/')] = entry
+
+        refreshed = {}
+        if modified:
+            for data_type in (common.FileItem, common.SequenceItem):
+                for v in data[data_type].itervalues():
+                    if id(v) in refreshed or id(v) in removed[data_type]:
+                        continue
+                    paths = [
+                        f.path.lower().replace(u'\\', u'/')
+                        for f in v[common.EntryRole]
+                    ]
+                    if not any(f in modified for f in paths):
+                        continue
+                    # The new entries don't have the old `stat()` results
+                    v[common.EntryRole] = [
+                        modified.get(k, f) for k, f in zip(paths, v[common.EntryRole])]
+                    v[common.FileInfoLoaded] = False
+                    v[common.ThumbnailLoaded] = False
+                    refreshed[id(v)] = v
+
+        # Added files
+        sequences = {}
+        for v in data[common.SequenceItem].itervalues():
+            if v[common.SequenceRole] and id(v) not in removed[common.SequenceItem]:
+                sequences[sequence_path(v[common.SequenceRole])] = v
+
+        existing = set(
+            v[QtCore.Qt.StatusTipRole]
+            for v in data[common.FileItem].itervalues()
+            if id(v) not in removed[common.FileItem]
+        )
+        for change in changes:
+            entries = [
+                f for f in change.added
+                if f.path.lower().replace(u'\\', u'/') not in existing
+            ]
+            for item, seq_item, is_new in factory.make_items(entries, sequences):
+                added[common.FileItem].append(item)
+                if is_new:
+                    added[common.SequenceItem].append(seq_item)
+                else:
+                    updated[id(seq_item)] = seq_item
+
+        for v in updated.itervalues():
+            update_sequence_item(v, favourites)
+            v[common.FileInfoLoaded] = False
+
+        # New sequences of a single frame are shown as files, like they are
+        # after `finish_load()`
+        for v in added[common.SequenceItem]:
+            update_sequence_item(v, favourites)
+
+        exposed = None
+        if self.is_exposed(task_folder):
+            exposed = self.data_type()
+        self._apply_rows(data, added, removed, updated, exposed)
+
+        if exposed is not None:
+            for v in refreshed.itervalues():
+                idx = v[common.IdRole]
+                if data[exposed].get(idx) is not v:
+                    continue
+                index = self.index(idx, 0)
+                self.dataChanged.emit(index, index)
+
+        # Keeping the file index up-to-date, unless the index server owns it
+        if self._served or not update_index:
+            return
+        index = self.file_index(task_folder=task_folder)
+        if index is None:
+            return
+        for change in changes:
+            if change.mtime is None:
+                index.remove(change.path)
             else:
-                SEQUENCE_DATA[filepath] = MODEL_DATA[common.FileItem][idx]
-
-        # Casting the sequence data back onto the model
-        for v in SEQUENCE_DATA.itervalues():
-            idx = len(MODEL_DATA[common.SequenceItem])
-            if len(v[common.FramesRole]) == 1:
-                # A sequence with only one element is not a sequence
-                _seq = v[common.SequenceRole]
-                filepath = _seq.group(
-                    1) + v[common.FramesRole][0] + _seq.group(3) + u'.' + _seq.group(4)
-                filename = filepath.split(u'/')[-1]
-                v[QtCore.Qt.DisplayRole] = filename
-                v[QtCore.Qt.EditRole] = filename
-                v[QtCore.Qt.StatusTipRole] = filepath
-                v[common.TypeRole] = common.FileItem
-                v[common.SortByNameRole] = common.namekey(filepath)
-                v[common.SortByLastModifiedRole] = 0
-
-                flags = dflags()
-                if filepath.lower() in sfavourites:
-                    flags = flags | common.MarkedAsFavourite
-
-                v[common.FlagsRole] = flags
-
-            elif len(v[common.FramesRole]) == 0:
-                v[common.TypeRole] = common.FileItem
-
-            MODEL_DATA[common.SequenceItem][idx] = v
-            MODEL_DATA[common.SequenceItem][idx][common.IdRole] = idx
-
-        self.INTERNAL_MODEL_DATA[task_folder] = MODEL_DATA
+                index.update(change.path, change.mtime, change.files, change.dirs)
+        thread = threading.Thread(target=index.save)
+        thread.daemon = True
+        thread.start()
+
+    def finish_load(self):
+        """Called when the `FilesLoader` has finished.
+
+        Sequences with only one frame are changed back to FileItems and the
+        data is sorted.
+
+        """
+        loader = self._loader
+        self._loader = None
+        self.insert_timer.stop()
+
+        if loader.error:
+            log.error(u'Error loading the model data:\n{}'.format(loader.error))
+        if loader.task_folder not in self.INTERNAL_MODEL_DATA:
+            return
+
+        favourites = loader.favourites
+        data = self.INTERNAL_MODEL_DATA[loader.task_folder]
+
+        # Casting single-frame sequences back to FileItems
+        for v in data[common.SequenceItem].itervalues():
+            update_sequence_item(v, favourites)
+
+        exposed = self.is_exposed(loader.task_folder)
+        if exposed and self.data_type() == common.SequenceItem and self.rowCount():
+            self.dataChanged.emit(
+                self.index(0, 0), self.index(self.rowCount() - 1, 0))
+
+        self._interrupt_requested = False
+        self.progressMessage.emit(u'')
+        self.invalidate_sort_cache()
+        self.sort_data()
+        self.loadFinished.emit()
+
+        if exposed:
+            self.watch_task_folder(loader.task_folder)
+
+        if self._reconcile_pending:
+            QtCore.QTimer.singleShot(0, self.reconcile_file_index)
 
     def task_folder(self):
         """Current key to the data dictionary."""
@@ -333,10 +1148,21 @@ class FilesModel(lists.BaseModel):
         """
         log.debug('set_task_folder({})'.format(val), self)
         settings.set_active(u'task_folder', val)
+
+        if self._loader and self._loader.task_folder == val.lower():
+            return  # The task folder is already being loaded
+        self.cancel_load()
+
         if not self.model_data():
             self.__initdata__()
         else:
+            # The model shows a different set of rows
+            self.beginResetModel()
+            self.blockSignals(True)
             self.sort_data()
+            self.blockSignals(False)
+            self.endResetModel()
+            self.watch_task_folder(self.task_folder().lower())
 
     def data_type(self):
         """Current key to the data dictionary."""
@@ -501,6 +1327,7 @@ class FilesWidget(lists.ThreadedBaseWidget):
         self.setWindowTitle(u'Files')
         self._background_icon = u'files'
         self.drag_source_index = QtCore.QModelIndex()
+        self._pending_selection = None
         self.setDragDropMode(QtWidgets.QAbstractItemView.DragDrop)
         self.setDragEnabled(True)
         self.viewport().setAcceptDrops(True)
@@ -545,22 +1372,46 @@ class FilesWidget(lists.ThreadedBaseWidget):
             self.model().sourceModel().taskFolderChanged.emit(task_folder)
         self.model().sourceModel().modelDataResetRequested.emit()
 
-        if self.model().sourceModel().data_type() == common.SequenceItem:
+        # The file will be selected when the model has finished loading
+        self._pending_selection = file_path
+        self.select_pending_file()
+
+    @QtCore.Slot()
+    def select_pending_file(self):
+        """Selects the file added by `new_file_added()` after the model is loaded."""
+        file_path = self._pending_selection
+        if not file_path:
+            return
+        if self.model().sourceModel().is_loading():
+            return
+        self._pending_selection = None
+
+        model = self.model().sourceModel()
+        data = model.model_data()
+        is_sequence = model.data_type() == common.SequenceItem
+        if is_sequence:
             file_path = common.proxy_path(file_path).lower()
-        for n in xrange(self.model().rowCount()):
-            index = self.model().index(n, 0)
-            _file_path = index.data(QtCore.Qt.StatusTipRole)
-            if self.model().sourceModel().data_type() == common.SequenceItem:
+
+        # The source rows are searched, as the file might not have been
+        # fetched yet
+        for n in xrange(len(data)):
+            _file_path = data[n][QtCore.Qt.StatusTipRole]
+            if is_sequence:
                 _file_path = common.proxy_path(_file_path).lower()
+            if _file_path != file_path:
+                continue
 
-            if _file_path == file_path:
-                self.scrollTo(
-                    index,
-                    QtWidgets.QAbstractItemView.PositionAtCenter)
-                self.selectionModel().setCurrentIndex(
-                    index,
-                    QtCore.QItemSelectionModel.ClearAndSelect)
+            model.fetch_to(n)
+            index = self.model().mapFromSource(model.index(n, 0))
+            if not index.isValid():
                 return
+            self.scrollTo(
+                index,
+                QtWidgets.QAbstractItemView.PositionAtCenter)
+            self.selectionModel().setCurrentIndex(
+                index,
+                QtCore.QItemSelectionModel.ClearAndSelect)
+            return
 
     def set_model(self, *args, **kwargs):
         """Extends the subclass's signal connections.
@@ -575,6 +1426,8 @@ class FilesWidget(lists.ThreadedBaseWidget):
         model.modelReset.connect(
             lambda: log.debug('modelReset -> initialize_filter_values', model))
         model.modelReset.connect(proxy.initialize_filter_values)
+        model.modelReset.connect(self.select_pending_file)
+        model.loadFinished.connect(self.select_pending_file)
 
         # Task folders
         model.taskFolderChanged.connect(
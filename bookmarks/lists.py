@@ -20,7 +20,9 @@ The main tabs derive from the following custom QListViews:
 
 """
 import re
+import math
 import weakref
+import operator
 from functools import wraps, partial
 
 from PySide2 import QtWidgets, QtGui, QtCore
@@ -35,6 +37,7 @@ from . import settings
 from . import images
 from . import alembicpreview
 from . import threads
+from . import prefetch
 
 
 ActiveFlagFilterKey = u'filter_active'
@@ -73,6 +76,25 @@ def validate_index(func):
     return func_wrapper
 
 
+def _sort_key(role, row):
+    """Returns the sort key function of `role`."""
+    slot = common.RowData.slot(role)
+    if slot and isinstance(row, common.RowData):
+        return operator.attrgetter(slot)
+    return operator.itemgetter(role)
+
+
+def _set_row_ids(rows):
+    """Sets the `IdRole` of each row to its position in `rows`."""
+    if rows and isinstance(rows[0], common.RowData):
+        slot = common.RowData.slot(common.IdRole)
+        for n, v in enumerate(rows):
+            setattr(v, slot, n)
+        return
+    for n, v in enumerate(rows):
+        v[common.IdRole] = n
+
+
 def initdata(func):
     """Wraps `__initdata__` calls.
 
@@ -90,6 +112,7 @@ def initdata(func):
             log.debug('__initdata__()', self)
             func(self, *args, **kwargs)
 
+            self.invalidate_sort_cache()
             self.blockSignals(True)
             self.sort_data()
             self.blockSignals(False)
@@ -416,6 +439,7 @@ class BaseModel(QtCore.QAbstractListModel):
 
     queue_type = None
     thumbnail_queue_type = None
+    supports_lazy_fetch = False
 
     def __init__(self, has_threads=True, parent=None):
         super(BaseModel, self).__init__(parent=parent)
@@ -440,6 +464,20 @@ class BaseModel(QtCore.QAbstractListModel):
         self._datatype = {}
         self._sortrole = None
         self._sortorder = None
+        self._sort_cache = {}
+        self._fetched = {}
+        self._lazy_fetch = False
+
+        # Must be connected before the proxy and the views are
+        self.modelAboutToBeReset.connect(self.reset_fetched)
+        self.modelAboutToBeReset.connect(self.reset_worker_queues)
+
+        # The rows processed by the workers are signalled once per frame
+        self.flush_timer = QtCore.QTimer(parent=self)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.setInterval(common.FRAME_INTERVAL)
+        self.flush_timer.timeout.connect(self.flush_rows)
+        self.updateRow.connect(self.start_flush_timer)
 
         @QtCore.Slot(bool)
         @QtCore.Slot(int)
@@ -454,6 +492,7 @@ class BaseModel(QtCore.QAbstractListModel):
 
         self.initialize_default_sort_values()
         self.init_generate_thumbnails_enabled()
+        self.reset_fetched()
         self.initialise_threads()
 
     def supportedDropActions(self):
@@ -553,21 +592,21 @@ class BaseModel(QtCore.QAbstractListModel):
         """Sorts the internal `INTERNAL_MODEL_DATA` by the current
         `sort_role` and `sort_order`.
 
-        The data sorting is wrapped in a begin- & endResetModel sequence.
+        The sorted rows are cached for each sort role and order, so switching
+        between them only swaps the rows and emits `layoutChanged` instead of
+        resetting the model. The cache is bound to the `generation` of the
+        current data, so it is stale as soon as rows are added or removed.
+        It must be cleared with `invalidate_sort_cache()` when the sort values
+        of the rows change.
 
         """
         log.debug(u'sort_data()', self)
 
-        self.beginResetModel()
-
-        k = self.task_folder()
-        t = self.data_type()
-
         data = self.model_data()
         if not data:
             return
 
-        sortorder = self.sort_order()
+        sortorder = bool(self.sort_order())
         sortrole = self.sort_role()
         k = self.task_folder()
         t = self.data_type()
@@ -579,33 +618,71 @@ class BaseModel(QtCore.QAbstractListModel):
         ):
             sortrole = common.SortByNameRole
 
-        sorted_idxs = sorted(
-            data,
-            key=lambda i: data[i][sortrole],
-            reverse=sortorder
-        )
+        current = [data[n] for n in xrange(len(data))]
 
-        d = common.DataDict()
-        for n, idx in enumerate(sorted_idxs):
-            if data[idx][common.IdRole] != n:
-                data[idx][common.IdRole] = n
-            d[n] = data[idx]
+        cache = self._sort_cache.get((k, t))
+        if cache is None or cache[0]() is not data or cache[1] != data.generation:
+            cache = (weakref.ref(data), data.generation, {})
+            self._sort_cache[(k, t)] = cache
 
-        self.INTERNAL_MODEL_DATA[k][t] = d
+        rows = cache[2].get((sortrole, sortorder))
+        if rows is None:
+            # The reverse order is the reversed list of the same rows
+            _rows = cache[2].get((sortrole, not sortorder))
+            if _rows is not None:
+                rows = _rows[::-1]
+            else:
+                rows = sorted(
+                    current,
+                    key=_sort_key(sortrole, current[0]),
+                    reverse=sortorder
+                )
+            cache[2][(sortrole, sortorder)] = rows
+
+        # Nothing to do if the rows are already in order
+        if all(map(operator.is_, rows, current)):
+            return
+
+        self.layoutAboutToBeChanged.emit()
+
+        indexes = self.persistentIndexList()
+        moved = [data[f.row()] if f.row() in data else None for f in indexes]
 
-        self.endResetModel()
+        _data = common.DataDict(enumerate(rows))
+        self.INTERNAL_MODEL_DATA[k][t] = _data
+        self._sort_cache[(k, t)] = (weakref.ref(_data), _data.generation, cache[2])
+        _set_row_ids(rows)
+
+        # Rows sorted outside the fetched rows are no longer exposed
+        count = self.rowCount()
+        self.changePersistentIndexList(
+            indexes,
+            [self.index(v[common.IdRole], 0)
+             if v is not None and v[common.IdRole] < count else QtCore.QModelIndex()
+             for v in moved]
+        )
+        self.layoutChanged.emit()
+
+    def invalidate_sort_cache(self):
+        """Clears the cached row orders used by `sort_data()`."""
+        self._sort_cache = {}
 
     def __resetdata__(self):
         """Resets the internal data."""
         log.debug('__resetdata__()', self)
 
         self.INTERNAL_MODEL_DATA = common.DataDict()
+        self.invalidate_sort_cache()
         self.__initdata__()
 
     @QtCore.Slot()
     def set_interrupt_requested(self):
         self._interrupt_requested = True
 
+    def is_loading(self):
+        """Returns `True` if the model is still collecting its data."""
+        return False
+
     @initdata
     def __initdata__(self):
         raise NotImplementedError(
@@ -644,7 +721,6 @@ class BaseModel(QtCore.QAbstractListModel):
 
         thread.modelLoaded.connect(self.model_loaded, cnx)
 
-        self.taskFolderChanged.connect(thread.resetQueue, cnx)
         thread.startCheckQueue.emit()
 
     @QtCore.Slot()
@@ -676,6 +752,9 @@ class BaseModel(QtCore.QAbstractListModel):
         # do anything
         if self.data_type() != data_type:
             return
+
+        # The loaded file information changes the size and date sort orders
+        self.invalidate_sort_cache()
         if self.sort_order() or self.sort_role() != common.SortByNameRole:
             self.sort_data()
 
@@ -689,24 +768,29 @@ class BaseModel(QtCore.QAbstractListModel):
 
         log.debug('initialise_threads()', self)
 
-        info_worker = threads.InfoWorker(self.queue_type)
-        info_thread = threads.BaseThread(info_worker)
-        info_thread.started.connect(
-            partial(self.thread_started, info_thread, allow_model=True),
-            QtCore.Qt.DirectConnection
-        )
-        self.threads[common.InfoThread].append(info_thread)
-
-        thumbnails_worker = threads.ThumbnailWorker(self.thumbnail_queue_type)
-        thumbnails_thread = threads.BaseThread(thumbnails_worker)
-        thumbnails_thread.started.connect(
-            partial(self.thread_started, thumbnails_thread, allow_model=False),
-            QtCore.Qt.DirectConnection
-        )
-        self.threads[common.ThumbnailThread].append(thumbnails_thread)
+        # The workers of each thread type share the same queue. Only the first
+        # info thread queues the whole model, see `BaseWorker.add_model_to_queue`
+        for n in xrange(common.worker_threads(common.InfoThread)):
+            info_worker = threads.InfoWorker(self.queue_type)
+            info_thread = threads.BaseThread(info_worker)
+            info_thread.started.connect(
+                partial(self.thread_started, info_thread, allow_model=not n),
+                QtCore.Qt.DirectConnection
+            )
+            self.threads[common.InfoThread].append(info_thread)
+
+        for n in xrange(common.worker_threads(common.ThumbnailThread)):
+            thumbnails_worker = threads.ThumbnailWorker(self.thumbnail_queue_type)
+            thumbnails_thread = threads.BaseThread(thumbnails_worker)
+            thumbnails_thread.started.connect(
+                partial(self.thread_started, thumbnails_thread, allow_model=False),
+                QtCore.Qt.DirectConnection
+            )
+            self.threads[common.ThumbnailThread].append(thumbnails_thread)
 
-        info_thread.start()
-        thumbnails_thread.start()
+        for k in self.threads:
+            for thread in self.threads[k]:
+                thread.start()
 
     def init_generate_thumbnails_enabled(self):
         log.debug('init_generate_thumbnails_enabled()', self)
@@ -729,8 +813,12 @@ class BaseModel(QtCore.QAbstractListModel):
 
     @QtCore.Slot()
     def reset_worker_queues(self, all=False):
-        """Request all queued items to be removed from the thread/worker's
-        queue.
+        """Starts a new generation in the model's worker queues.
+
+        The queued items are discarded, and the workers abandon the items
+        of the previous generation at their next safe point. The queues are
+        reset directly, instead of signalling the workers, so stale items
+        can't be processed after the model has started loading its new data.
 
         """
         if not self._has_threads:
@@ -738,9 +826,9 @@ class BaseModel(QtCore.QAbstractListModel):
 
         log.debug('reset_worker_queues()', self)
 
-        for k in self.threads:
-            for thread in self.threads[k]:
-                thread.resetQueue.emit()
+        for queue_type in (self.queue_type, self.thumbnail_queue_type):
+            if queue_type in threads.QUEUES:
+                threads.QUEUES[queue_type].advance()
 
     def model_data(self):
         """A pointer to the model's currently set internal data."""
@@ -767,8 +855,115 @@ class BaseModel(QtCore.QAbstractListModel):
         return 1
 
     def rowCount(self, parent=QtCore.QModelIndex()):
-        """The number of rows in the model."""
-        return len(list(self.model_data()))
+        """The number of rows in the model.
+
+        When lazy fetching is enabled only the rows fetched so far are
+        counted, see `fetchMore()`.
+
+        """
+        n = len(self.model_data())
+        if not self._lazy_fetch:
+            return n
+        return min(n, self.fetched())
+
+    @QtCore.Slot(int)
+    def start_flush_timer(self, *args):
+        if not self.flush_timer.isActive():
+            self.flush_timer.start()
+
+    @QtCore.Slot()
+    def flush_rows(self):
+        """Signals the rows processed by the workers since the last flush.
+
+        The rows are taken from the :class:`.threads.RowBatch` of the model's
+        queues, and each contiguous range of rows is signalled with a single
+        `dataChanged` signal.
+
+        """
+        count = self.rowCount()
+        for queue_type in (self.queue_type, self.thumbnail_queue_type):
+            if queue_type not in threads.BATCHES:
+                continue
+            rows, roles = threads.BATCHES[queue_type].take()
+            rows = [f for f in rows if f < count]
+            for first, last in threads.get_ranges(rows):
+                self.dataChanged.emit(
+                    self.index(first, 0), self.index(last, 0), roles)
+
+    @QtCore.Slot()
+    def reset_fetched(self):
+        """Resets the fetched rows and reads the lazy fetch preference.
+
+        Called when the model is about to be reset.
+
+        """
+        self._fetched = {}
+        self._lazy_fetch = self.supports_lazy_fetch and common.lazy_fetch()
+
+    def _fetch_key(self):
+        return (self.task_folder(), self.data_type())
+
+    def fetched(self):
+        """The number of rows of the current data set the views may see.
+
+        The value can be larger than the number of rows in the model.
+
+        """
+        return self._fetched.get(self._fetch_key(), common.FETCH_SIZE)
+
+    def fetched_rows(self, first, last):
+        """Returns the part of the given row range the views may see.
+
+        Returns:
+            tuple: The first and last rows, `last` is smaller than `first`
+            when none of the rows are exposed.
+
+        """
+        if not self._lazy_fetch:
+            return first, last
+        return first, min(last, self.fetched() - 1)
+
+    def unfetch_rows(self, n):
+        """Decreases the number of fetched rows after removing `n` rows.
+
+        Must be called between `beginRemoveRows()` and `endRemoveRows()`.
+
+        """
+        if not self._lazy_fetch:
+            return
+        self._fetched[self._fetch_key()] = max(0, self.fetched() - n)
+
+    def canFetchMore(self, parent=QtCore.QModelIndex()):
+        """Returns `True` if there are rows the views haven't fetched yet."""
+        if parent.isValid() or not self._lazy_fetch:
+            return False
+        return self.rowCount() < len(self.model_data())
+
+    def fetchMore(self, parent=QtCore.QModelIndex()):
+        """Exposes the next :const:`.common.FETCH_SIZE` rows to the views."""
+        if not self.canFetchMore(parent):
+            return
+        self.fetch_to(self.rowCount() + common.FETCH_SIZE - 1)
+
+    def fetch_to(self, row):
+        """Makes sure all rows up to and including `row` are fetched.
+
+        The newly exposed rows have to be queued for the worker threads, so
+        the model is marked not loaded.
+
+        """
+        if not self._lazy_fetch:
+            return
+        first = self.rowCount()
+        last = min(row, len(self.model_data()) - 1)
+        if last < first:
+            return
+
+        self.beginInsertRows(QtCore.QModelIndex(), first, last)
+        self._fetched[self._fetch_key()] = last + 1
+        self.endInsertRows()
+
+        self._model_loaded[self.data_type()] = False
 
     def index(self, row, column, parent=QtCore.QModelIndex()):
         """Bog-standard index creator."""
@@ -781,8 +976,7 @@ class BaseModel(QtCore.QAbstractListModel):
         data = self.model_data()
         if index.row() not in data:
             return None
-        if role in data[index.row()]:
-            return data[index.row()][role]
+        return data[index.row()].get(role)
 
     @flagsmethod
     def flags(self, index):
@@ -1048,11 +1242,6 @@ class BaseListWidget(QtWidgets.QListView):
             lambda: log.debug('modelReset -> reselect_previous', model))
         model.modelReset.connect(self.reselect_previous)
 
-        # model.updateRow.connect(
-        #     lambda: log.debug('updateRow -> update_row', model))
-        model.updateRow.connect(
-            self.update_row, type=QtCore.Qt.QueuedConnection)
-
     @QtCore.Slot(QtCore.QModelIndex)
     def update(self, index):
         """This slot is used by all threads to repaint/update the given index
@@ -1266,17 +1455,21 @@ class BaseListWidget(QtWidgets.QListView):
             pass
 
         def save_to_db(k, mode, flag):
-            """Save the value to the database."""
+            """Queues the value to be written to the database.
+
+            The values are committed together by the bookmark's writer
+            thread, and `db.value()` returns the queued value until then.
+
+            """
             db = bookmark_db.get_db(
                 index.data(common.ParentPathRole)[0],
                 index.data(common.ParentPathRole)[1],
                 index.data(common.ParentPathRole)[2],
             )
-            with db.transactions():
-                f = db.value(k, u'flags')
-                f = 0 if f is None else f
-                f = f | flag if mode else f & ~flag
-                db.setValue(k, u'flags', f)
+            f = db.value(k, u'flags')
+            f = 0 if f is None else f
+            f = f | flag if mode else f & ~flag
+            db.queue_value(k, u'flags', f)
 
         def save_to_local_settings(k, mode, flag):
             favourites = settings.local_settings.favourites()
@@ -2543,6 +2736,9 @@ class ThreadedBaseWidget(BaseInlineIconWidget):
                                         model data.
         queue_visible_timer (QTimer):   Used to request file and thumnbnail
                                         information for individual items.
+        prefetch_timer (QTimer):        Used to request the information of the
+                                        items ahead of the viewport while
+                                        scrolling.
 
     """
 
@@ -2557,6 +2753,16 @@ class ThreadedBaseWidget(BaseInlineIconWidget):
         self.queue_visible_timer.setSingleShot(True)
         self.queue_visible_timer.setInterval(100)
 
+        self.prefetch_timer = QtCore.QTimer(parent=self)
+        self.prefetch_timer.setSingleShot(True)
+        self.prefetch_timer.setInterval(common.FRAME_INTERVAL * 3)
+
+        self.scroll_tracker = prefetch.ScrollTracker()
+        self._prefetched = {
+            common.InfoThread: {},
+            common.ThumbnailThread: {},
+        }
+
         self.connect_thread_signals()
 
     def connect_thread_signals(self):
@@ -2565,12 +2771,6 @@ class ThreadedBaseWidget(BaseInlineIconWidget):
         model = proxy.sourceModel()
         cnx_type = QtCore.Qt.AutoConnection
 
-        # Empty the queue when the data changes
-        model.modelAboutToBeReset.connect(
-            lambda: log.debug('modelAboutToBeReset -> reset_worker_queues', model))
-        model.modelAboutToBeReset.connect(
-            model.reset_worker_queues, cnx_type)
-
         # Visible indexes to threads
         self.queue_visible_timer.timeout.connect(
             lambda: log.debug('timeout -> queue_visible_indexes', self.queue_visible_timer))
@@ -2610,6 +2810,20 @@ class ThreadedBaseWidget(BaseInlineIconWidget):
             cnx_type
         )
 
+        # Streamed rows
+        model.rowsInserted.connect(
+            lambda: log.debug('rowsInserted -> start_queue_timers', model))
+        model.rowsInserted.connect(
+            self.start_queue_timers, cnx_type)
+        model.dataChanged.connect(
+            lambda: log.debug('dataChanged -> start_queue_timers', model))
+        model.dataChanged.connect(
+            self.start_queue_timers, cnx_type)
+        model.layoutChanged.connect(
+            lambda: log.debug('layoutChanged -> start_queue_timers', model))
+        model.layoutChanged.connect(
+            self.start_queue_timers, cnx_type)
+
         # Start / Stop request info timers
         model.modelAboutToBeReset.connect(
             lambda: log.debug('modelAboutToBeReset -> stop_queue_timers', model))
@@ -2650,9 +2864,27 @@ class ThreadedBaseWidget(BaseInlineIconWidget):
         self.verticalScrollBar().sliderReleased.connect(
             self.start_queue_timers)
 
-        # Thread update signals
-        model.modelAboutToBeReset.connect(
-            lambda: model.reset_worker_queues(all=True))
+        # Prefetch the rows ahead of the viewport while scrolling
+        self.verticalScrollBar().valueChanged.connect(self.track_scroll)
+        self.prefetch_timer.timeout.connect(
+            partial(
+                self.queue_prefetch_indexes,
+                common.FileInfoLoaded,
+                common.InfoThread
+            )
+        )
+        self.prefetch_timer.timeout.connect(
+            partial(
+                self.queue_prefetch_indexes,
+                common.ThumbnailLoaded,
+                common.ThumbnailThread
+            )
+        )
+        model.modelAboutToBeReset.connect(self.reset_prefetch, cnx_type)
+        proxy.layoutChanged.connect(self.reset_prefetch, cnx_type)
+        proxy.filterTextChanged.connect(self.reset_prefetch, cnx_type)
+        proxy.filterFlagChanged.connect(self.reset_prefetch, cnx_type)
+
         # Queue model data
         self.queue_model_timer.timeout.connect(self.queue_model_data)
 
@@ -2665,6 +2897,11 @@ class ThreadedBaseWidget(BaseInlineIconWidget):
             lambda: log.debug('modelReset -> queue_model_timer.start', model))
         model.modelReset.connect(self.queue_model_timer.start)
 
+        # Fetched rows
+        model.rowsInserted.connect(
+            lambda: log.debug('rowsInserted -> queue_model_timer.start', model))
+        model.rowsInserted.connect(self.queue_model_timer.start)
+
         model.modelReset.connect(
             lambda: self.verticalScrollBar().valueChanged.emit(self.verticalScrollBar().value()))
 
@@ -2694,8 +2931,52 @@ class ThreadedBaseWidget(BaseInlineIconWidget):
         model = self.model().sourceModel()
         if model._model_loaded[model.data_type()]:
             return
+        # The model will be queued when it has finished loading
+        if model.is_loading():
+            return
         model.queueModel.emit(repr(model))
 
+    def visible_rows(self):
+        """Returns the first and the last visible proxy rows.
+
+        The rows have a uniform height, so the range is calculated from the
+        first visible row instead of testing the rectangle of each row.
+
+        Returns:
+            tuple: `(first, last)` or `None` if no rows are visible.
+
+        """
+        count = self.model().rowCount()
+        if not count:
+            return None
+
+        viewport_rect = self.viewport().rect()
+        index = self.indexAt(viewport_rect.topLeft())
+        if not index.isValid():
+            return None
+        index_rect = self.visualRect(index)
+
+        first = index.row()
+        if index_rect.height() <= 0:
+            return first, first
+        n = float(viewport_rect.bottom() - index_rect.top() + 1)
+        n = int(math.ceil(n / index_rect.height()))
+        return first, min(first + n - 1, count - 1)
+
+    def _unloaded_ref(self, row, data, DataRole):
+        """Returns a weakref to the data of a proxy `row` if it hasn't been
+        loaded yet, otherwise `None`.
+
+        """
+        proxy = self.model()
+        idx = proxy.mapToSource(proxy.index(row, 0)).row()
+        if idx not in data:
+            return None
+        # We will skip the item if it has already been loaded
+        if data[idx][DataRole]:
+            return None
+        return weakref.ref(data[idx])
+
     @QtCore.Slot(int)
     @QtCore.Slot(int)
     def queue_visible_indexes(self, DataRole, thread_type):
@@ -2706,10 +2987,6 @@ class ThreadedBaseWidget(BaseInlineIconWidget):
             thread_type (int): Use the threads of `thread_type` to process the data.
 
         """
-        def _next(rect):
-            rect.moveTop(rect.top() + rect.height())
-            return self.indexAt(rect.topLeft())
-
         if not isinstance(DataRole, (int, long)):
             raise TypeError(
                 u'Invalid `DataRole`, expected <type \'int\', got {}'.format(type(DataRole)))
@@ -2727,28 +3004,19 @@ class ThreadedBaseWidget(BaseInlineIconWidget):
         model = proxy.sourceModel()
         data = model.model_data()
 
-        # Find the first visible index
-        viewport_rect = self.viewport().rect()
-        index = self.indexAt(viewport_rect.topLeft())
-        if not index.isValid():
+        rows = self.visible_rows()
+        if rows is None:
             return
-        index_rect = self.visualRect(index)
 
         thread_count = len(model.threads[thread_type])
         show_archived = proxy.filter_flag(common.MarkedAsArchived)
 
-        n = 0
-        i = 0
         l = []
-        while viewport_rect.intersects(index_rect):
-            # Don't check more than 999 items
-            if i >= 999:
-                break
-            i += 1
-
+        # Don't check more than 999 items
+        for row in xrange(rows[0], min(rows[1] + 1, rows[0] + 999)):
             # If we encounter an archived item, we should to invalidate the
             # proxy to hide it
-            is_archived = index.flags() & common.MarkedAsArchived
+            is_archived = proxy.index(row, 0).flags() & common.MarkedAsArchived
             if show_archived is False and is_archived:
                 proxy.invalidateFilter()
                 log.debug('queue_visible_indexes() - invalidateFilter()', self)
@@ -2756,35 +3024,97 @@ class ThreadedBaseWidget(BaseInlineIconWidget):
 
             # Nothing else to do if the threads are not enabled
             if not thread_count:
-                index = _next(index_rect)
-                continue
-
-            source_index = proxy.mapToSource(index)
-            idx = source_index.row()
-            if idx not in data:
-                index = _next(index_rect)
-                continue
-
-            # We will skip the time if it has alrady been loaded
-            skip = data[idx][DataRole]
-            if skip:
-                index = _next(index_rect)
                 continue
 
             # Put the weakref in the thread's queue
-            ref = weakref.ref(data[idx])
-            l.append(ref)
-            n += 1
+            ref = self._unloaded_ref(row, data, DataRole)
+            if ref is not None:
+                l.append(ref)
 
-            index = _next(index_rect)
-            if not index.isValid():
-                break
+        if not l:
+            return
 
-        for ref in reversed(l):
-            model.threads[thread_type][n % thread_count].add_to_queue(ref)
+        # The threads share the same queue, any of them can add the refs
+        model.threads[thread_type][0].add_to_queue(*reversed(l))
 
         log.debug('queue_visible_indexes() - done', self)
 
+    @QtCore.Slot(int)
+    def track_scroll(self, *args):
+        """Records the scroll position and starts the prefetch timer."""
+        rows = self.visible_rows()
+        if rows is None:
+            return
+        self.scroll_tracker.update(rows[0])
+        if not self.prefetch_timer.isActive():
+            self.prefetch_timer.start()
+
+    @QtCore.Slot()
+    def reset_prefetch(self):
+        """Cancels the prefetched items and resets the scroll tracking."""
+        self.prefetch_timer.stop()
+        self.scroll_tracker.reset()
+
+        model = self.model().sourceModel()
+        for thread_type, prefetched in self._prefetched.iteritems():
+            if prefetched and model.threads[thread_type]:
+                model.threads[thread_type][0].cancel_prefetch(
+                    *prefetched.values())
+            prefetched.clear()
+
+    @QtCore.Slot(int)
+    @QtCore.Slot(int)
+    def queue_prefetch_indexes(self, DataRole, thread_type):
+        """Queue the indexes about to be scrolled into view.
+
+        The number of items is set by `common.prefetch_rows()`, and the items
+        are queued with `PrefetchPriority` in the scroll direction. Items
+        prefetched earlier are cancelled when they've scrolled far out of view.
+
+        Args:
+            DataRole (int): The model data role used for checking the state of the index.
+            thread_type (int): Use the threads of `thread_type` to process the data.
+
+        """
+        count = common.prefetch_rows()
+        proxy = self.model()
+        model = proxy.sourceModel()
+        if not count or not model.threads[thread_type]:
+            return
+
+        rows = self.visible_rows()
+        if rows is None:
+            return
+        first, last = rows
+
+        thread = model.threads[thread_type][0]
+        prefetched = self._prefetched[thread_type]
+        far = [
+            f for f in prefetched
+            if self.scroll_tracker.is_far(f, first, last, count)
+        ]
+        if far:
+            thread.cancel_prefetch(*[prefetched.pop(f) for f in far])
+
+        data = model.model_data()
+        show_archived = proxy.filter_flag(common.MarkedAsArchived)
+
+        l = []
+        for row in self.scroll_tracker.window(first, last, count, proxy.rowCount()):
+            if row in prefetched:
+                continue
+            is_archived = proxy.index(row, 0).flags() & common.MarkedAsArchived
+            if show_archived is False and is_archived:
+                continue
+            ref = self._unloaded_ref(row, data, DataRole)
+            if ref is None:
+                continue
+            prefetched[row] = ref
+            l.append(ref)
+
+        if l:
+            thread.prefetch(*l)
+
     def wheelEvent(self, event):
         super(ThreadedBaseWidget, self).wheelEvent(event)
         self.start_queue_timers()
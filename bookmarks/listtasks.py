@@ -23,16 +23,8 @@ from . import images
 from . import settings
 from . import threads
 from . import defaultpaths
-
-
-
-MONITOR = QtCore.QFileSystemWatcher()
-
-
-def reset_monitor():
-    MONITOR.removePaths(MONITOR.files())
-    MONITOR.removePaths(MONITOR.directories())
-
+from . import changefeed
+from . import indexserver
 
 
 class TaskFolderContextMenu(contextmenu.BaseContextMenu):
@@ -173,8 +165,8 @@ class TaskFolderModel(lists.BaseModel):
         super(TaskFolderModel, self).__init__(parent=parent)
         self.modelDataResetRequested.connect(self.__resetdata__)
 
-        MONITOR.fileChanged.connect(self.__resetdata__)
-        MONITOR.directoryChanged.connect(self.__resetdata__)
+        self.change_feed = changefeed.ChangeFeed(recursive=False, parent=self)
+        self.change_feed.changed.connect(self.apply_changes)
 
     def initialise_threads(self):
         """Starts and connects the threads."""
@@ -219,26 +211,16 @@ class TaskFolderModel(lists.BaseModel):
     def data_type(self):
         return common.FileItem
 
-    def sort_data(self):
-        """This model is always alphabetical."""
-        pass
-
     @lists.initdata
     def __initdata__(self):
         """Bookmarks and assets are static. But files will be any number of """
-        reset_monitor()
+        self.change_feed.clear()
 
         self.INTERNAL_MODEL_DATA[0] = common.DataDict({
             common.FileItem: common.DataDict(),
             common.SequenceItem: common.DataDict()
         })
 
-        flags = (
-            QtCore.Qt.ItemIsSelectable |
-            QtCore.Qt.ItemIsEnabled |
-            QtCore.Qt.ItemIsDropEnabled |
-            QtCore.Qt.ItemIsEditable
-        )
         data = self.model_data()
 
         if not self.parent_path:
@@ -254,9 +236,20 @@ class TaskFolderModel(lists.BaseModel):
         default_thumbnail = default_thumbnail.toImage()
 
         parent_path = u'/'.join(self.parent_path)
-        MONITOR.addPath(parent_path)
+        if common.use_index_server():
+            scandir = indexserver.scandir
+        else:
+            scandir = _scandir.scandir
         entries = sorted(
-            ([f for f in _scandir.scandir(parent_path)]), key=lambda x: x.name)
+            ([f for f in scandir(parent_path)]), key=lambda x: x.name)
+
+        # The asset folder is watched for new and removed task folders
+        self.change_feed.watch({
+            parent_path: (
+                [f.name for f in entries if not f.is_dir()],
+                [f.name for f in entries if f.is_dir()],
+            )
+        })
 
         for entry in entries:
             if entry.name.startswith(u'.'):
@@ -264,26 +257,89 @@ class TaskFolderModel(lists.BaseModel):
             if not entry.is_dir():
                 continue
             idx = len(data)
-            data[idx] = common.DataDict({
-                QtCore.Qt.DisplayRole: entry.name,
-                QtCore.Qt.EditRole: entry.name,
-                QtCore.Qt.StatusTipRole: entry.path.replace(u'\\', u'/'),
-                QtCore.Qt.ToolTipRole: u'',
-                QtCore.Qt.ToolTipRole: defaultpaths.get_description(entry.name),
-                QtCore.Qt.SizeHintRole: self.ROW_SIZE,
-                #
-                common.FlagsRole: flags,
-                common.ParentPathRole: self.parent_path,
-                #
-                common.FileInfoLoaded: False,
-                common.ThumbnailLoaded: True,
-                common.TodoCountRole: 0,
-                #
-                common.IdRole: idx,
-            })
+            data[idx] = self._create_row(
+                entry.name, entry.path.replace(u'\\', u'/'), idx)
             thread = self.threads[common.InfoThread][0]
             thread.add_to_queue(weakref.ref(data[idx]))
 
+    def _create_row(self, name, path, idx):
+        flags = (
+            QtCore.Qt.ItemIsSelectable |
+            QtCore.Qt.ItemIsEnabled |
+            QtCore.Qt.ItemIsDropEnabled |
+            QtCore.Qt.ItemIsEditable
+        )
+        return common.RowData({
+            QtCore.Qt.DisplayRole: name,
+            QtCore.Qt.EditRole: name,
+            QtCore.Qt.StatusTipRole: path,
+            QtCore.Qt.ToolTipRole: u'',
+            QtCore.Qt.ToolTipRole: defaultpaths.get_description(name),
+            QtCore.Qt.SizeHintRole: self.ROW_SIZE,
+            #
+            common.FlagsRole: flags,
+            common.ParentPathRole: self.parent_path,
+            #
+            common.FileInfoLoaded: False,
+            common.ThumbnailLoaded: True,
+            common.TodoCountRole: 0,
+            #
+            common.SortByNameRole: common.namekey(name),
+            common.SortByLastModifiedRole: 0,
+            common.SortBySizeRole: 0,
+            #
+            common.IdRole: idx,
+        })
+
+    @QtCore.Slot(object)
+    def apply_changes(self, changes):
+        """Inserts and removes the rows of the added and removed task folders.
+
+        The new rows are appended and moved to their place by `sort_data()`.
+
+        Args:
+            changes (list): :class:`.changefeed.Change` items.
+
+        """
+        data = self.model_data()
+        added = False
+
+        for change in changes:
+            if change.mtime is None:
+                # The asset folder itself has been removed
+                self.__resetdata__()
+                return
+
+            for name in change.removed_dirs:
+                for idx in xrange(len(data)):
+                    if data[idx][QtCore.Qt.DisplayRole] != name:
+                        continue
+                    self.beginRemoveRows(QtCore.QModelIndex(), idx, idx)
+                    rows = [data[n] for n in xrange(len(data)) if n != idx]
+                    data.clear()
+                    for n, v in enumerate(rows):
+                        v[common.IdRole] = n
+                        data[n] = v
+                    self.endRemoveRows()
+                    break
+
+            for name in change.added_dirs:
+                if name.startswith(u'.'):
+                    continue
+
+                idx = len(data)
+                self.beginInsertRows(QtCore.QModelIndex(), idx, idx)
+                data[idx] = self._create_row(
+                    name, change.path + u'/' + name, idx)
+                self.endInsertRows()
+                added = True
+
+                thread = self.threads[common.InfoThread][0]
+                thread.add_to_queue(weakref.ref(data[idx]))
+
+        if added:
+            self.sort_data()
+
     @QtCore.Slot()
     def check_task_folder(self):
         """Verify the current task folder."""
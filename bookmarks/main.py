@@ -18,6 +18,7 @@ from . import bookmark_db
 from . import images
 from . import settings
 from . import threads
+from . import thumbnailfarm
 from . import contextmenu
 from . import lists
 from . import listassets
@@ -590,8 +591,11 @@ class MainWidget(QtWidgets.QWidget):
                 n += 1
                 time.sleep(0.3)
 
+            thumbnailfarm.shutdown()
+
         self.statusbar.showMessage(u'Closing down...')
         quit_threads()
+        bookmark_db.shutdown()
         close_database_connections()
         ui_teardown()
 
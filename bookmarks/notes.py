@@ -1140,7 +1140,7 @@ class TodoEditorWidget(QtWidgets.QDialog):
             common_ui.ErrorBox(u'Error saving notes.', s).open()
             raise
 
-        db.setValue(k, u'notes', v)
+        db.queue_value(k, u'notes', v)
         todo_count = len([k for k in data if not data[k][u'checked']])
         self.index.model().setData(
             self.index,
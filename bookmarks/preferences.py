@@ -10,6 +10,8 @@ from . import common
 from . import common_ui
 from . import settings
 from . import defaultpaths
+from . import threads
+from . import thumbnailfarm
 
 
 _widget_instance = None
@@ -157,6 +159,9 @@ class ApplicationSettingsWidget(BaseSettingsWidget):
         self.show_help = None
         self.rv_path = None
         self.ffmpeg_path = None
+        self.walker_threads = None
+
+        self.thumbnail_farm = None
 
         if common.STANDALONE:
             self.ui_scale = None
@@ -208,6 +213,134 @@ class ApplicationSettingsWidget(BaseSettingsWidget):
         #######################################################
         row = common_ui.add_row(None, parent=self)
 
+        label = common_ui.PaintedLabel(
+            u'Performance',
+            size=common.LARGE_FONT_SIZE(),
+            parent=row
+        )
+        row.layout().addWidget(label)
+        row.layout().addStretch(1)
+
+        grp = common_ui.get_group(parent=self)
+
+        row = common_ui.add_row(u'Folder scan threads', parent=grp)
+        self.walker_threads = QtWidgets.QComboBox(parent=self)
+        self.walker_threads.setFixedHeight(common.ROW_HEIGHT() * 0.66)
+        for n in (1, 2, 4, 8, 16, 32):
+            self.walker_threads.addItem(unicode(n))
+            idx = self.walker_threads.count() - 1
+            self.walker_threads.setItemData(idx, n, role=QtCore.Qt.UserRole)
+            data = QtCore.QSize(1, common.ROW_HEIGHT() * 0.66)
+            self.walker_threads.setItemData(
+                idx, data, role=QtCore.Qt.SizeHintRole)
+        row.layout().addWidget(self.walker_threads, 1)
+
+        text = \
+            u'The number of folders listed at the same time when loading files. \
+Increasing the number can speed up loading files from network shares.'
+        common_ui.add_description(text, label=u'Hint', parent=grp)
+
+        row = common_ui.add_row(u'File info threads', parent=grp)
+        self.info_threads = QtWidgets.QComboBox(parent=self)
+        row.layout().addWidget(self.info_threads, 1)
+        row = common_ui.add_row(u'Thumbnail threads', parent=grp)
+        self.thumbnail_threads = QtWidgets.QComboBox(parent=self)
+        row.layout().addWidget(self.thumbnail_threads, 1)
+
+        for widget in (self.info_threads, self.thumbnail_threads):
+            widget.setFixedHeight(common.ROW_HEIGHT() * 0.66)
+            for n in (1, 2, 4, 8, 16):
+                widget.addItem(unicode(n))
+                idx = widget.count() - 1
+                widget.setItemData(idx, n, role=QtCore.Qt.UserRole)
+                data = QtCore.QSize(1, common.ROW_HEIGHT() * 0.66)
+                widget.setItemData(idx, data, role=QtCore.Qt.SizeHintRole)
+
+        text = \
+            u'The number of threads loading file information and thumbnails. \
+Visible items are always loaded first. Takes effect after a restart.'
+        common_ui.add_description(text, label=u'Hint', parent=grp)
+
+        row = common_ui.add_row(u'Prefetch rows', parent=grp)
+        self.prefetch_rows = QtWidgets.QComboBox(parent=self)
+        self.prefetch_rows.setFixedHeight(common.ROW_HEIGHT() * 0.66)
+        for n in (0, 25, 50, 100, 200):
+            self.prefetch_rows.addItem(unicode(n) if n else u'Off')
+            idx = self.prefetch_rows.count() - 1
+            self.prefetch_rows.setItemData(idx, n, role=QtCore.Qt.UserRole)
+            data = QtCore.QSize(1, common.ROW_HEIGHT() * 0.66)
+            self.prefetch_rows.setItemData(
+                idx, data, role=QtCore.Qt.SizeHintRole)
+        row.layout().addWidget(self.prefetch_rows, 1)
+
+        text = \
+            u'The number of items loaded ahead of the visible items when \
+scrolling. Items scrolled far out of view are not loaded.'
+        common_ui.add_description(text, label=u'Hint', parent=grp)
+
+        row = common_ui.add_row(u'Sequence size', parent=grp)
+        self.sample_sequences = QtWidgets.QCheckBox(
+            u'Estimate the size of large sequences', parent=grp)
+        row.layout().addStretch(1)
+        row.layout().addWidget(self.sample_sequences)
+
+        text = \
+            u'Only a sample of the frames is checked when showing the size of \
+large sequences. The exact size is calculated in the background.'
+        common_ui.add_description(text, label=u'Hint', parent=grp)
+
+        row = common_ui.add_row(u'Lazy loading', parent=grp)
+        self.lazy_fetch = QtWidgets.QCheckBox(
+            u'Show files on demand', parent=grp)
+        row.layout().addStretch(1)
+        row.layout().addWidget(self.lazy_fetch)
+
+        text = \
+            u'Only show the first {} files and load more when scrolling to \
+the end of the list. Makes browsing very large folders faster. Takes effect \
+when the files are next loaded.'.format(common.FETCH_SIZE)
+        common_ui.add_description(text, label=u'Hint', parent=grp)
+
+        row = common_ui.add_row(u'Index server', parent=grp)
+        self.index_server = QtWidgets.QCheckBox(
+            u'Use the local index server', parent=grp)
+        row.layout().addStretch(1)
+        row.layout().addWidget(self.index_server)
+
+        text = \
+            u'Let a shared background service list and watch the folders \
+instead of each {} instance doing it separately. Start the service with \
+"python -m bookmarks.indexserver". Folders are listed locally when the \
+service is not running.'.format(common.PRODUCT)
+        common_ui.add_description(text, label=u'Hint', parent=grp)
+
+        if common.STANDALONE and thumbnailfarm.get_executable():
+            row = common_ui.add_row(u'Thumbnail processes', parent=grp)
+            self.thumbnail_farm = QtWidgets.QCheckBox(
+                u'Generate thumbnails in separate processes', parent=grp)
+            row.layout().addStretch(1)
+            row.layout().addWidget(self.thumbnail_farm)
+
+            text = \
+                u'Decodes images and generates thumbnails using {} worker \
+processes. Large images are converted in parallel, and a crashing image \
+decoder won\'t close {}.'.format(thumbnailfarm.DEFAULT_PROCESSES, common.PRODUCT)
+            common_ui.add_description(text, label=u'Hint', parent=grp)
+
+        row = common_ui.add_row(u'Statistics', parent=grp)
+        self.dump_stats = QtWidgets.QCheckBox(
+            u'Save the queue statistics', parent=grp)
+        row.layout().addStretch(1)
+        row.layout().addWidget(self.dump_stats)
+
+        text = \
+            u'Saves the processing times of the worker queues to a JSON file \
+every {} seconds. Hover over the loading indicator to see the current \
+values.'.format(threads.DUMP_INTERVAL / 1000)
+        common_ui.add_description(text, label=u'Hint', parent=grp)
+        #######################################################
+        row = common_ui.add_row(None, parent=self)
+
         label = common_ui.PaintedLabel(
             u'External Applications',
             size=common.LARGE_FONT_SIZE(),
@@ -343,6 +476,50 @@ class ApplicationSettingsWidget(BaseSettingsWidget):
 
             self.ui_scale.activated.connect(save_ui_scale)
 
+        @QtCore.Slot(int)
+        def save_walker_threads(x):
+            v = self.walker_threads.itemData(x, role=QtCore.Qt.UserRole)
+            settings.local_settings.setValue(
+                get_preference(u'walker_threads'), v)
+
+        self.walker_threads.activated.connect(save_walker_threads)
+
+        @QtCore.Slot(int)
+        def save_info_threads(x):
+            v = self.info_threads.itemData(x, role=QtCore.Qt.UserRole)
+            settings.local_settings.setValue(
+                get_preference(u'info_threads'), v)
+
+        self.info_threads.activated.connect(save_info_threads)
+
+        @QtCore.Slot(int)
+        def save_thumbnail_threads(x):
+            v = self.thumbnail_threads.itemData(x, role=QtCore.Qt.UserRole)
+            settings.local_settings.setValue(
+                get_preference(u'thumbnail_threads'), v)
+
+        self.thumbnail_threads.activated.connect(save_thumbnail_threads)
+
+        @QtCore.Slot(int)
+        def save_prefetch_rows(x):
+            v = self.prefetch_rows.itemData(x, role=QtCore.Qt.UserRole)
+            settings.local_settings.setValue(
+                get_preference(u'prefetch_rows'), v)
+
+        self.prefetch_rows.activated.connect(save_prefetch_rows)
+
+        self.sample_sequences.toggled.connect(
+            lambda x: settings.local_settings.setValue(get_preference(u'sample_sequences'), x))
+        self.lazy_fetch.toggled.connect(
+            lambda x: settings.local_settings.setValue(get_preference(u'lazy_fetch'), x))
+        self.index_server.toggled.connect(
+            lambda x: settings.local_settings.setValue(get_preference(u'index_server'), x))
+        if self.thumbnail_farm is not None:
+            self.thumbnail_farm.toggled.connect(
+                lambda x: settings.local_settings.setValue(get_preference(u'thumbnail_farm'), x))
+        self.dump_stats.toggled.connect(
+            lambda x: settings.local_settings.setValue(get_preference(u'dump_stats'), x))
+
         self.rv_path.textChanged.connect(self.set_rv_path)
         self.ffmpeg_path.textChanged.connect(self.set_ffmpeg_path)
 
@@ -355,6 +532,33 @@ class ApplicationSettingsWidget(BaseSettingsWidget):
                 if idx != -1:
                     self.ui_scale.setCurrentIndex(idx)
 
+        idx = self.walker_threads.findData(
+            common.walker_threads(), role=QtCore.Qt.UserRole)
+        if idx != -1:
+            self.walker_threads.setCurrentIndex(idx)
+
+        idx = self.info_threads.findData(
+            common.worker_threads(common.InfoThread), role=QtCore.Qt.UserRole)
+        if idx != -1:
+            self.info_threads.setCurrentIndex(idx)
+
+        idx = self.thumbnail_threads.findData(
+            common.worker_threads(common.ThumbnailThread), role=QtCore.Qt.UserRole)
+        if idx != -1:
+            self.thumbnail_threads.setCurrentIndex(idx)
+
+        idx = self.prefetch_rows.findData(
+            common.prefetch_rows(), role=QtCore.Qt.UserRole)
+        if idx != -1:
+            self.prefetch_rows.setCurrentIndex(idx)
+
+        self.sample_sequences.setChecked(common.sample_sequences())
+        self.lazy_fetch.setChecked(common.lazy_fetch())
+        self.index_server.setChecked(common.use_index_server())
+        if self.thumbnail_farm is not None:
+            self.thumbnail_farm.setChecked(common.thumbnail_farm())
+        self.dump_stats.setChecked(common.dump_stats())
+
         rv_path = settings.local_settings.value(get_preference(u'rv_path'))
         val = rv_path if rv_path else None
         self.rv_path.setText(val)
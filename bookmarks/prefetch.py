@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""Scroll tracking used to load the rows ahead of the viewport.
+
+The list widgets only load the file information and the thumbnails of the
+visible rows once scrolling stops. When scrolling through a long list this
+means every row is shown as a placeholder first. :class:`.ScrollTracker`
+keeps track of the scroll direction and velocity, and calculates the rows
+that are about to become visible, so they can be queued ahead of time with
+a lower priority than the visible rows.
+
+.. code-block:: python
+
+    tracker = prefetch.ScrollTracker()
+    tracker.update(first_visible_row)
+    rows = tracker.window(first, last, 50, row_count)
+    # xrange(21, 71)
+
+Note:
+    The module does not depend on Qt so it can be used outside of a running
+    Bookmarks session.
+
+"""
+import time
+
+
+DEFAULT_ROWS = 50
+"""The default number of rows prefetched ahead of the viewport."""
+
+LEAD = 0.2
+"""The number of seconds of scrolling that is skipped when prefetching.
+
+Rows scrolled past before the workers get to them are not worth loading.
+
+"""
+
+IDLE = 0.5
+"""Scrolling slower than one row in this many seconds resets the velocity."""
+
+SMOOTHING = 0.5
+"""The weight of the previous velocity when a new position is recorded."""
+
+KEEP = 2
+"""Prefetched rows further than this many windows from the viewport are
+cancelled."""
+
+
+class ScrollTracker(object):
+    """Tracks the scroll direction and velocity of a list.
+
+    Attributes:
+        direction (int): `1` when scrolling down, `-1` when scrolling up.
+        velocity (float): The smoothed scroll velocity in rows per second.
+
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.direction = 1
+        self.velocity = 0.0
+        self._row = None
+        self._t = None
+
+    def update(self, row, t=None):
+        """Records the current first visible row.
+
+        Args:
+            row (int): The first visible row.
+            t (float): The time of the position. Defaults to now.
+
+        """
+        t = time.time() if t is None else t
+        if self._row is None or row == self._row:
+            if self._t is None or t - self._t > IDLE:
+                self.velocity = 0.0
+                self._row = row
+                self._t = t
+            return
+
+        dt = t - self._t
+        delta = row - self._row
+        self.direction = 1 if delta > 0 else -1
+        if dt > IDLE or dt <= 0.0:
+            v = 0.0
+        else:
+            v = abs(delta) / dt
+        self.velocity = v * (1.0 - SMOOTHING) + self.velocity * SMOOTHING
+        self._row = row
+        self._t = t
+
+    def window(self, first, last, count, rows):
+        """Returns the rows to prefetch, nearest to the viewport first.
+
+        Args:
+            first (int): The first visible row.
+            last (int): The last visible row.
+            count (int): The number of rows to prefetch.
+            rows (int): The number of rows in the list.
+
+        Returns:
+            xrange: The rows in the scroll direction.
+
+        """
+        skip = min(int(self.velocity * LEAD), count)
+        if self.direction > 0:
+            start = last + 1 + skip
+            return xrange(start, min(start + count, rows))
+        start = min(first - 1 - skip, rows - 1)
+        return xrange(start, max(start - count, -1), -1)
+
+    def is_far(self, row, first, last, count):
+        """Checks if a prefetched `row` has scrolled out of range.
+
+        Returns:
+            bool: `True` if the row is more than `KEEP` windows away from
+            the viewport.
+
+        """
+        return row < first - count * KEEP or row > last + count * KEEP
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""Processing statistics of the worker queues.
+
+Workers time every item they process, split into the time spent waiting for
+the bookmark database, the file system and decoding images. The timings are
+kept per queue in :class:`.QueueStats`, and can be used to tell whether slow
+loading is caused by the file server or by the database.
+
+.. code-block:: python
+
+    stats = queuestats.QueueStats()
+    timer = queuestats.ItemTimer()
+    with timer.phase(u'db'):
+        pass  # query the database
+    stats.record(timer)
+    stats.snapshot()
+    # {'processed': 1, 'rate': 0.1, 'total': {'p50': 0.0001, 'p95': 0.0001}, ...}
+
+Note:
+    The module does not depend on Qt so it can be used outside of a running
+    Bookmarks session.
+
+"""
+import os
+import json
+import math
+import time
+import threading
+import collections
+
+
+PHASES = (u'db', u'stat', u'image')
+"""The phases of an item's processing time."""
+
+SAMPLES = 1000
+"""The number of most recent timings used to calculate the percentiles."""
+
+WINDOW = 10.0
+"""The number of seconds used to calculate the processing rate."""
+
+
+def percentile(values, p):
+    """Returns the `p` percentile of `values` using the nearest-rank method.
+
+    Args:
+        values (list): A list of numbers.
+        p (float): The percentile, between 0 and 100.
+
+    Returns:
+        float: The percentile or `None` if `values` is empty.
+
+    """
+    if not values:
+        return None
+    values = sorted(values)
+    idx = int(math.ceil(p / 100.0 * len(values))) - 1
+    return values[max(0, min(idx, len(values) - 1))]
+
+
+class ItemTimer(object):
+    """Times the phases of processing a single item."""
+
+    def __init__(self):
+        self.start = time.time()
+        self.phases = {}
+
+    def phase(self, name):
+        """Returns a context manager adding its duration to phase `name`."""
+        return _Phase(self, name)
+
+
+class _Phase(object):
+    __slots__ = ('timer', 'name', 't')
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+        self.t = None
+
+    def __enter__(self):
+        self.t = time.time()
+        return self
+
+    def __exit__(self, *args):
+        v = time.time() - self.t
+        self.timer.phases[self.name] = self.timer.phases.get(self.name, 0.0) + v
+        return False
+
+
+class QueueStats(object):
+    """Thread-safe statistics of the items processed from a queue.
+
+    Counts:
+        processed: The number of items processed.
+        stale: Items abandoned because their model was reloaded.
+        dropped: Items discarded before being processed.
+
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._counts = {u'processed': 0, u'stale': 0, u'dropped': 0}
+            self._done = collections.deque()
+            self._totals = collections.deque([], SAMPLES)
+            self._phases = dict(
+                (k, collections.deque([], SAMPLES)) for k in PHASES)
+
+    def count(self, key, n=1):
+        """Increments the `stale` or `dropped` counts."""
+        with self._lock:
+            self._counts[key] += n
+
+    def record(self, timer):
+        """Records the timings of a processed item.
+
+        Args:
+            timer (ItemTimer): The item's timer.
+
+        """
+        t = time.time()
+        total = t - timer.start
+        with self._lock:
+            self._counts[u'processed'] += 1
+            self._done.append(t)
+            self._totals.append(total)
+            for k in PHASES:
+                self._phases[k].append(timer.phases.get(k, 0.0))
+            self._expire(t)
+
+    def _expire(self, t):
+        while self._done and self._done[0] < t - WINDOW:
+            self._done.popleft()
+
+    def rate(self):
+        """Returns the number of items processed per second."""
+        with self._lock:
+            self._expire(time.time())
+            return len(self._done) / WINDOW
+
+    def snapshot(self):
+        """Returns the current statistics.
+
+        Returns:
+            dict: The counts, the processing rate and the p50 and p95 of the
+            total and the per phase processing times, in seconds.
+
+        """
+        with self._lock:
+            self._expire(time.time())
+            v = dict(self._counts)
+            v[u'rate'] = len(self._done) / WINDOW
+            totals = list(self._totals)
+            phases = dict((k, list(self._phases[k])) for k in PHASES)
+
+        v[u'total'] = {
+            u'p50': percentile(totals, 50),
+            u'p95': percentile(totals, 95),
+        }
+        for k in PHASES:
+            v[k] = {
+                u'p50': percentile(phases[k], 50),
+                u'p95': percentile(phases[k], 95),
+            }
+        return v
+
+
+def dump(stats, path):
+    """Saves `stats` as a JSON file.
+
+    The file is written to a temporary file first, and then renamed, so
+    readers never see a partially written file.
+
+    Args:
+        stats (dict): The statistics to save.
+        path (unicode): Path to the JSON file.
+
+    """
+    v = {u'time': time.time(), u'queues': stats}
+    tmp = path + u'.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(v, f, indent=2, sort_keys=True)
+    if os.path.exists(path):
+        os.remove(path)
+    os.rename(tmp, path)
@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+"""Groups file paths into sequences in a single pass.
+
+:func:`.common.get_sequence` matches a single path at a time. When loading a
+task folder with hundreds of thousands of frames, calling the regex from
+Python for every file, and later parsing every frame number to work out the
+frame ranges, adds up. The functions here work on whole batches instead: the
+regex is only run once for all paths that differ only in their digits, and
+the frame numbers are stored as packed integer arrays so the ranges, the
+start and end frames and the missing frames can be calculated using `numpy`.
+
+.. code-block:: python
+
+    sequences, others = sequence.group([
+        u'//server/job/shot_0001.exr',
+        u'//server/job/shot_0002.exr',
+        u'//server/job/shot_0004.exr',
+        u'//server/job/scene.ma',
+    ])
+    seq = sequences[0]
+    seq.path()  # u'//server/job/shot_[0].exr'
+    seq.ranges()  # u'0001-0002,0004'
+    seq.gaps()  # [[3, 3]]
+    seq.group(1)  # u'//server/job/shot_'
+    others  # [3, ]
+
+The groups of :class:`.SequenceMatch` and :class:`.Sequence` are the same as
+the groups of :func:`.common.get_sequence`'s match objects, so they can be
+used as `SequenceRole` values.
+
+Note:
+    The module does not depend on Qt so it can be used outside of a running
+    Bookmarks session.
+
+"""
+import re
+import string
+import itertools
+
+import numpy
+
+
+SEQPROXY = u'[0]'
+"""The frame marker used by :func:`.Sequence.path`, see `common.SEQPROXY`."""
+
+SequenceRegex = re.compile(
+    ur'^(.*?)([0-9]+)([0-9\\/]*|[^0-9\\/]*(?=.+?))\.([^\.]{1,})$',
+    flags=re.IGNORECASE | re.UNICODE)
+"""The same expression as `common.GetSequenceRegex`."""
+
+_DIGITS = string.maketrans('123456789', '000000000')
+_EMPTY = (u'', u'', u'', u'')
+
+
+def _findall(paths):
+    """Returns the prefix, frame, suffix and extension of each path.
+
+    The regex treats all digits the same way, so paths that differ only in
+    their digits, like the frames of a sequence, have the same match. Each
+    path is reduced to its *shape*, by replacing all digits with zeros, and
+    the regex is only run once for each distinct shape. The groups are then
+    sliced from the paths.
+
+    """
+    if not paths:
+        return []
+
+    # All shapes are created in one go
+    shapes = u'\n'.join(paths).encode('utf-8').translate(_DIGITS).split('\n')
+    if len(shapes) != len(paths):
+        # Paths containing line breaks
+        shapes = [f.encode('utf-8').translate(_DIGITS) for f in paths]
+
+    spans = {}
+    matches = []
+    for path, shape in itertools.izip(paths, shapes):
+        span = spans.get(shape)
+        if span is None:
+            match = SequenceRegex.search(shape.decode('utf-8'))
+            if match:
+                span = (match.end(1), match.end(2), match.end(3))
+            else:
+                span = ()
+            spans[shape] = span
+
+        if not span:
+            matches.append(_EMPTY)
+            continue
+        a, b, c = span
+        matches.append((path[:a], path[a:b], path[b:c], path[c + 1:]))
+    return matches
+
+
+def to_array(frames):
+    """Converts a list of frame number strings to an integer array."""
+    if not len(frames):
+        return numpy.array([], dtype=numpy.int64)
+    try:
+        return numpy.array(frames).astype(numpy.int64)
+    except OverflowError:
+        # Numbers too large for a 64 bit integer
+        return numpy.array([int(f) for f in frames], dtype=object)
+
+
+def get_ranges(frames, padding):
+    """Returns the string representation of the ranges in `frames`.
+
+    The vectorized version of `common.get_ranges`.
+
+    Args:
+        frames (list): Frame numbers, as integers or an integer array.
+        padding (int): The number of digits to pad the frame numbers to.
+
+    Returns:
+        unicode: The ranges, eg. ``0001-0010,0012``.
+
+    """
+    frames = numpy.unique(frames)
+    if not len(frames):
+        return u''
+
+    breaks = numpy.flatnonzero(numpy.diff(frames) != 1)
+    starts = frames[numpy.concatenate(([0, ], breaks + 1))].tolist()
+    ends = frames[numpy.concatenate((breaks, [len(frames) - 1, ]))].tolist()
+
+    return u','.join(
+        unicode(s).zfill(padding) if s == e else
+        unicode(s).zfill(padding) + u'-' + unicode(e).zfill(padding)
+        for s, e in itertools.izip(starts, ends)
+    )
+
+
+def match(paths):
+    """Matches the sequence number of each path in a single pass.
+
+    Args:
+        paths (list): A list of file paths.
+
+    Returns:
+        list: A :class:`.SequenceMatch` for each path, or `None` if the path
+        does not contain a number.
+
+    """
+    return [
+        SequenceMatch(m) if m[1] else None for m in _findall(paths)
+    ]
+
+
+def group(paths):
+    """Groups the given paths into sequences.
+
+    Paths with the same prefix, suffix and extension are grouped into the
+    same sequence. Paths are compared as they are, so make sure to normalize
+    their case beforehand if needed.
+
+    Args:
+        paths (list): A list of file paths.
+
+    Returns:
+        tuple: A list of :class:`.Sequence` instances and a list of indexes
+        of the paths that do not contain a number.
+
+    """
+    keys = {}
+    paddings = []
+    gids = []
+    frames = []
+    indexes = []
+    others = []
+
+    for idx, m in enumerate(_findall(paths)):
+        if not m[1]:
+            others.append(idx)
+            continue
+        n = len(keys)
+        gid = keys.setdefault((m[0], m[2], m[3]), n)
+        if gid == n:
+            paddings.append(len(m[1]))
+        gids.append(gid)
+        frames.append(m[1])
+        indexes.append(idx)
+
+    if not keys:
+        return [], others
+
+    gids = numpy.array(gids, dtype=numpy.int64)
+    frames = to_array(frames)
+    indexes = numpy.array(indexes, dtype=numpy.int64)
+
+    # Sorting by sequence, then by frame number
+    order = numpy.lexsort((frames, gids))
+    gids = gids[order]
+    frames = frames[order]
+    indexes = indexes[order]
+
+    bounds = numpy.flatnonzero(numpy.diff(gids)) + 1
+    frames = numpy.split(frames, bounds)
+    indexes = numpy.split(indexes, bounds)
+
+    sequences = [None] * len(keys)
+    for (prefix, suffix, ext), gid in keys.iteritems():
+        sequences[gid] = Sequence(
+            prefix, suffix, ext, frames[gid], indexes[gid], paddings[gid])
+    return sequences, others
+
+
+class SequenceMatch(object):
+    """A light-weight stand-in for the match objects returned by
+    :func:`.common.get_sequence`.
+
+    """
+    __slots__ = ('_groups',)
+
+    def __init__(self, groups):
+        self._groups = groups
+
+    def group(self, *args):
+        if not args:
+            args = (0, )
+        v = tuple(
+            u''.join((self._groups[0], self._groups[1], self._groups[2], u'.', self._groups[3]))
+            if n == 0 else self._groups[n - 1]
+            for n in args
+        )
+        return v[0] if len(v) == 1 else v
+
+    def groups(self):
+        return tuple(self._groups)
+
+    def __repr__(self):
+        return u'<SequenceMatch \'{}\'>'.format(self.group(0)).encode('utf-8')
+
+
+class Sequence(object):
+    """A group of files that differ only by their sequence number.
+
+    The frame numbers are stored in a sorted integer array. `indexes` are
+    the indexes of the frames' paths in the list passed to :func:`.group`.
+
+    Like match objects, sequences have four groups: the prefix, the first
+    frame, the suffix and the extension.
+
+    """
+    __slots__ = ('prefix', 'suffix', 'ext', 'frames', 'indexes', 'padding')
+
+    def __init__(self, prefix, suffix, ext, frames, indexes, padding):
+        self.prefix = prefix
+        self.suffix = suffix
+        self.ext = ext
+        self.frames = frames
+        self.indexes = indexes
+        self.padding = padding
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __repr__(self):
+        return u'<Sequence \'{}\' ({} frames)>'.format(
+            self.path(), len(self)).encode('utf-8')
+
+    def group(self, n):
+        if n == 0:
+            return self.startpath()
+        if n == 1:
+            return self.prefix
+        if n == 2:
+            return self.frame(self.start())
+        if n == 3:
+            return self.suffix
+        if n == 4:
+            return self.ext
+        raise IndexError(u'no such group')
+
+    def frame(self, n):
+        """Returns the padded string of frame `n`."""
+        return unicode(n).zfill(self.padding)
+
+    def start(self):
+        return self.frames[0]
+
+    def end(self):
+        return self.frames[-1]
+
+    def _path(self, frame):
+        return self.prefix + frame + self.suffix + u'.' + self.ext
+
+    def path(self):
+        """The path of the sequence with :const:`.SEQPROXY` in place of the frame number."""
+        return self._path(SEQPROXY)
+
+    def startpath(self):
+        return self._path(self.frame(self.start()))
+
+    def endpath(self):
+        return self._path(self.frame(self.end()))
+
+    def collapsed_path(self):
+        """The path of the sequence with the frame ranges, eg. ``shot_[0001-0010].exr``."""
+        return self._path(u'[' + self.ranges() + u']')
+
+    def paths(self):
+        """Yields the path of each frame."""
+        for n in self.frames.tolist():
+            yield self._path(self.frame(n))
+
+    def ranges(self):
+        return get_ranges(self.frames, self.padding)
+
+    def gaps(self):
+        """Returns the first and last frame of each missing frame range.
+
+        Returns:
+            numpy.ndarray: An array of shape `(n, 2)`.
+
+        """
+        frames = numpy.unique(self.frames)
+        idx = numpy.flatnonzero(numpy.diff(frames) > 1)
+        return numpy.column_stack((frames[idx] + 1, frames[idx + 1] - 1))
+
+    def missing(self):
+        """Returns the number of missing frames between the start and the end frame."""
+        gaps = self.gaps()
+        return int((gaps[:, 1] - gaps[:, 0] + 1).sum())
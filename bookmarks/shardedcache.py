@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""A thread-safe cache split into separately locked shards.
+
+The thumbnail workers write decoded images to the cache while the GUI
+thread reads them when painting. A single lock would make the readers wait
+for the writers, so the values are spread over several shards by their
+hash, each with its own lock.
+
+Loading the same file twice is avoided using :meth:`.ShardedCache.coalesce`:
+when several threads request the same key at once, only the first one does
+the work and the others wait for its result. Threads that must not block,
+like the GUI thread, can pass `wait=False` to get `None` instead.
+
+.. code-block:: python
+
+    cache = shardedcache.ShardedCache()
+    cache.set_value(hash, image, ImageType, size=128)
+    cache.value(hash, ImageType, size=128)
+    image = cache.coalesce((hash, 128), load_image, path)
+
+Note:
+    The module does not depend on Qt so it can be used outside of a running
+    Bookmarks session.
+
+"""
+import threading
+
+
+SHARDS = 16
+"""The default number of shards."""
+
+
+class _Pending(object):
+    """The result of a call other threads are waiting for."""
+    __slots__ = ('event', 'result')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+
+
+class _Shard(object):
+    __slots__ = ('lock', 'data', 'pending')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.data = {}
+        self.pending = {}
+
+
+class ShardedCache(object):
+    """Values keyed by a hash and a cache type, and optionally a size.
+
+    Values set with a `size` are kept in a dictionary of sizes, and
+    `value()` returns a copy of that dictionary when called without a size.
+
+    Args:
+        shards (int): The number of shards.
+
+    """
+
+    def __init__(self, shards=SHARDS):
+        self._shards = tuple(_Shard() for _ in xrange(shards))
+
+    def _shard(self, key):
+        return self._shards[hash(key) % len(self._shards)]
+
+    def __len__(self):
+        n = 0
+        for shard in self._shards:
+            with shard.lock:
+                n += len(shard.data)
+        return n
+
+    def contains(self, hash, cache_type):
+        """Checks if a value of `cache_type` is stored for `hash`."""
+        shard = self._shard(hash)
+        with shard.lock:
+            return cache_type in shard.data.get(hash, ())
+
+    def value(self, hash, cache_type, size=None):
+        """Returns a stored value, or `None` if it doesn't exist."""
+        shard = self._shard(hash)
+        with shard.lock:
+            v = shard.data.get(hash, {}).get(cache_type)
+            if v is None:
+                return None
+            if size is not None:
+                return v.get(size) if isinstance(v, dict) else None
+            return dict(v) if isinstance(v, dict) else v
+
+    def set_value(self, hash, value, cache_type, size=None):
+        """Stores a value and returns it."""
+        shard = self._shard(hash)
+        with shard.lock:
+            data = shard.data.setdefault(hash, {})
+            if size is None:
+                data[cache_type] = value
+                return value
+            sizes = data.get(cache_type)
+            if not isinstance(sizes, dict):
+                sizes = data[cache_type] = {}
+            sizes[size] = value
+            return value
+
+    def remove(self, hash):
+        """Removes all values stored for `hash`."""
+        shard = self._shard(hash)
+        with shard.lock:
+            shard.data.pop(hash, None)
+
+    def clear(self):
+        for shard in self._shards:
+            with shard.lock:
+                shard.data.clear()
+
+    def coalesce(self, key, func, *args, **kwargs):
+        """Calls `func`, unless another thread is calling it with the same
+        `key` already, in which case its result is returned instead.
+
+        Args:
+            key (object): A hashable key identifying the call.
+            func (callable): The function to call.
+            wait (bool): Wait for the other thread's result. When `False`,
+                `None` is returned straight away. Defaults to `True`.
+
+        Returns:
+            The value returned by `func`. Waiting threads get `None` if the
+            call raised an exception.
+
+        """
+        wait = kwargs.pop('wait', True)
+        shard = self._shard(key)
+        with shard.lock:
+            pending = shard.pending.get(key)
+            if pending is None:
+                pending = shard.pending[key] = _Pending()
+                owner = True
+            else:
+                owner = False
+
+        if not owner:
+            if not wait:
+                return None
+            pending.event.wait()
+            return pending.result
+
+        try:
+            pending.result = func(*args, **kwargs)
+            return pending.result
+        finally:
+            with shard.lock:
+                del shard.pending[key]
+            pending.event.set()
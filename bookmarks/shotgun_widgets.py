@@ -1382,34 +1382,38 @@ class LinkAssets(QtWidgets.QDialog):
             raise RuntimeError(s)
 
 
-        db = bookmark_db.get_db(server, job, root)
-        with db.transactions():
-            for k in self.assets:
-                k = k.lower()
-                if self.assets[k].currentData() is None:
-                    continue
-
-                shotgun_id = self.assets[k].currentData(role=QtCore.Qt.UserRole)
-                shotgun_type = self.assets[k].currentData(role=QtCore.Qt.UserRole + 1)
-                shotgun_name = self.assets[k].currentData(role=QtCore.Qt.UserRole + 2)
-                cut_duration = self.assets[k].currentData(role=QtCore.Qt.UserRole + 3)
-                cut_in = self.assets[k].currentData(role=QtCore.Qt.UserRole + 4)
-                cut_out = self.assets[k].currentData(role=QtCore.Qt.UserRole + 5)
-
-                if not all((
-                    shotgun_id is not None,
-                    shotgun_type is not None,
-                    shotgun_name is not None,
-                )):
-                    continue
+        rows = {}
+        for k in self.assets:
+            k = k.lower()
+            if self.assets[k].currentData() is None:
+                continue
+
+            shotgun_id = self.assets[k].currentData(role=QtCore.Qt.UserRole)
+            shotgun_type = self.assets[k].currentData(role=QtCore.Qt.UserRole + 1)
+            shotgun_name = self.assets[k].currentData(role=QtCore.Qt.UserRole + 2)
+            cut_duration = self.assets[k].currentData(role=QtCore.Qt.UserRole + 3)
+            cut_in = self.assets[k].currentData(role=QtCore.Qt.UserRole + 4)
+            cut_out = self.assets[k].currentData(role=QtCore.Qt.UserRole + 5)
+
+            if not all((
+                shotgun_id is not None,
+                shotgun_type is not None,
+                shotgun_name is not None,
+            )):
+                continue
+
+            _k = u'/'.join((server, job, root, k))
+            rows[_k] = {
+                u'shotgun_id': shotgun_id,
+                u'shotgun_type': shotgun_type,
+                u'shotgun_name': shotgun_name,
+                u'cut_duration': cut_duration,
+                u'cut_in': cut_in,
+                u'cut_out': cut_out,
+            }
 
-                _k = u'/'.join((server, job, root, k))
-                db.setValue(_k, u'shotgun_id', shotgun_id)
-                db.setValue(_k, u'shotgun_type', shotgun_type)
-                db.setValue(_k, u'shotgun_name', shotgun_name)
-                db.setValue(_k, u'cut_duration', cut_duration)
-                db.setValue(_k, u'cut_in', cut_in)
-                db.setValue(_k, u'cut_out', cut_out)
+        db = bookmark_db.get_db(server, job, root)
+        db.setValues(rows)
 
 
         self.done(QtWidgets.QDialog.Accepted)
@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+"""Batched and cached file size and modification time queries.
+
+To show the size and the last modified date of a sequence, every frame has
+to be stat'ed. Calling `stat` once per frame is slow over a network share,
+and a 10 000 frame sequence costs 10 000 round-trips to the file server every
+time the task folder is loaded.
+
+The functions here collect the stats of a whole directory at once with a
+single `scandir` call, visit several directories concurrently and cache the
+results keyed by the directory path and its modification time. When a
+directory changes its modification time changes too, and the cached stats
+are discarded the next time they're requested.
+
+Large sequences can also be sampled: :func:`.stat_sequence` will only stat an
+evenly spaced subset of the frames and estimate the total size. The exact
+values can then be calculated in the background using :func:`.refine`.
+
+.. code-block:: python
+
+    size, mtime, approximate = statcache.stat_sequence(paths, sample=True)
+    if approximate:
+        statcache.refine(paths, lambda size, mtime: None)
+
+Note:
+    Files modified in place don't change the modification time of their
+    directory on most file systems, so their cached stats will only be
+    updated once a file is added to or removed from the directory.
+
+    The module does not depend on Qt so it can be used outside of a running
+    Bookmarks session.
+
+"""
+import os
+import sys
+import Queue
+import threading
+import traceback
+import collections
+
+import _scandir
+
+from . import walker
+
+
+DEFAULT_THREADS = 4
+"""The default number of directories stat'ed concurrently."""
+
+MAX_DIRS = 1024
+"""The maximum number of cached directories."""
+
+SAMPLE_THRESHOLD = 2000
+"""Sequences with more frames than this are sampled by :func:`.stat_sequence`."""
+
+SAMPLE_SIZE = 100
+"""The number of frames stat'ed when sampling a sequence."""
+
+CACHE = collections.OrderedDict()
+"""The cached directory stats, keyed by the lower-case directory path."""
+
+_lock = threading.RLock()
+_refine_queue = Queue.Queue()
+_refine_thread = []
+
+
+def reset():
+    """Removes all cached stats."""
+    with _lock:
+        CACHE.clear()
+
+
+def _split(path):
+    """Returns the directory and the lower-case file name of `path`."""
+    path = path.replace(u'\\', u'/')
+    _dir, _, name = path.rpartition(u'/')
+    return _dir, name.lower()
+
+
+def cached(path):
+    """Returns the cached stats of a directory without touching the disk.
+
+    Returns:
+        dict: Tuples of `(size, mtime)` keyed by the lower-case file names,
+        or `None` if the directory has not been cached.
+
+    """
+    k = path.replace(u'\\', u'/').lower()
+    with _lock:
+        v = CACHE.get(k)
+    return v[1] if v else None
+
+
+def stat_dir(path):
+    """Returns the size and modification time of all files in `path`.
+
+    The directory itself is stat'ed first, and the files are only listed when
+    its modification time differs from the cached value.
+
+    Args:
+        path (unicode): Path to a directory.
+
+    Returns:
+        dict: Tuples of `(size, mtime)` keyed by the lower-case file names.
+        The dictionary is empty if the directory doesn't exist.
+
+    """
+    k = path.replace(u'\\', u'/').lower()
+    try:
+        dir_mtime = os.stat(path).st_mtime
+    except OSError:
+        with _lock:
+            CACHE.pop(k, None)
+        return {}
+
+    with _lock:
+        v = CACHE.pop(k, None)
+        if v and v[0] == dir_mtime:
+            CACHE[k] = v  # Moves the directory to the end of the queue
+            return v[1]
+
+    stats = {}
+    try:
+        for entry in _scandir.scandir(path):
+            try:
+                if entry.is_dir():
+                    continue
+                stat = entry.stat()
+            except OSError:
+                continue
+            stats[entry.name.lower()] = (stat.st_size, stat.st_mtime)
+    except OSError:
+        return {}
+
+    with _lock:
+        CACHE[k] = (dir_mtime, stats)
+        while len(CACHE) > MAX_DIRS:
+            CACHE.popitem(last=False)
+    return stats
+
+
+def stat_files(paths, threads=DEFAULT_THREADS, interrupt=None):
+    """Returns the size and modification time of the given files.
+
+    The files are grouped by their directories, and each directory is
+    stat'ed once using :func:`.stat_dir`.
+
+    Args:
+        paths (list): A list of file paths.
+        threads (int): The number of directories to stat concurrently.
+        interrupt (callable): Returning `True` aborts the query.
+
+    Returns:
+        dict: Tuples of `(size, mtime)` keyed by path. Missing files are omitted.
+
+    """
+    dirs = collections.defaultdict(list)
+    for path in paths:
+        _dir, name = _split(path)
+        dirs[_dir].append((path, name))
+
+    def visit(_dir):
+        if _dir is None:
+            return None, list(dirs)
+        return (_dir, stat_dir(_dir)), []
+
+    result = {}
+    it = walker.iterdirs(
+        None, visit, threads=min(threads, len(dirs)), interrupt=interrupt)
+    for v in it:
+        if v is None:
+            continue
+        _dir, stats = v
+        for path, name in dirs[_dir]:
+            if name in stats:
+                result[path] = stats[name]
+    return result
+
+
+def _sample(paths, threads, interrupt):
+    step = float(len(paths)) / SAMPLE_SIZE
+    sample = [paths[int(n * step)] for n in xrange(SAMPLE_SIZE)]
+
+    def visit(path):
+        if path is None:
+            return None, sample
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None, []
+        return (stat.st_size, stat.st_mtime), []
+
+    stats = [
+        f for f in walker.iterdirs(
+            None, visit, threads=threads, interrupt=interrupt) if f
+    ]
+    if not stats:
+        return 0, 0
+    size = sum(f[0] for f in stats) * len(paths) / len(stats)
+    mtime = max(f[1] for f in stats)
+    return size, mtime
+
+
+def stat_sequence(paths, sample=False, threads=DEFAULT_THREADS, interrupt=None):
+    """Returns the total size and the newest modification time of a sequence.
+
+    Args:
+        paths (list): The paths of the sequence's frames.
+        sample (bool): Estimate the values of large sequences from a sample
+            of their frames, unless they're cached already.
+        threads (int): The number of concurrent stat calls.
+        interrupt (callable): Returning `True` aborts the query.
+
+    Returns:
+        tuple: The size, the modification time and `True` if the values are
+        only estimated.
+
+    """
+    if (
+        sample and
+        len(paths) > SAMPLE_THRESHOLD and
+        any(cached(f) is None for f in set(_split(f)[0] for f in paths))
+    ):
+        size, mtime = _sample(paths, threads, interrupt)
+        return size, mtime, True
+
+    size = 0
+    mtime = 0
+    for _size, _mtime in stat_files(paths, threads=threads, interrupt=interrupt).itervalues():
+        size += _size
+        mtime = _mtime if _mtime > mtime else mtime
+    return size, mtime, False
+
+
+def _refine():
+    while True:
+        paths, callback, interrupt = _refine_queue.get()
+        try:
+            # Requests abandoned while waiting in the queue are skipped
+            if interrupt and interrupt():
+                continue
+            size, mtime, _ = stat_sequence(paths, interrupt=interrupt)
+            if interrupt and interrupt():
+                continue
+            callback(size, mtime)
+        except Exception:
+            traceback.print_exc(file=sys.stderr)
+
+
+def refine(paths, callback, interrupt=None):
+    """Calculates the exact size and modification time of a sequence in the
+    background.
+
+    The requests are processed one at a time by a single daemon thread.
+
+    Args:
+        paths (list): The paths of the sequence's frames.
+        callback (callable): Called with the size and the modification time.
+            The callback is called from the background thread.
+        interrupt (callable): Returning `True` abandons the request.
+
+    """
+    with _lock:
+        if not _refine_thread:
+            thread = threading.Thread(target=_refine)
+            thread.daemon = True
+            thread.start()
+            _refine_thread.append(thread)
+    _refine_queue.put((list(paths), callback, interrupt))
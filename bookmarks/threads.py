@@ -7,9 +7,9 @@ a *weakref.ref* from the thread's queue.
 
 """
 import base64
-import json
 import functools
 import weakref
+import threading
 import collections
 import uuid
 
@@ -19,6 +19,11 @@ from . import log
 from . import common
 from . import images
 from . import bookmark_db
+from . import walker
+from . import sequence
+from . import statcache
+from . import queuestats
+from . import thumbnailfarm
 
 
 THREADS = {}
@@ -34,21 +39,461 @@ AssetInfoQueue = FavouriteInfoQueue + 1
 BookmarkInfoQueue = AssetInfoQueue + 1
 TaskFolderInfoQueue = BookmarkInfoQueue + 1
 
+QUEUE_NAMES = {
+    FileThumbnailQueue: u'FileThumbnailQueue',
+    FavouriteThumbnailQueue: u'FavouriteThumbnailQueue',
+    AssetThumbnailQueue: u'AssetThumbnailQueue',
+    BookmarkThumbnailQueue: u'BookmarkThumbnailQueue',
+    FileInfoQueue: u'FileInfoQueue',
+    FavouriteInfoQueue: u'FavouriteInfoQueue',
+    AssetInfoQueue: u'AssetInfoQueue',
+    BookmarkInfoQueue: u'BookmarkInfoQueue',
+    TaskFolderInfoQueue: u'TaskFolderInfoQueue',
+}
+"""The names of the queues used by :func:`.get_stats`."""
+
+
+VisiblePriority = 0
+PrefetchPriority = 1
+ModelPriority = 2
+"""Queue priorities. Visible rows are processed first, then the rows about to
+be scrolled into view, and then the rows queued by
+`BaseWorker.add_model_to_queue`."""
+
+INFO_THREADS = 2
+THUMBNAIL_THREADS = 2
+"""The default number of workers per model and thread type."""
+
+BATCH_SIZE = 100
+"""The number of items a worker processes before handling its pending signals."""
+
+DUMP_INTERVAL = 10000
+"""The interval, in milliseconds, of saving the queue statistics."""
+
+
+def _key(item):
+    """Returns the key used to find `item` in a `WorkQueue`.
+
+    Weak references to the same row are not the same objects, so they're keyed
+    by the row they refer to. Returns `None` if the reference is dead.
+
+    """
+    if isinstance(item, weakref.ref):
+        v = item()
+        return None if v is None else id(v)
+    return id(item)
+
+
+def _is_dead(item):
+    return isinstance(item, weakref.ref) and item() is None
+
+
+class WorkQueue(object):
+    """A thread-safe queue shared by a pool of workers.
+
+    Items are kept in a separate deque per priority. `pop()` returns the
+    most recently added visible item first. The items queued with
+    `PrefetchPriority` and then `ModelPriority` are only returned when there
+    are no visible items left, in the order they were added.
+
+    Each queued row is also indexed, so membership tests are O(1) and a row is
+    never queued twice. Adding a row that is queued already moves it to the
+    end of its new priority's items, unless it's queued with a higher
+    priority already or it is queued with `ModelPriority` again. The replaced
+    entries are left in the deques and skipped when popped. Prefetched rows
+    can be removed using `cancel()`.
+
+    Idle workers block in `wait()` until an item is added, or until they're
+    woken up by `wake()`, instead of polling the queue.
+
+    Each model load starts a new generation, see `advance()`. Items queued for
+    an older generation are dropped, and workers compare the generation
+    returned by `take()` with the current `generation` to stop working on
+    items of a superseded load.
+
+    The processing times and the number of dropped and stale items are
+    recorded in the queue's :class:`.queuestats.QueueStats`, `stats`.
+
+    Args:
+        maxlen (int): The maximum number of visible and prefetched items. The
+            oldest items are discarded when the queue is full.
+
+    """
+
+    def __init__(self, maxlen=None):
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._maxlen = (maxlen, maxlen, common.MAXITEMS)
+        self._queues = [collections.deque() for _ in self._maxlen]
+        self._counts = [0 for _ in self._maxlen]
+        self._index = {}
+        self._active = set()
+        self._generation = 0
+        self.stats = queuestats.QueueStats()
+
+    @property
+    def generation(self):
+        """The current generation."""
+        return self._generation
+
+    def __len__(self):
+        return sum(self._counts)
+
+    def __contains__(self, item):
+        k = _key(item)
+        with self._lock:
+            entry = self._index.get(k)
+            return entry is not None and not _is_dead(entry[2])
+
+    def _put(self, item, priority):
+        """Adds an item to the queue. Must be called with the lock held.
+
+        Returns:
+            bool: `True` if the item was added or moved.
+
+        """
+        k = _key(item)
+        if k is None:
+            self.stats.count(u'dropped')
+            return False
+
+        demote = False
+        entry = self._index.get(k)
+        if entry is not None:
+            if (
+                (priority == ModelPriority or priority > entry[1]) and
+                not _is_dead(entry[2])
+            ):
+                return False
+            # Moves the row to the end of the items of `priority`
+            self._counts[entry[1]] -= 1
+            demote = entry[1] == ModelPriority or entry[3]
+
+        # Entries are `[key, priority, item, demote]` lists, and are only
+        # valid while the index refers to the same list
+        entry = [k, priority, item, demote]
+        self._index[k] = entry
+        self._queues[priority].append(entry)
+        self._counts[priority] += 1
+        return True
+
+    def _trim(self):
+        """Discards the oldest items of a full queue. Must be called with the
+        lock held.
+
+        """
+        for priority in (VisiblePriority, PrefetchPriority, ModelPriority):
+            q = self._queues[priority]
+            maxlen = self._maxlen[priority]
+            while maxlen is not None and self._counts[priority] > maxlen:
+                entry = q.popleft()
+                if self._index.get(entry[0]) is not entry:
+                    continue
+                del self._index[entry[0]]
+                self._counts[priority] -= 1
+                # Rows moved from the model items are put back
+                if entry[3]:
+                    self._put(entry[2], ModelPriority)
+                else:
+                    self.stats.count(u'dropped')
+
+            # Removes the replaced entries when they make up most of the deque
+            if len(q) > 64 and len(q) > self._counts[priority] * 2:
+                self._queues[priority] = collections.deque(
+                    f for f in q if self._index.get(f[0]) is f)
+
+    def put(self, item, priority=VisiblePriority, generation=None):
+        """Adds an item to the queue.
+
+        Args:
+            item (weakref.ref): The item to add.
+            priority (int): `VisiblePriority` or `ModelPriority`.
+            generation (int): The generation the item was queued for. The item
+                is dropped if it's not the current generation.
+
+        """
+        with self._cond:
+            if generation is not None and generation != self._generation:
+                self.stats.count(u'stale')
+                return
+            if self._put(item, priority):
+                self._trim()
+                self._cond.notify()
+
+    def put_many(self, items, priority=VisiblePriority, generation=None):
+        """Adds several items at once.
+
+        The items are added in order, so when queued with `VisiblePriority`
+        the last item will be popped first.
+
+        """
+        with self._cond:
+            if generation is not None and generation != self._generation:
+                items = list(items)
+                self.stats.count(u'stale', len(items))
+                return
+            n = 0
+            for item in items:
+                n += self._put(item, priority)
+            if n:
+                self._trim()
+                self._cond.notify(n)
+
+    def pop(self):
+        """Returns the next item.
+
+        Raises:
+            IndexError: If the queue is empty.
+
+        """
+        with self._lock:
+            return self._pop()
+
+    def take(self):
+        """Returns the next item and the current generation.
+
+        Raises:
+            IndexError: If the queue is empty.
+
+        """
+        with self._lock:
+            return self._pop(), self._generation
+
+    def _pop(self):
+        """Pops the next item. Must be called with the lock held."""
+        q = self._queues[VisiblePriority]
+        while q:
+            entry = q.pop()
+            if self._index.get(entry[0]) is entry:
+                del self._index[entry[0]]
+                self._counts[VisiblePriority] -= 1
+                return entry[2]
+
+        for priority in (PrefetchPriority, ModelPriority):
+            q = self._queues[priority]
+            while q:
+                entry = q.popleft()
+                if self._index.get(entry[0]) is entry:
+                    del self._index[entry[0]]
+                    self._counts[priority] -= 1
+                    return entry[2]
+
+        raise IndexError(u'pop from an empty queue')
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    def _clear(self):
+        self._queues = [collections.deque() for _ in self._maxlen]
+        self._counts = [0 for _ in self._maxlen]
+        self._index = {}
+
+    def cancel(self, items):
+        """Removes items queued with `PrefetchPriority`.
+
+        Rows moved from the model items are put back with `ModelPriority`.
+
+        Returns:
+            int: The number of removed items.
+
+        """
+        n = 0
+        with self._lock:
+            for item in items:
+                k = _key(item)
+                entry = self._index.get(k)
+                if entry is None or entry[1] != PrefetchPriority:
+                    continue
+                del self._index[k]
+                self._counts[PrefetchPriority] -= 1
+                if entry[3]:
+                    self._put(entry[2], ModelPriority)
+                n += 1
+            if n:
+                self._trim()
+        return n
+
+    def advance(self):
+        """Starts a new generation and discards the queued items.
+
+        Returns:
+            int: The new generation.
+
+        """
+        with self._lock:
+            self._generation += 1
+            if len(self):
+                self.stats.count(u'stale', len(self))
+            self._clear()
+            return self._generation
+
+    def wait(self, waiter):
+        """Blocks the calling thread until the queue has items to process.
+
+        `waiter` is the worker calling the method. Paused workers, see
+        `BaseWorker.paused`, are only woken up by `wake()`.
+
+        Returns:
+            bool: `True` if the queue has items, `False` if the worker was
+            woken up by `wake()`.
+
+        """
+        with self._cond:
+            while not waiter.woken and (waiter.paused or not len(self)):
+                self._cond.wait()
+            waiter.woken = False
+            return not waiter.paused and bool(len(self))
+
+    def wake(self, waiter):
+        """Wakes up `waiter` if it's blocked in `wait()`."""
+        with self._cond:
+            waiter.woken = True
+            self._cond.notify_all()
+
+    def claim(self, ref):
+        """Marks the item `ref` refers to as being processed.
+
+        The same row might be queued more than once, so workers of the same
+        pool use this to make sure they don't process a row at the same time.
+
+        Returns:
+            int: The key to pass to `release()`, or `None` if another worker
+            is processing the item already.
+
+        """
+        k = id(ref())
+        with self._lock:
+            if k in self._active:
+                return None
+            self._active.add(k)
+            return k
+
+    def release(self, k):
+        """Marks an item claimed by `claim()` as processed."""
+        with self._lock:
+            self._active.discard(k)
+
 
 QUEUES = {
-    FileThumbnailQueue: collections.deque([], 99),
-    FavouriteThumbnailQueue: collections.deque([], 99),
-    AssetThumbnailQueue: collections.deque([], 99),
-    BookmarkThumbnailQueue: collections.deque([], 99),
-    FileInfoQueue: collections.deque([], common.MAXITEMS),
-    FavouriteInfoQueue: collections.deque([], common.MAXITEMS),
-    AssetInfoQueue: collections.deque([], common.MAXITEMS),
-    BookmarkInfoQueue: collections.deque([], common.MAXITEMS),
-    TaskFolderInfoQueue: collections.deque([], common.MAXITEMS),
+    FileThumbnailQueue: WorkQueue(99),
+    FavouriteThumbnailQueue: WorkQueue(99),
+    AssetThumbnailQueue: WorkQueue(99),
+    BookmarkThumbnailQueue: WorkQueue(99),
+    FileInfoQueue: WorkQueue(common.MAXITEMS),
+    FavouriteInfoQueue: WorkQueue(common.MAXITEMS),
+    AssetInfoQueue: WorkQueue(common.MAXITEMS),
+    BookmarkInfoQueue: WorkQueue(common.MAXITEMS),
+    TaskFolderInfoQueue: WorkQueue(common.MAXITEMS),
 }
 """Global thread queues."""
 
 
+class RowBatch(object):
+    """The rows processed by the workers of a queue, waiting to be signalled
+    to the model.
+
+    Workers add the ids of the processed rows instead of signalling each row
+    separately. The model takes the whole batch at most once per frame and
+    emits `dataChanged` for contiguous ranges of rows, see
+    `lists.BaseModel.flush_rows()`.
+
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rows = set()
+        self._roles = set()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def add(self, idx, roles=()):
+        """Adds a row to the batch.
+
+        Returns:
+            bool: `True` if the batch was empty.
+
+        """
+        with self._lock:
+            empty = not self._rows
+            self._rows.add(idx)
+            self._roles.update(roles)
+            return empty
+
+    def take(self):
+        """Empties the batch.
+
+        Returns:
+            tuple: The sorted row ids and the roles changed.
+
+        """
+        with self._lock:
+            rows = sorted(self._rows)
+            roles = sorted(self._roles)
+            self._rows = set()
+            self._roles = set()
+        return rows, roles
+
+
+BATCHES = dict((k, RowBatch()) for k in QUEUES)
+"""The processed rows of each queue."""
+
+
+def get_stats():
+    """Returns the statistics of the worker queues.
+
+    Returns:
+        dict: The :func:`.queuestats.QueueStats.snapshot` of each queue,
+        keyed by the queue's name. `depth` is the number of queued items.
+
+    """
+    v = {}
+    for k, q in QUEUES.iteritems():
+        stats = q.stats.snapshot()
+        stats[u'depth'] = len(q)
+        v[QUEUE_NAMES[k]] = stats
+    return v
+
+
+def stats_path():
+    """The path of the JSON file saved by :func:`.dump_stats`."""
+    server, job, root = common.get_favourite_parent_paths()
+    return u'{}/{}/{}/.bookmark/queue_stats.json'.format(server, job, root)
+
+
+def dump_stats(path=None):
+    """Saves the statistics of the worker queues as a JSON file.
+
+    Args:
+        path (unicode): Path to the JSON file. Defaults to :func:`.stats_path`.
+
+    """
+    if path is None:
+        common.create_temp_dir()
+        path = stats_path()
+    queuestats.dump(get_stats(), path)
+
+
+def get_ranges(rows):
+    """Returns the first and last row of each contiguous range in `rows`.
+
+    Args:
+        rows (list): A sorted list of row ids.
+
+    Returns:
+        list: A list of `(first, last)` tuples.
+
+    """
+    ranges = []
+    for n in rows:
+        if ranges and ranges[-1][1] == n - 1:
+            ranges[-1][1] = n
+        else:
+            ranges.append([n, n])
+    return [tuple(f) for f in ranges]
+
+
 class ModelLoadedDummy(object):
     """Dummy class used to help signal a model has been fully processed."""
 
@@ -73,46 +518,59 @@ def process(func):
     """Decorator for worker `process_data` slots.
 
     Takes and passes the next available data in the queue for processing
-    and emits the `updateRow` signal if the data has been correctly loaded.
+    and adds the row to the queue's :class:`.RowBatch` if the data has been
+    correctly loaded.
+
+    The worker's `generation` is set to the queue's generation when the item
+    is taken. Results of a superseded generation are discarded.
 
     """
     @functools.wraps(func)
     def func_wrapper(self):
         verify_thread_affinity()
         try:
-            if self.interrupt:
-                return
-
-            ref = QUEUES[self.queue_type].pop()
+            q = QUEUES[self.queue_type]
+            ref, self.generation = q.take()
 
             # Let the source model know that we loaded a data segment fully
             if isinstance(ref, ModelLoadedDummy):
-                if self.interrupt:
-                    return
-                self.modelLoaded.emit(ref.data_type)
+                if self.is_current():
+                    self.modelLoaded.emit(ref.data_type)
                 return
 
-            if not ref() or self.interrupt:
+            if not ref():
+                return
+
+            # Another worker of the pool might be processing the same row
+            k = q.claim(ref)
+            if k is None:
                 return
 
             # Call process_data
-            result = func(self, ref)
+            self.timer = queuestats.ItemTimer()
+            try:
+                result = func(self, ref)
+            finally:
+                q.release(k)
             if not isinstance(result, bool):
                 raise TypeError(
                     u'Invalid return value from process_data(). Expected <type \'bool\'>, got {}'.format(type(result)))
 
+            if not self.is_current():
+                q.stats.count(u'stale')
+                return
+            q.stats.record(self.timer)
+
             # Let the models/views know the data has been processed ok and
             # and request a row repaint
-            if not ref() or self.interrupt or not result:
+            if not ref() or not result:
                 return
-            self.updateRow.emit(ref()[common.IdRole])
+            self.publish(ref)
 
         except IndexError:
             pass  # ignore index errors
         except (ValueError, RuntimeError, TypeError):
             log.error(u'Error processing data - {}'.format(self))
-        finally:
-            self.interrupt = False
 
     return func_wrapper
 
@@ -121,6 +579,9 @@ class ThreadMonitor(QtWidgets.QWidget):
     """A progress label used to display the number of items currently in the
     processing queues across all threads.
 
+    The statistics of each queue are shown as the widget's tooltip, and are
+    saved periodically when enabled in the preferences, see :func:`.dump_stats`.
+
     """
 
     def __init__(self, parent=None):
@@ -131,6 +592,12 @@ class ThreadMonitor(QtWidgets.QWidget):
         self.timer.timeout.connect(self.update)
         self.metrics = common.font_db.primary_font(common.SMALL_FONT_SIZE())[1]
 
+        self.dump_timer = QtCore.QTimer(parent=self)
+        self.dump_timer.setInterval(DUMP_INTERVAL)
+        self.dump_timer.setSingleShot(False)
+        self.dump_timer.timeout.connect(self.dump_stats)
+        self.dump_timer.start()
+
     def showEvent(self, event):
         self.timer.start()
 
@@ -152,16 +619,64 @@ class ThreadMonitor(QtWidgets.QWidget):
 
     def update(self):
         self.setFixedWidth(self.metrics.width(self.text()) + common.MARGIN())
+        self.setToolTip(self.stats_text())
         super(ThreadMonitor, self).update()
 
+    @QtCore.Slot()
+    def dump_stats(self):
+        if not common.dump_stats():
+            return
+        try:
+            dump_stats()
+        except (IOError, OSError):
+            log.error(u'Could not save the queue statistics')
+
     @staticmethod
     def text():
         c = 0
+        rate = 0.0
         for q in QUEUES.itervalues():
             c += len(q)
+            rate += q.stats.rate()
         if not c:
             return u''
-        return u'Loading... ({} left)'.format(c)
+        return u'Loading... ({} left, {:.0f}/s)'.format(c, rate)
+
+    @staticmethod
+    def stats_text():
+        """Returns the statistics of the active queues as a html table."""
+        def ms(v):
+            return u'-' if v is None else u'{:.1f}'.format(v * 1000.0)
+
+        stats = get_stats()
+        rows = []
+        for k in sorted(stats):
+            v = stats[k]
+            if not v[u'depth'] and not v[u'processed']:
+                continue
+            rows.append(
+                u'<tr><td>{}</td><td>{}</td><td>{:.1f}</td><td>{}/{}</td>'
+                u'<td>{}/{}</td><td>{}/{}</td><td>{}/{}</td><td>{}</td><td>{}</td></tr>'.format(
+                    k.replace(u'Queue', u''),
+                    v[u'depth'],
+                    v[u'rate'],
+                    ms(v[u'total'][u'p50']), ms(v[u'total'][u'p95']),
+                    ms(v[u'db'][u'p50']), ms(v[u'db'][u'p95']),
+                    ms(v[u'stat'][u'p50']), ms(v[u'stat'][u'p95']),
+                    ms(v[u'image'][u'p50']), ms(v[u'image'][u'p95']),
+                    v[u'stale'],
+                    v[u'dropped'],
+                )
+            )
+        if not rows:
+            return u''
+        header = (
+            u'<tr><th>Queue</th><th>Depth</th><th>Items/s</th>'
+            u'<th>Total ms<br>p50/p95</th><th>DB ms<br>p50/p95</th>'
+            u'<th>Stat ms<br>p50/p95</th><th>Image ms<br>p50/p95</th>'
+            u'<th>Stale</th><th>Dropped</th></tr>'
+        )
+        return u'<table>' + header + u''.join(rows) + u'</table>'
 
 
 class BaseThread(QtCore.QThread):
@@ -170,11 +685,15 @@ class BaseThread(QtCore.QThread):
     The threads are associated with workers and are used to consume items
     from their associated queues.
 
+    The thread doesn't run an event loop. Instead, it sleeps in
+    `WorkQueue.wait()` until an item is added to the queue, and delivers the
+    signals queued for the worker before processing the items, see `run()`.
+
     Signals:
         * resetQueue: Empty the worker's queue.
-        * startCheckQueue: Start the worker's queue timer.
-        * stopCheckQueue: Stop the worker's queue timer.
-        * updateRow: Called when the worker finished processing an item and a row repaint is needed.
+        * startCheckQueue: Resume processing the worker's queue.
+        * stopCheckQueue: Pause processing the worker's queue.
+        * updateRow: Called when the worker added a row to an empty :class:`.RowBatch` and the batch needs flushing.
         * queueModel: Request the worker to load the entire model data to the queue.
         * modelLoaded: Called by the worker when all items previously added by queueModel have finished processing.
 
@@ -198,19 +717,20 @@ class BaseThread(QtCore.QThread):
         self.setTerminationEnabled(True)
 
         self.worker = worker
+        self._quit = False
         self._connect_signals()
 
     def _connect_signals(self):
         QtCore.QCoreApplication.instance().aboutToQuit.connect(self.quit)
         QtGui.QGuiApplication.instance().lastWindowClosed.connect(self.quit)
 
-        self.started.connect(
-            lambda: log.debug(u'started --> move_worker_to_thread', self))
-        self.started.connect(self.move_worker_to_thread)
+    def start(self, *args, **kwargs):
+        self.move_worker_to_thread()
+        super(BaseThread, self).start(*args, **kwargs)
 
     @QtCore.Slot()
     def move_worker_to_thread(self):
-        """Slot called when the thread is started.
+        """Called before the thread is started.
 
         We'll move the worker to the thread and connnect all signals needed to
         communicate with the worker.
@@ -242,19 +762,82 @@ class BaseThread(QtCore.QThread):
         self.worker.updateRow.connect(self.updateRow, cnx)
         self.worker.modelLoaded.connect(self.modelLoaded, cnx)
 
-    def add_to_queue(self, ref):
-        """Add an item to the worker's queue.
+        # The signals are only delivered once the thread is awake. The
+        # connections are made last, so the worker's signals are posted by the
+        # time `wake()` is called
+        for signal in (
+            self.resetQueue,
+            self.queueModel,
+            self.startCheckQueue,
+            self.stopCheckQueue
+        ):
+            signal.connect(self.wake, QtCore.Qt.DirectConnection)
 
-        Args:
-            ref (weakref.ref): A weak reference to a data segment.
-            end (bool): Add to the end of the queue instead if `True`.
+    @QtCore.Slot()
+    def wake(self):
+        """Wakes the thread up to deliver the signals queued for the worker."""
+        QUEUES[self.worker.queue_type].wake(self.worker)
+
+    @QtCore.Slot()
+    def quit(self):
+        self._quit = True
+        self.wake()
+        super(BaseThread, self).quit()
+
+    def run(self):
+        """Processes the worker's queue until the thread is asked to quit.
+
+        The thread sleeps while the queue is empty, and wakes up as soon as an
+        item is added by `add_to_queue()` or `BaseWorker.add_model_to_queue()`.
 
         """
-        if not isinstance(ref, weakref.ref):
-            raise TypeError(u'Invalid type. Expected <type \'weakref.ref\'>')
         q = QUEUES[self.worker.queue_type]
-        if ref not in q and ref():
-            q.append(ref)
+        while not self._quit:
+            QtCore.QCoreApplication.processEvents()
+            if self._quit:
+                break
+            if q.wait(self.worker):
+                self.worker.check_queue()
+
+    def add_to_queue(self, *refs):
+        """Add items to the worker's queue.
+
+        The queue is shared by all workers of the same queue type, and the
+        items are added with `VisiblePriority`. Items queued already are moved
+        to the top of the queue.
+
+        Args:
+            *refs (weakref.ref): Weak references to data segments.
+
+        """
+        for ref in refs:
+            if not isinstance(ref, weakref.ref):
+                raise TypeError(u'Invalid type. Expected <type \'weakref.ref\'>')
+        QUEUES[self.worker.queue_type].put_many(refs, priority=VisiblePriority)
+
+    def prefetch(self, *refs):
+        """Add items about to be scrolled into view to the worker's queue.
+
+        The items are added with `PrefetchPriority`, and are processed in
+        the given order once there are no visible items left.
+
+        Args:
+            *refs (weakref.ref): Weak references to data segments.
+
+        """
+        for ref in refs:
+            if not isinstance(ref, weakref.ref):
+                raise TypeError(u'Invalid type. Expected <type \'weakref.ref\'>')
+        QUEUES[self.worker.queue_type].put_many(refs, priority=PrefetchPriority)
+
+    def cancel_prefetch(self, *refs):
+        """Removes prefetched items that are no longer needed from the queue.
+
+        Args:
+            *refs (weakref.ref): Weak references to data segments.
+
+        """
+        QUEUES[self.worker.queue_type].cancel(refs)
 
 
 class BaseWorker(QtCore.QObject):
@@ -264,6 +847,9 @@ class BaseWorker(QtCore.QObject):
     are connected to the respective thread signals. This is so that we can
     rely on Qt's event queue for communicating between threads.
 
+    `roles` are the roles set by the worker, and are passed on to the views
+    with the `dataChanged` signals.
+
     """
     resetQueue = QtCore.Signal()
     startCheckQueue = QtCore.Signal()
@@ -272,6 +858,8 @@ class BaseWorker(QtCore.QObject):
     queueModel = QtCore.Signal(str)
     modelLoaded = QtCore.Signal(int)
 
+    roles = ()
+
     def __init__(self, queue_type, parent=None):
         if not isinstance(queue_type, int):
             raise TypeError(
@@ -282,21 +870,59 @@ class BaseWorker(QtCore.QObject):
         super(BaseWorker, self).__init__(parent=parent)
         self.setObjectName(u'Worker{}'.format(uuid.uuid1()))
 
-        self.interrupt = False
         self.queue_type = queue_type
-        self.check_queue_timer = QtCore.QTimer(parent=self)
-        self.check_queue_timer.setInterval(333)
+        self.generation = QUEUES[queue_type].generation
+        self.timer = queuestats.ItemTimer()
+
+        # Read and set by `WorkQueue.wait()` and `WorkQueue.wake()`
+        self.paused = True
+        self.woken = False
 
         self.resetQueue.connect(self.reset_queue, QtCore.Qt.DirectConnection)
         self.queueModel.connect(self.add_model_to_queue,
                                 QtCore.Qt.DirectConnection)
 
         self.startCheckQueue.connect(
-            self.check_queue_timer.start, QtCore.Qt.DirectConnection)
+            self.start_check_queue, QtCore.Qt.DirectConnection)
         self.stopCheckQueue.connect(
-            self.check_queue_timer.stop, QtCore.Qt.DirectConnection)
-        self.check_queue_timer.timeout.connect(
-            self.check_queue, QtCore.Qt.DirectConnection)
+            self.stop_check_queue, QtCore.Qt.DirectConnection)
+
+    def is_current(self):
+        """Returns `False` if the item being processed belongs to a superseded
+        model load.
+
+        Workers call this at safe points, usually before touching the disk, to
+        stop processing stale items.
+
+        """
+        return self.generation == QUEUES[self.queue_type].generation
+
+    def measure(self, phase):
+        """Returns a context manager timing a phase of the current item.
+
+        Args:
+            phase (unicode): One of :const:`.queuestats.PHASES`.
+
+        """
+        return self.timer.phase(phase)
+
+    def publish(self, ref):
+        """Adds the row `ref` refers to to the queue's batch of processed rows.
+
+        `updateRow` is only emitted for the first row of a batch.
+
+        """
+        idx = ref()[common.IdRole]
+        if BATCHES[self.queue_type].add(idx, self.roles):
+            self.updateRow.emit(idx)
+
+    @QtCore.Slot()
+    def start_check_queue(self):
+        self.paused = False
+
+    @QtCore.Slot()
+    def stop_check_queue(self):
+        self.paused = True
 
     @QtCore.Slot()
     def check_queue(self):
@@ -304,7 +930,7 @@ class BaseWorker(QtCore.QObject):
         consumed.
 
         If the queue is not empty we will call :func:`.BaseWorker.process_data`
-        untiol the queue is empty.
+        until the queue is empty, or `BATCH_SIZE` items have been processed.
 
         """
         verify_thread_affinity()
@@ -315,9 +941,9 @@ class BaseWorker(QtCore.QObject):
         n = 0
 
         while len(q):
-            if n >= common.MAXITEMS:
+            if n >= BATCH_SIZE:
                 break
-            if self.interrupt:
+            if self.paused:
                 break
             self.process_data()
             n += 1
@@ -355,6 +981,7 @@ class BaseWorker(QtCore.QObject):
         model = view.model().sourceModel()
 
         q = QUEUES[self.queue_type]
+        generation = q.generation
 
         k = model.task_folder()
         if k not in model.INTERNAL_MODEL_DATA:
@@ -370,17 +997,34 @@ class BaseWorker(QtCore.QObject):
             if data_type not in model.INTERNAL_MODEL_DATA[k]:
                 continue
 
-            for data in model.INTERNAL_MODEL_DATA[k][data_type].itervalues():
-                if self.interrupt:
+            # When lazy fetching is enabled only the fetched rows are queued
+            rows = model.INTERNAL_MODEL_DATA[k][data_type]
+            if data_type == model.data_type():
+                count = model.rowCount()
+            else:
+                count = len(rows)
+
+            refs = []
+            for n in xrange(count):
+                if q.generation != generation:
                     return
+                data = rows.get(n)
+                if data is None:
+                    continue
                 if data[common.FileInfoLoaded]:
                     continue
-                _ref = weakref.ref(data)
-                q.appendleft(_ref)
+                refs.append(weakref.ref(data))
+
+            # The rows are dropped if the model was reset in the meantime
+            q.put_many(refs, priority=ModelPriority, generation=generation)
 
             # The very last item we add is a dummy object that will be used to
             # signal the model that all data has been loaded
-            q.appendleft(ModelLoadedDummy(data_type))
+            q.put(
+                ModelLoadedDummy(data_type),
+                priority=ModelPriority,
+                generation=generation
+            )
             return True
 
     @QtCore.Slot()
@@ -388,22 +1032,48 @@ class BaseWorker(QtCore.QObject):
         """Slot called by the `resetQueue` signal and is responsible for
         clearing the worker's queue.
 
+        The queue's generation is advanced, so items being processed are
+        abandoned too. Models advance the generation of their queues
+        directly when they're reset, see `lists.BaseModel.reset_worker_queues()`.
+
         """
         verify_thread_affinity()
         log.debug(u'reset_queue()', self)
-        self.interrupt = True
-        QUEUES[self.queue_type].clear()
-        self.interrupt = False
+        QUEUES[self.queue_type].advance()
 
     @process
     @QtCore.Slot()
     def process_data(self, ref):
         """This is an abstract method and must be overwritten in the subclass."""
-        if not ref() or self.interrupt:
+        if not ref() or not self.is_current():
             return False
         return True
 
 
+def file_details(mtime, size, frames=None, approximate=False):
+    """Returns the string shown by the delegate as the item's file details.
+
+    Args:
+        mtime (float): The last modification time.
+        size (int): The size in bytes.
+        frames (int): The number of frames of a sequence item.
+        approximate (bool): Marks the size as an estimate.
+
+    """
+    mtime = common.qlast_modified(mtime)
+    s = \
+        mtime.toString(u'dd') + u'/' + \
+        mtime.toString(u'MM') + u'/' + \
+        mtime.toString(u'yyyy') + u' ' + \
+        mtime.toString(u'hh') + u':' + \
+        mtime.toString(u'mm') + u';' + \
+        (u'~' if approximate else u'') + \
+        common.byte_to_string(size)
+    if frames is not None:
+        s = unicode(frames) + u'f;' + s
+    return s
+
+
 class InfoWorker(BaseWorker):
     """A worker used to retrieve file information.
 
@@ -411,111 +1081,116 @@ class InfoWorker(BaseWorker):
     for the description, and file flags.
 
     """
+    roles = (
+        QtCore.Qt.DisplayRole,
+        QtCore.Qt.EditRole,
+        QtCore.Qt.StatusTipRole,
+        QtCore.Qt.ToolTipRole,
+        common.DescriptionRole,
+        common.TodoCountRole,
+        common.FlagsRole,
+        common.FileDetailsRole,
+        common.StartpathRole,
+        common.EndpathRole,
+        common.SortBySizeRole,
+        common.SortByLastModifiedRole,
+        common.FileInfoLoaded,
+    )
+
+    def refined(self, ref, frames, generation, size, mtime):
+        """Sets the exact size and modification time of a sampled sequence.
+
+        Called by :func:`.statcache.refine` from its background thread.
+
+        """
+        data = ref()
+        if not data or generation != QUEUES[self.queue_type].generation:
+            return
+        data[common.SortBySizeRole] = size
+        data[common.SortByLastModifiedRole] = mtime
+        data[common.FileDetailsRole] = file_details(
+            mtime, size, frames=frames)
+        self.publish(ref)
+
     @process
     @QtCore.Slot(weakref.ref)
     def process_data(self, ref):
         """Populates the item with the missing file information.
 
+        The row is only checked against the current generation before
+        touching the bookmark database or the file system.
+
         Args:
-            ref (weakref): An internal model data DataDict instance's weakref.
+            ref (weakref): An internal model data RowData instance's weakref.
 
         Returns:
             bool: `True` if all went well, `False` otherwise.
 
         """
-        def is_valid(): return False if not ref() or self.interrupt or ref()[
-            common.FileInfoLoaded] else True
-
-        if not is_valid():
+        # Keeps the row alive while it's being processed
+        data = ref()
+        if not data or data[common.FileInfoLoaded] or not self.is_current():
             return False
 
         try:
-            pp = ref()[common.ParentPathRole]
-            db = bookmark_db.get_db(pp[0], pp[1], pp[2])
-
-            if not is_valid():
+            pp = data[common.ParentPathRole]
+            with self.measure(u'db'):
+                db = bookmark_db.get_db(pp[0], pp[1], pp[2])
+            if not self.is_current():
                 return False
 
-            collapsed = common.is_collapsed(ref()[QtCore.Qt.StatusTipRole])
-            seq = ref()[common.SequenceRole]
-
-            if not is_valid():
-                return False
-            proxy_k = common.proxy_path(ref())
+            collapsed = common.is_collapsed(data[QtCore.Qt.StatusTipRole])
+            proxy_k = common.proxy_path(data)
             if collapsed:
                 k = proxy_k
             else:
-                if not is_valid():
-                    return False
-                k = ref()[QtCore.Qt.StatusTipRole]
+                k = data[QtCore.Qt.StatusTipRole]
 
-            # Issues SQLite "BEGIN"
-            with db.transactions():
+            # The values are read from the rows prefetched by the database
+            with self.measure(u'db'):
                 # Description
-                v = db.value(k, u'description')
+                v = db.cached_value(k, u'description')
                 if v:
-                    if not is_valid():
-                        return False
                     v = base64.b64decode(v)
-                    ref()[common.DescriptionRole] = v
+                    data[common.DescriptionRole] = v
 
-                v = db.value(k, u'notes')
-                count = 0
-                if v:
-                    try:
-                        v = base64.b64decode(v)
-                        v = json.loads(v)
-                        count = [k for k in v if v[k][u'text']
-                                 and not v[k][u'checked']]
-                        count = len(count)
-                    except:
-                        log.error(u'Could not read notes')
-
-                if not is_valid():
-                    return False
-                ref()[common.TodoCountRole] = count
+                # The number of todos is counted when the notes are saved
+                v = db.cached_value(k, u'todo_count')
+                data[common.TodoCountRole] = v if v else 0
 
                 # Item flags
-                if not is_valid():
-                    return False
-                flags = ref()[
+                flags = data[
                     common.FlagsRole] | QtCore.Qt.ItemIsEditable | QtCore.Qt.ItemIsDragEnabled
 
-                v = db.value(k, u'flags')
+                v = db.cached_value(k, u'flags')
                 if v:
                     flags = flags | v
-                v = db.value(proxy_k, u'flags')
+                v = db.cached_value(proxy_k, u'flags')
                 if v:
                     flags = flags | v
+                data[common.FlagsRole] = flags
 
-                if not is_valid():
-                    return False
-                ref()[common.FlagsRole] = flags
+            if not self.is_current():
+                return False
 
             # For sequences we will work out the name of the sequence based on
             # the frames.
-            if not is_valid():
-                return False
-            if ref()[common.TypeRole] == common.SequenceItem:
-                if not is_valid():
-                    return False
-                frs = ref()[common.FramesRole]
-                intframes = [int(f) for f in frs]
+            if data[common.TypeRole] == common.SequenceItem:
+                frs = data[common.FramesRole]
+                intframes = sequence.to_array(frs)
                 padding = len(frs[0])
-                rangestring = common.get_ranges(intframes, padding)
+                rangestring = sequence.get_ranges(intframes, padding)
 
-                if not is_valid():
-                    return False
-                seq = ref()[common.SequenceRole]
+                seq = data[common.SequenceRole]
                 startpath = \
                     seq.group(1) + \
-                    unicode(min(intframes)).zfill(padding) + \
+                    unicode(intframes.min()).zfill(padding) + \
                     seq.group(3) + \
                     u'.' + \
                     seq.group(4)
                 endpath = \
                     seq.group(1) + \
-                    unicode(max(intframes)).zfill(padding) + \
+                    unicode(intframes.max()).zfill(padding) + \
                     seq.group(3) + \
                     u'.' + \
                     seq.group(4)
@@ -528,92 +1203,57 @@ class InfoWorker(BaseWorker):
                 seqname = seqpath.split(u'/')[-1]
 
                 # Setting the path names
-                if not is_valid():
-                    return False
-                ref()[common.StartpathRole] = startpath
-                if not is_valid():
-                    return False
-                ref()[common.EndpathRole] = endpath
-                if not is_valid():
-                    return False
-                ref()[QtCore.Qt.StatusTipRole] = seqpath
-                if not is_valid():
-                    return False
-                ref()[QtCore.Qt.ToolTipRole] = seqpath
-                if not ref():
-                    return False
-                ref()[QtCore.Qt.DisplayRole] = seqname
-                if not is_valid():
-                    return False
-                ref()[QtCore.Qt.EditRole] = seqname
-                if not is_valid():
-                    return False
+                data[common.StartpathRole] = startpath
+                data[common.EndpathRole] = endpath
+                data[QtCore.Qt.StatusTipRole] = seqpath
+                data[QtCore.Qt.ToolTipRole] = seqpath
+                data[QtCore.Qt.DisplayRole] = seqname
+                data[QtCore.Qt.EditRole] = seqname
+
                 # We saved the DirEntry instances previously in `__initdata__` but
                 # only for the thread to extract the information from it.
-                if not is_valid():
-                    return False
-                er = ref()[common.EntryRole]
+                er = data[common.EntryRole]
                 if er:
-                    mtime = 0
-                    for entry in er:
-                        stat = entry.stat()
-                        mtime = stat.st_mtime if stat.st_mtime > mtime else mtime
-                        if not is_valid():
-                            return False
-                        ref()[common.SortBySizeRole] += stat.st_size
-                    if not is_valid():
-                        return False
-                    ref()[common.SortByLastModifiedRole] = mtime
-                    mtime = common.qlast_modified(mtime)
-
-                    if not is_valid():
-                        return False
-                    info_string = \
-                        unicode(len(intframes)) + u'f;' + \
-                        mtime.toString(u'dd') + u'/' + \
-                        mtime.toString(u'MM') + u'/' + \
-                        mtime.toString(u'yyyy') + u' ' + \
-                        mtime.toString(u'hh') + u':' + \
-                        mtime.toString(u'mm') + u';' + \
-                        common.byte_to_string(ref()[common.SortBySizeRole])
-                    if not is_valid():
+                    with self.measure(u'stat'):
+                        size, mtime, approximate = statcache.stat_sequence(
+                            [f.path for f in er],
+                            sample=common.sample_sequences(),
+                            interrupt=lambda: not self.is_current()
+                        )
+                    if not self.is_current():
                         return False
-                    ref()[common.FileDetailsRole] = info_string
-
-            if not is_valid():
-                return False
-            if ref()[common.TypeRole] == common.FileItem:
-                if not is_valid():
-                    return False
-                er = ref()[common.EntryRole]
+                    data[common.SortBySizeRole] = size
+                    data[common.SortByLastModifiedRole] = mtime
+                    data[common.FileDetailsRole] = file_details(
+                        mtime, size, frames=len(intframes), approximate=approximate)
+
+                    if approximate:
+                        generation = self.generation
+                        statcache.refine(
+                            [f.path for f in er],
+                            functools.partial(
+                                self.refined, ref, len(intframes), generation),
+                            interrupt=lambda: generation != QUEUES[self.queue_type].generation
+                        )
+
+            if data[common.TypeRole] == common.FileItem:
+                er = data[common.EntryRole]
                 if er:
-                    stat = er[0].stat()
-                    mtime = stat.st_mtime
-                    ref()[common.SortByLastModifiedRole] = mtime
-                    mtime = common.qlast_modified(mtime)
-                    ref()[common.SortBySizeRole] = stat.st_size
-                    info_string = \
-                        mtime.toString(u'dd') + u'/' + \
-                        mtime.toString(u'MM') + u'/' + \
-                        mtime.toString(u'yyyy') + u' ' + \
-                        mtime.toString(u'hh') + u':' + \
-                        mtime.toString(u'mm') + u';' + \
-                        common.byte_to_string(ref()[common.SortBySizeRole])
-                    if not is_valid():
-                        return False
-                    ref()[common.FileDetailsRole] = info_string
-                if not is_valid():
-                    return False
+                    with self.measure(u'stat'):
+                        stat = er[0].stat()
+                    data[common.SortByLastModifiedRole] = stat.st_mtime
+                    data[common.SortBySizeRole] = stat.st_size
+                    data[common.FileDetailsRole] = file_details(
+                        stat.st_mtime, stat.st_size)
 
             # Finally, set flag to mark this loaded
-            if not is_valid():
-                return False
-            return True
+            return self.is_current()
         except:
             log.error(u'Error processing file info.')
         finally:
-            if ref():
-                ref()[common.FileInfoLoaded] = True
+            # Rows of a superseded load are left to be processed again
+            if self.is_current():
+                data[common.FileInfoLoaded] = True
 
 
 class ThumbnailWorker(BaseWorker):
@@ -623,6 +1263,8 @@ class ThumbnailWorker(BaseWorker):
     listdelegates to paint thumbnails.
 
     """
+    roles = (common.ThumbnailLoaded,)
+
     @process
     @QtCore.Slot()
     def process_data(self, ref):
@@ -640,20 +1282,19 @@ class ThumbnailWorker(BaseWorker):
             ref or None: `ref` if loaded successfully, else `None`.
 
         """
-        def is_valid(): return False if not ref() or self.interrupt or ref()[
-            common.ThumbnailLoaded] or ref()[common.FlagsRole] & common.MarkedAsArchived else True
-
-        if not is_valid():
+        # Keeps the row alive while it's being processed
+        data = ref()
+        if (
+            not data or
+            data[common.ThumbnailLoaded] or
+            data[common.FlagsRole] & common.MarkedAsArchived or
+            not self.is_current()
+        ):
             return False
-        size = ref()[QtCore.Qt.SizeHintRole].height()
 
-        if not is_valid():
-            return False
-        _p = ref()[common.ParentPathRole]
-
-        if not is_valid():
-            return False
-        source = ref()[QtCore.Qt.StatusTipRole]
+        size = data[QtCore.Qt.SizeHintRole].height()
+        _p = data[common.ParentPathRole]
+        source = data[QtCore.Qt.StatusTipRole]
 
         # Resolve the thumbnail's path...
         destination = images.get_thumbnail_path(
@@ -663,89 +1304,191 @@ class ThumbnailWorker(BaseWorker):
             source,
         )
         # ...and use it to load the resource
-        image = images.ImageCache.get_image(
-            destination,
-            int(size),
-            force=True  # force=True will refresh the cache
-        )
+        with self.measure(u'image'):
+            image = images.ImageCache.get_image(
+                destination,
+                int(size),
+                force=True  # force=True will refresh the cache
+            )
 
         try:
-            # If the image successfully loads we can wrap things up here
-            if image and not image.isNull():
-                images.ImageCache.get_image(destination, int(size), force=True)
-                images.ImageCache.make_color(destination)
+            # If the image successfully loads we can wrap things up here, unless
+            # the source has been changed since the thumbnail was made
+            key = source
+            if image and not image.isNull() and not self.is_stale(data, key):
+                with self.measure(u'image'):
+                    images.ImageCache.get_image(destination, int(size), force=True)
+                    images.ImageCache.make_color(destination)
                 return True
 
             # Otherwise, we will try to generate a thumbnail using OpenImageIO
 
             # If the items is a sequence, we'll use the first image of the
             # sequence to make the thumbnail.
-            if not is_valid():
+            if not self.is_current():
                 return False
-            if ref()[common.TypeRole] == common.SequenceItem:
-                if not is_valid():
+            if data[common.TypeRole] == common.SequenceItem:
+                source = data[common.EntryRole][0].path.replace(u'\\', u'/')
+
+            # The worker processes check the source themselves, and we won't
+            # touch it here in case its decoder crashes
+            farm = common.thumbnail_farm()
+            if not farm:
+                with self.measure(u'image'):
+                    buf = images.oiio_get_buf(source)
+                if not buf:
                     return False
-                source = ref()[common.EntryRole][0].path.replace(u'\\', u'/')
-
-            buf = images.oiio_get_buf(source)
-            if not buf:
-                return False
 
-            if QtCore.QFileInfo(source).size() >= pow(1024, 3) * 2:
+            with self.measure(u'stat'):
+                file_size = QtCore.QFileInfo(source).size()
+            if file_size >= pow(1024, 3) * 2:
                 return False
-            res = images.ImageCache.oiio_make_thumbnail(
-                source,
-                destination,
-                common.THUMBNAIL_IMAGE_SIZE,
-            )
-            if res:
-                images.ImageCache.get_image(destination, int(size), force=True)
-                images.ImageCache.make_color(destination)
-                return True
 
-            # We should never get here ideally, but if we do we'll mark the item
-            # with a bespoke 'failed' thumbnail
-            res = images.ImageCache.oiio_make_thumbnail(
-                common.rsc_path(__file__, u'failed'),
-                destination,
-                common.THUMBNAIL_IMAGE_SIZE
-            )
-            if res:
-                images.ImageCache.get_image(destination, int(size), force=True)
-                images.ImageCache.make_color(destination)
-                return True
+            with self.measure(u'image'):
+                if farm:
+                    if self.submit_thumbnail(source, destination, size):
+                        self.save_stamp(data, key)
+                        return True
+                else:
+                    res = images.ImageCache.oiio_make_thumbnail(
+                        source,
+                        destination,
+                        common.THUMBNAIL_IMAGE_SIZE,
+                    )
+                    if res:
+                        images.ImageCache.get_image(destination, int(size), force=True)
+                        images.ImageCache.make_color(destination)
+                        self.save_stamp(data, key)
+                        return True
+
+                # We should never get here ideally, but if we do we'll mark the item
+                # with a bespoke 'failed' thumbnail
+                res = images.ImageCache.oiio_make_thumbnail(
+                    common.rsc_path(__file__, u'failed'),
+                    destination,
+                    common.THUMBNAIL_IMAGE_SIZE
+                )
+                if res:
+                    images.ImageCache.get_image(destination, int(size), force=True)
+                    images.ImageCache.make_color(destination)
+                    self.save_stamp(data, key)
+                    return True
             return False
         except:
             log.error(u'Failed to generate thumbnail')
         finally:
-            if ref():
-                ref()[common.ThumbnailLoaded] = True
+            # Rows of a superseded load are left to be processed again
+            if self.is_current():
+                data[common.ThumbnailLoaded] = True
+
+    def source_stamp(self, data):
+        """Returns the modification time and size of the file the thumbnail
+        of `data` is generated from.
+
+        Returns:
+            tuple: `(mtime, size)`, or `None` if the item isn't a file.
+
+        """
+        entries = data.get(common.EntryRole)
+        if not entries or entries[0].is_dir():
+            return None
+        try:
+            with self.measure(u'stat'):
+                stat = entries[0].stat()
+        except OSError:
+            return None
+        return stat.st_mtime, stat.st_size
+
+    def is_stale(self, data, source):
+        """Checks if the source file has changed since its thumbnail was
+        generated.
+
+        Thumbnails without a stored `mtime` and `size`, like the ones set by
+        the user, are never out of date.
+
+        """
+        stamp = self.source_stamp(data)
+        if not stamp:
+            return False
+
+        pp = data[common.ParentPathRole]
+        with self.measure(u'db'):
+            db = bookmark_db.get_db(pp[0], pp[1], pp[2])
+            v = (db.value(source, u'mtime'), db.value(source, u'size'))
+        if v[0] is None:
+            return False
+        return v != stamp
+
+    def save_stamp(self, data, source):
+        """Saves the modification time and size of the file a thumbnail was
+        generated from.
+
+        """
+        stamp = self.source_stamp(data)
+        if not stamp:
+            return
+
+        pp = data[common.ParentPathRole]
+        with self.measure(u'db'):
+            db = bookmark_db.get_db(pp[0], pp[1], pp[2])
+            db.queue_value(source, u'mtime', stamp[0])
+            db.queue_value(source, u'size', stamp[1])
+
+    def submit_thumbnail(self, source, destination, size):
+        """Generates a thumbnail using the :mod:`.thumbnailfarm` processes.
+
+        Returns:
+            bool: `True` if the thumbnail was generated and loaded.
+
+        """
+        try:
+            res, rgba = thumbnailfarm.get().submit(
+                source, destination, common.THUMBNAIL_IMAGE_SIZE)
+        except thumbnailfarm.FarmError as e:
+            log.error(u'Failed to generate thumbnail: {}\n{}'.format(
+                source, e))
+            return False
+        if not res:
+            return False
+
+        images.ImageCache.get_image(destination, int(size), force=True)
+        if rgba:
+            images.ImageCache.setValue(
+                common.get_hash(destination),
+                QtGui.QColor(*rgba),
+                images.ColorType
+            )
+        return True
 
 
 class TaskFolderWorker(BaseWorker):
     """Used by the TaskFolderModel to count the number of files in a folder."""
+    roles = (common.TodoCountRole,)
+
     @process
     @QtCore.Slot()
     def process_data(self, ref):
         """Counts the number of items in the task folder up to 999.
 
         """
-        def is_valid():
-            return False if not ref() or self.interrupt else True
-
-        if not is_valid():
+        data = ref()
+        if not data or not self.is_current():
             return False
 
         count = 0
-        for entry in common.walk(ref()[QtCore.Qt.StatusTipRole]):
-            if not is_valid():
-                return False
-            if entry.name.startswith(u'.'):
-                continue
-            count += 1
-            if count > 999:
-                break
-        if not is_valid():
+        it = walker.walk(
+            data[QtCore.Qt.StatusTipRole],
+            threads=common.walker_threads(),
+            interrupt=lambda: not self.is_current()
+        )
+        with self.measure(u'stat'):
+            for entry in it:
+                if entry.name.startswith(u'.'):
+                    continue
+                count += 1
+                if count > 999:
+                    break
+        if not self.is_current():
             return False
-        ref()[common.TodoCountRole] = count
+        data[common.TodoCountRole] = count
         return True
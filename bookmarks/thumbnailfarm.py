@@ -0,0 +1,413 @@
+# -*- coding: utf-8 -*-
+"""Thumbnail generation in separate worker processes.
+
+Decoding large EXR or DPX frames, flattening deep images and compositing
+over the checker background are serialised behind the GIL when thumbnails
+are generated by the thumbnail threads. The :class:`.Farm` sends the jobs to
+a pool of worker processes instead. Each job writes the thumbnail to its
+destination and returns the average colour of the written image.
+
+A decoder crashing or hanging only takes down its worker process: the job
+fails and the process is replaced for the next job.
+
+.. code-block:: python
+
+    farm = thumbnailfarm.get()
+    success, color = farm.submit(source, destination, 512)
+    # (True, (128, 118, 102, 240))
+
+The OpenImageIO conversion used by both the worker processes and
+:meth:`.ImageCache.oiio_make_thumbnail` is implemented by :func:`.convert`.
+
+Note:
+    The module does not depend on Qt so it can be used outside of a running
+    Bookmarks session.
+
+    On Windows the worker processes are started by a Python interpreter,
+    see :func:`.get_executable`. Inside a host application, or when started
+    by the standalone ``bookmarks.exe`` launcher, `sys.executable` is not
+    one.
+
+"""
+import os
+import sys
+import time
+import Queue
+import threading
+import traceback
+import multiprocessing
+
+import OpenImageIO
+
+
+DEFAULT_PROCESSES = max(1, min(multiprocessing.cpu_count() - 1, 4))
+"""The default number of worker processes."""
+
+TIMEOUT = 60.0
+"""The number of seconds a job can take before its process is terminated."""
+
+MAX_JOBS = 100
+"""The number of jobs a worker process runs before it is replaced."""
+
+ACCEPTED_CODECS = (u'h.264', u'h264', u'mpeg-4', u'mpeg4')
+"""The movie codecs thumbnails are generated for."""
+
+INTERPRETERS = (u'pythonw.exe', u'python.exe')
+"""The Python interpreters that can start the worker processes on Windows."""
+
+_farm = []
+_lock = threading.Lock()
+
+
+class FarmError(RuntimeError):
+    """Raised when a job's worker process crashed or timed out."""
+
+
+def get_executable():
+    """Returns the Python interpreter used to start the worker processes.
+
+    On Windows the worker processes are started by running `sys.executable`.
+    The standalone ``bookmarks.exe`` is an embedded launcher that always
+    starts a new Bookmarks window, so the interpreter installed next to it
+    is used instead. Other platforms fork the current process.
+
+    Returns:
+        unicode: Path to the interpreter, or `None` if there isn't one.
+
+    """
+    if sys.platform != 'win32':
+        return sys.executable
+    if os.path.basename(sys.executable).lower() in INTERPRETERS:
+        return sys.executable
+    for root in (os.path.dirname(sys.executable), sys.exec_prefix):
+        for name in INTERPRETERS:
+            path = os.path.join(root, name)
+            if os.path.isfile(path):
+                return path
+    return None
+
+
+def accepted_codec(spec):
+    """Checks if the movie codec of `spec` can be decoded.
+
+    Not all codec formats are supported by ffmpeg. There does not seem to be
+    error handling and an unsupported codec crashes ffmpeg.
+
+    Args:
+        spec (OpenImageIO.ImageSpec): The spec of the source image.
+
+    Returns:
+        bool: `False` if the spec is a movie of an unsupported codec.
+
+    """
+    if spec.get_int_attribute(u'oiio:Movie') != 1:
+        return True
+    codec_name = spec.get_string_attribute(u'ffmpeg:codec_name')
+    if not codec_name:
+        return True
+    return any(f in codec_name.lower() for f in ACCEPTED_CODECS)
+
+
+def convert(buf, size, nthreads=4):
+    """Converts `buf` to an sRGB image fitting the bounds of `size`.
+
+    Args:
+        buf (OpenImageIO.ImageBuf): The source image.
+        size (int): The bounds to fit the converted image (in pixels).
+        nthreads (int): Number of threads to use. Defaults to 4.
+
+    Returns:
+        OpenImageIO.ImageBuf: The converted image, ready to be written.
+
+    """
+    source_spec = buf.spec()
+
+    w = source_spec.width
+    h = source_spec.height
+    factor = float(size) / max(float(w), float(h))
+    w *= factor
+    h *= factor
+
+    destination_spec = OpenImageIO.ImageSpec(int(w), int(h), 4, OpenImageIO.UINT8)
+    destination_spec.channelnames = (u'R', u'G', u'B', u'A')
+    destination_spec.alpha_channel = 3
+    destination_spec.attribute(u'oiio:ColorSpace', u'sRGB')
+    destination_spec.attribute(u'oiio:Gamma', u'0.454545')
+
+    if int(source_spec.nchannels) < 3:
+        buf = OpenImageIO.ImageBufAlgo.channels(
+            buf,
+            (source_spec.channelnames[0], source_spec.channelnames[0],
+             source_spec.channelnames[0]),
+            (u'R', u'G', u'B')
+        )
+    elif int(source_spec.nchannels) > 4:
+        if source_spec.channelindex(u'A') > -1:
+            buf = OpenImageIO.ImageBufAlgo.channels(
+                buf, (u'R', u'G', u'B', u'A'), (u'R', u'G', u'B', u'A'))
+        else:
+            buf = OpenImageIO.ImageBufAlgo.channels(
+                buf, (u'R', u'G', u'B'), (u'R', u'G', u'B'))
+
+    if source_spec.deep:
+        buf = OpenImageIO.ImageBufAlgo.flatten(buf, nthreads=nthreads)
+
+    buf = OpenImageIO.ImageBufAlgo.resample(
+        buf, roi=destination_spec.roi, interpolate=True, nthreads=nthreads)
+
+    if buf.nchannels > 3:
+        background_buf = OpenImageIO.ImageBuf(destination_spec)
+        OpenImageIO.ImageBufAlgo.checker(
+            background_buf,
+            12, 12, 1,
+            (0.3, 0.3, 0.3),
+            (0.2, 0.2, 0.2)
+        )
+        buf = OpenImageIO.ImageBufAlgo.over(buf, background_buf)
+
+    spec = buf.spec()
+    buf.set_write_format(OpenImageIO.UINT8)
+
+    # There seems to be a problem with the ICC profile exported from Adobe
+    # applications and the PNG library. The sRGB profile seems to be out of
+    # date and pnglib crashes when encounters an invalid profile. Removing
+    # the ICC profile seems to fix the issue.
+    _spec = OpenImageIO.ImageSpec()
+    _spec.from_xml(spec.to_xml())  # this doesn't copy the extra attributes
+    for i in spec.extra_attribs:
+        if i.name.lower() == u'iccprofile':
+            continue
+        try:
+            _spec[i.name] = i.value
+        except:
+            continue
+    spec = _spec
+
+    # On some dpx images I'm getting "GammaCorrectedinf"
+    if spec.get_string_attribute(u'oiio:ColorSpace') == u'GammaCorrectedinf':
+        spec[u'oiio:ColorSpace'] = u'sRGB'
+        spec[u'oiio:Gamma'] = u'0.454545'
+
+    # Initiating a new spec with the modified spec
+    _buf = OpenImageIO.ImageBuf(spec)
+    _buf.copy_pixels(buf)
+    _buf.set_write_format(OpenImageIO.UINT8)
+    return _buf
+
+
+def average_color(buf):
+    """Returns the average colour of `buf`.
+
+    Returns:
+        tuple: The `(r, g, b, a)` values in the 0-255 range, or `None`.
+
+    """
+    stats = OpenImageIO.ImageBufAlgo.computePixelStats(buf)
+    if not stats or not stats.avg:
+        return None
+    avg = stats.avg
+    if len(avg) > 3:
+        return (int(avg[0] * 255), int(avg[1] * 255), int(avg[2] * 255), 240)
+    if len(avg) == 3:
+        return (int(avg[0] * 255), int(avg[1] * 255), int(avg[2] * 255), 255)
+    return (int(avg[0] * 255), int(avg[0] * 255), int(avg[0] * 255), 255)
+
+
+def make_thumbnail(source, destination, size, nthreads=1):
+    """Converts `source` and saves the result to `destination`.
+
+    This is the job run by the worker processes.
+
+    Args:
+        source (unicode): Source image's file path.
+        destination (unicode): Destination of the converted image.
+        size (int): The bounds to fit the converted image (in pixels).
+        nthreads (int): Number of threads to use. Defaults to 1.
+
+    Returns:
+        tuple: `True` if the image was converted and the average colour of
+        the converted image.
+
+    """
+    if u'.' not in source:
+        return False, None
+    i = OpenImageIO.ImageInput.create(source.split(u'.').pop().lower())
+    if not i:
+        return False, None
+    valid = i.valid_file(source)
+    i.close()
+    if not valid:
+        return False, None
+
+    cache = OpenImageIO.ImageCache(shared=True)
+    try:
+        buf = OpenImageIO.ImageBuf(source)
+        if buf.has_error or not accepted_codec(buf.spec()):
+            return False, None
+
+        buf = convert(buf, size, nthreads=nthreads)
+        if not os.access(os.path.dirname(destination), os.W_OK):
+            return False, None
+        if not buf.write(destination, dtype=OpenImageIO.UINT8):
+            if os.path.isfile(destination):
+                os.remove(destination)
+            return False, None
+        return True, average_color(buf)
+    finally:
+        cache.invalidate(source, force=True)
+        cache.invalidate(destination, force=True)
+
+
+def _serve(conn):
+    """The main loop of a worker process."""
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, IOError):
+            return
+        if job is None:
+            return
+        try:
+            conn.send(make_thumbnail(*job) + (None,))
+        except Exception:
+            conn.send((False, None, traceback.format_exc()))
+
+
+class _Process(object):
+    """A worker process and the connection used to send it jobs."""
+
+    def __init__(self):
+        self.process = None
+        self.conn = None
+        self.jobs = 0
+
+    def start(self):
+        if sys.platform == 'win32':
+            executable = get_executable()
+            if not executable:
+                raise FarmError(u'Python interpreter not found')
+            multiprocessing.set_executable(executable)
+
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=_serve, args=(child_conn,))
+        self.process.daemon = True
+        self.process.start()
+        child_conn.close()
+        self.jobs = 0
+
+    def stop(self, timeout=1.0):
+        if not self.process:
+            return
+        try:
+            self.conn.send(None)
+        except (IOError, EOFError, ValueError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.conn.close()
+        self.process = None
+        self.conn = None
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process.join()
+        self.conn.close()
+        self.process = None
+        self.conn = None
+
+    def run(self, job, timeout):
+        if self.process and (not self.process.is_alive() or self.jobs >= MAX_JOBS):
+            self.stop()
+        if not self.process:
+            self.start()
+
+        self.jobs += 1
+        self.conn.send(job)
+        t = time.time() + timeout
+        while time.time() < t:
+            try:
+                if self.conn.poll(0.1):
+                    return self.conn.recv()
+            except (IOError, EOFError):
+                break
+            if not self.process.is_alive():
+                break
+
+        self.process.join(0.1)
+        exitcode = self.process.exitcode
+        self.kill()
+        if exitcode is None:
+            raise FarmError(u'Timed out after {}s'.format(timeout))
+        raise FarmError(u'Process exited with code {}'.format(exitcode))
+
+
+class Farm(object):
+    """A pool of worker processes generating thumbnails.
+
+    :meth:`.submit` is blocking and can be called from several threads at
+    once. The processes are started when they're first needed.
+
+    Args:
+        processes (int): The number of worker processes.
+        timeout (float): Seconds a job can take before it is abandoned.
+
+    """
+
+    def __init__(self, processes=DEFAULT_PROCESSES, timeout=TIMEOUT):
+        self.timeout = timeout
+        self._processes = [_Process() for _ in xrange(max(1, processes))]
+        self._idle = Queue.Queue()
+        for p in self._processes:
+            self._idle.put(p)
+
+    def submit(self, source, destination, size):
+        """Generates a thumbnail in one of the worker processes.
+
+        Args:
+            source (unicode): Source image's file path.
+            destination (unicode): Destination of the converted image.
+            size (int): The bounds to fit the converted image (in pixels).
+
+        Returns:
+            tuple: `True` if the thumbnail was written and its average colour
+            as an `(r, g, b, a)` tuple.
+
+        Raises:
+            FarmError: If the worker process crashed or timed out.
+
+        """
+        p = self._idle.get()
+        try:
+            success, color, error = p.run(
+                (source, destination, size), self.timeout)
+        finally:
+            self._idle.put(p)
+        if error:
+            sys.stderr.write(error)
+        return success, color
+
+    def shutdown(self):
+        """Stops the worker processes."""
+        for _ in self._processes:
+            self._idle.get().stop()
+        for p in self._processes:
+            self._idle.put(p)
+
+
+def get():
+    """Returns the shared :class:`.Farm` instance."""
+    with _lock:
+        if not _farm:
+            _farm.append(Farm())
+        return _farm[0]
+
+
+def shutdown():
+    """Stops the worker processes of the shared farm, if it was started."""
+    with _lock:
+        if _farm:
+            _farm[0].shutdown()
@@ -94,6 +94,7 @@ OIIO_ROOT = path('OpenImageIO-build/install')
 # Python
 LIB_SCANDIR_D = _find_lib(PYTHON_ROOT, '_scandir.pyd')
 LIB_SQLITE = _find_lib(PYTHON_ROOT, 'sqlite3.dll')
+PYTHONW = _find_lib(PYTHON_ROOT, 'pythonw.exe')
 
 # Alembic
 LIB_ALEMBIC = _find_lib(ALEMBIC_ROOT, 'Alembic.dll')
@@ -438,6 +439,10 @@ def build_bin():
         os.path.sep + 'bin' + os.path.sep + 'python27.dll',
         PREFIX + os.path.sep + u'bookmarks' + os.path.sep + 'python27.dll',
     )
+    # The interpreter used to start the thumbnail worker processes
+    shutil.copy2(
+        PYTHONW,
+        PREFIX + os.path.sep + u'bookmarks' + os.path.sep + 'pythonw.exe')
     os.remove(bindir + os.path.sep + 'bookmarks.exe')
     os.remove(bindir + os.path.sep + 'bookmarks_d.exe')
 
@@ -536,6 +541,7 @@ def verify_configuration():
     _verify(VC_REDIST)
     _verify(DUMPBIN)
     _verify(PREFIX)
+    _verify(PYTHONW)
 
     sys.stdout.write('Configuration is valid')
 
@@ -81,6 +81,823 @@ class TestScandir(BaseCase):
             self.assertIsInstance(entry.path, unicode)
 
 
+class TestFileIndex(BaseCase):
+    def setUp(self):
+        import os
+        self.task_folder = u'{}/{}/asset/scenes'.format(
+            self.root_dir, self.bookmarks[0])
+        os.makedirs(self.task_folder + u'/subfolder')
+        for name in (u'a.ma', u'subfolder/b_0001.exr', u'subfolder/b_0002.exr'):
+            with open(self.task_folder + u'/' + name, 'w') as f:
+                f.write(name)
+
+    def tearDown(self):
+        import shutil
+        import bookmarks.fileindex as fileindex
+        fileindex.reset()
+        shutil.rmtree(u'{}/{}/asset'.format(self.root_dir, self.bookmarks[0]))
+
+    def _index(self):
+        import bookmarks.fileindex as fileindex
+        return fileindex.get(
+            self.server, self.job, self.bookmarks[0], u'asset/scenes')
+
+    def test_reconcile(self):
+        import os
+        import time
+
+        index = self._index()
+        self.assertFalse(index.exists())
+        self.assertTrue(index.reconcile())
+        self.assertTrue(os.path.isfile(index.index_path()))
+        self.assertEqual(len(list(index.entries())), 3)
+
+        # Nothing has changed on disk
+        self.assertFalse(index.reconcile())
+
+        time.sleep(1.1)  # Making sure the directory mtime changes
+        os.remove(self.task_folder + u'/subfolder/b_0002.exr')
+        self.assertTrue(index.reconcile())
+        paths = sorted(f.path for f in index.entries())
+        self.assertEqual(paths, [
+            self.task_folder + u'/a.ma',
+            self.task_folder + u'/subfolder/b_0001.exr',
+        ])
+
+    def test_load(self):
+        import bookmarks.fileindex as fileindex
+
+        self._index().reconcile()
+        fileindex.reset()
+
+        index = self._index()
+        self.assertTrue(index.exists())
+        for entry in index.entries():
+            self.assertIsInstance(entry.name, unicode)
+            self.assertTrue(entry.is_file())
+            self.assertGreater(entry.stat().st_size, 0)
+
+        with self.assertRaises(TypeError):
+            fileindex.get('server', u'job', u'root', u'asset')
+
+    def test_update(self):
+        index = self._index()
+        index.reconcile()
+
+        snapshots = index.snapshots()
+        self.assertIn(self.task_folder, snapshots)
+        self.assertEqual(
+            sorted(snapshots[self.task_folder + u'/subfolder'][0]),
+            [u'b_0001.exr', u'b_0002.exr'])
+
+        index.update(
+            self.task_folder + u'/subfolder', 0.0, [u'b_0001.exr'], [])
+        self.assertEqual(len(list(index.entries())), 2)
+
+        index.remove(self.task_folder + u'/subfolder')
+        self.assertEqual(
+            [f.name for f in index.entries()], [u'a.ma', ])
+
+        # Paths outside the task folder are ignored
+        index.remove(self.root_dir)
+        self.assertTrue(index.exists())
+
+    def test_walk(self):
+        import os
+
+        index = self._index()
+        self.assertFalse(index.exists())
+
+        # The files are yielded before the whole tree has been listed
+        it = index.walk(threads=1)
+        entry = next(it)
+        self.assertIsInstance(entry.name, unicode)
+        self.assertFalse(os.path.isfile(index.index_path()))
+
+        paths = sorted([entry.path, ] + [f.path for f in it])
+        self.assertEqual(paths, [
+            self.task_folder + u'/a.ma',
+            self.task_folder + u'/subfolder/b_0001.exr',
+            self.task_folder + u'/subfolder/b_0002.exr',
+        ])
+        self.assertTrue(os.path.isfile(index.index_path()))
+        self.assertEqual(sorted(f.path for f in index.entries()), paths)
+        self.assertFalse(index.reconcile())
+
+    def test_reconciled_changes(self):
+        import os
+        import time
+        import bookmarks.listfiles as listfiles
+
+        index = self._index()
+        index.reconcile()
+        known = set(f.path.lower() for f in index.entries())
+
+        time.sleep(1.1)  # Making sure the directory mtime changes
+        os.remove(self.task_folder + u'/subfolder/b_0002.exr')
+        with open(self.task_folder + u'/subfolder/b_0003.exr', 'w') as f:
+            f.write(u'b_0003.exr')
+        self.assertTrue(index.reconcile())
+
+        changes = listfiles.reconciled_changes(known, index.entries())
+        self.assertEqual(len(changes), 1)
+        self.assertEqual(
+            changes[0].path, (self.task_folder + u'/subfolder').lower())
+        self.assertEqual([f.name for f in changes[0].added], [u'b_0003.exr'])
+        self.assertEqual(changes[0].removed, [u'b_0002.exr'])
+
+        known = set(f.path.lower() for f in index.entries())
+        self.assertEqual(listfiles.reconciled_changes(known, index.entries()), [])
+
+    def test_symlink(self):
+        import os
+
+        os.symlink(u'..', self.task_folder + u'/subfolder/loop')
+        index = self._index()
+        self.assertTrue(index.reconcile())
+        paths = sorted(f.path for f in index.entries())
+        self.assertEqual(paths, [
+            self.task_folder + u'/a.ma',
+            self.task_folder + u'/subfolder/b_0001.exr',
+            self.task_folder + u'/subfolder/b_0002.exr',
+        ])
+
+
+class TestStatCache(BaseCase):
+    def setUp(self):
+        import os
+        self.path = u'{}/{}/render'.format(self.root_dir, self.bookmarks[0])
+        os.makedirs(self.path)
+        self.paths = []
+        for n in xrange(1, 11):
+            path = u'{}/shot_{:04d}.exr'.format(self.path, n)
+            with open(path, 'wb') as f:
+                f.write('x' * n)
+            self.paths.append(path)
+
+    def tearDown(self):
+        import shutil
+        import bookmarks.statcache as statcache
+        statcache.reset()
+        shutil.rmtree(self.path)
+
+    def test_stat_sequence(self):
+        import os
+        import time
+        import bookmarks.statcache as statcache
+
+        self.assertIsNone(statcache.cached(self.path))
+        size, mtime, approximate = statcache.stat_sequence(self.paths)
+        self.assertEqual(size, 55)
+        self.assertEqual(mtime, max(os.stat(f).st_mtime for f in self.paths))
+        self.assertFalse(approximate)
+        self.assertEqual(len(statcache.cached(self.path)), 10)
+
+        # Adding a file changes the directory's mtime and invalidates the cache
+        time.sleep(1.0)
+        path = u'{}/shot_{:04d}.exr'.format(self.path, 11)
+        with open(path, 'wb') as f:
+            f.write('x' * 11)
+        size, _, _ = statcache.stat_sequence(self.paths + [path, ])
+        self.assertEqual(size, 66)
+
+        stats = statcache.stat_files(self.paths + [u'{}/missing.exr'.format(self.path), ])
+        self.assertEqual(len(stats), 10)
+
+    def test_refine(self):
+        import threading
+        import bookmarks.statcache as statcache
+
+        results = []
+        done = threading.Event()
+
+        def callback(size, mtime):
+            results.append(size)
+            done.set()
+
+        # Abandoned requests are skipped
+        statcache.refine(self.paths, callback, interrupt=lambda: True)
+        statcache.refine(self.paths, callback)
+        self.assertTrue(done.wait(5.0))
+        self.assertEqual(results, [55, ])
+
+
+class TestLazyFetch(BaseCase):
+    def setUp(self):
+        import bookmarks.settings as settings
+        settings.local_settings.setValue(u'preferences/lazy_fetch', True)
+
+    def tearDown(self):
+        import bookmarks.settings as settings
+        settings.local_settings.setValue(u'preferences/lazy_fetch', None)
+
+    def _model(self, rows):
+        import bookmarks.common as common
+        import bookmarks.lists as lists
+        import bookmarks.threads as threads
+
+        class Model(lists.BaseModel):
+            queue_type = threads.FileInfoQueue
+            thumbnail_queue_type = threads.FileThumbnailQueue
+            supports_lazy_fetch = True
+
+        model = Model(has_threads=False)
+        model.beginResetModel()
+        data = model.model_data()
+        for n in xrange(rows):
+            data[n] = common.RowData({common.IdRole: n})
+        model.endResetModel()
+        return model
+
+    def test_fetch_more(self):
+        import bookmarks.common as common
+
+        rows = common.FETCH_SIZE * 2 + 1
+        model = self._model(rows)
+        inserted = []
+        model.rowsInserted.connect(
+            lambda parent, first, last: inserted.append((first, last)))
+
+        self.assertEqual(model.rowCount(), common.FETCH_SIZE)
+        self.assertTrue(model.canFetchMore())
+
+        model.fetchMore()
+        self.assertEqual(model.rowCount(), common.FETCH_SIZE * 2)
+        model.fetchMore()
+        self.assertEqual(model.rowCount(), rows)
+        self.assertFalse(model.canFetchMore())
+        self.assertEqual(inserted, [
+            (common.FETCH_SIZE, common.FETCH_SIZE * 2 - 1),
+            (common.FETCH_SIZE * 2, rows - 1),
+        ])
+
+        # Resetting the model exposes the first rows only
+        model.beginResetModel()
+        model.endResetModel()
+        self.assertEqual(model.rowCount(), common.FETCH_SIZE)
+        model.fetch_to(rows + 10)
+        self.assertEqual(model.rowCount(), rows)
+
+    def test_disabled(self):
+        import bookmarks.common as common
+        import bookmarks.settings as settings
+
+        settings.local_settings.setValue(u'preferences/lazy_fetch', False)
+        rows = common.FETCH_SIZE * 2
+        model = self._model(rows)
+        self.assertEqual(model.rowCount(), rows)
+        self.assertFalse(model.canFetchMore())
+
+
+class TestIndexServer(BaseCase):
+    def setUp(self):
+        import os
+        import uuid
+        import bookmarks.indexserver as indexserver
+
+        self.name = u'bookmarks_unittest_{}'.format(uuid.uuid1().hex)
+        self.index_server = indexserver.IndexServer(name=self.name)
+        self.assertTrue(self.index_server.listen())
+
+        self.path = u'{}/{}/asset/render'.format(self.root_dir, self.bookmarks[0])
+        os.makedirs(self.path + u'/v001')
+        for name in (u'a.ma', u'v001/shot_0001.exr', u'v001/shot_0002.exr'):
+            with open(self.path + u'/' + name, 'w') as f:
+                f.write(name)
+
+    def tearDown(self):
+        import shutil
+        import bookmarks.fileindex as fileindex
+
+        self.index_server.close()
+        self.index_server.deleteLater()
+        fileindex.reset()
+        shutil.rmtree(u'{}/{}/asset'.format(self.root_dir, self.bookmarks[0]))
+
+    def _run(self, func):
+        """Calls `func` on a thread while processing the server's events."""
+        import threading
+        from PySide2 import QtWidgets
+
+        result = []
+        thread = threading.Thread(target=lambda: result.append(func()))
+        thread.daemon = True
+        thread.start()
+        while thread.is_alive():
+            QtWidgets.QApplication.instance().processEvents()
+            thread.join(0.01)
+        self.assertEqual(len(result), 1)
+        return result[0]
+
+    def test_scandir(self):
+        import bookmarks.indexserver as indexserver
+
+        self.assertTrue(indexserver.is_running(name=self.name))
+        entries = self._run(
+            lambda: indexserver.scandir(self.path, name=self.name))
+        self.assertEqual(sorted(f.name for f in entries), [u'a.ma', u'v001'])
+        self.assertTrue(
+            [f for f in entries if f.name == u'v001'][0].is_dir())
+
+    def test_walk(self):
+        import os
+        import bookmarks.fileindex as fileindex
+        import bookmarks.indexserver as indexserver
+
+        it = indexserver.walk(
+            self.server, self.job, self.bookmarks[0], u'asset/render',
+            name=self.name)
+        paths = self._run(lambda: sorted(f.path for f in it))
+        self.assertEqual(paths, [
+            self.path + u'/a.ma',
+            self.path + u'/v001/shot_0001.exr',
+            self.path + u'/v001/shot_0002.exr',
+        ])
+
+        index = fileindex.get(
+            self.server, self.job, self.bookmarks[0], u'asset/render')
+        self.assertTrue(os.path.isfile(index.index_path()))
+
+    def test_fallback(self):
+        import bookmarks.indexserver as indexserver
+
+        name = u'bookmarks_unittest_not_running'
+        self.assertFalse(indexserver.is_running(name=name))
+
+        entries = indexserver.scandir(self.path, name=name)
+        self.assertEqual(sorted(f.name for f in entries), [u'a.ma', u'v001'])
+
+        it = indexserver.walk(
+            self.server, self.job, self.bookmarks[0], u'asset/render',
+            name=name)
+        self.assertEqual(len(list(it)), 3)
+
+
+class TestWorkQueue(BaseCase):
+    def test_priority(self):
+        import weakref
+        import bookmarks.common as common
+        import bookmarks.threads as threads
+
+        rows = [common.RowData({common.IdRole: n}) for n in xrange(4)]
+        refs = [weakref.ref(f) for f in rows]
+
+        q = threads.WorkQueue(maxlen=2)
+        q.put(refs[0], priority=threads.ModelPriority)
+        q.put(refs[1], priority=threads.ModelPriority)
+        q.put(refs[2])
+        q.put(refs[3])
+        self.assertEqual(len(q), 4)
+        self.assertIn(refs[0], q)
+
+        # Visible items first, most recent first, then the model items in order
+        self.assertEqual([q.pop() for _ in xrange(4)], [refs[3], refs[2], refs[0], refs[1]])
+        with self.assertRaises(IndexError):
+            q.pop()
+
+        # The oldest visible items are dropped
+        for ref in refs:
+            q.put(ref)
+        self.assertEqual(len(q), 2)
+
+    def test_prefetch(self):
+        import weakref
+        import bookmarks.common as common
+        import bookmarks.threads as threads
+
+        rows = [common.RowData({common.IdRole: n}) for n in xrange(4)]
+        refs = [weakref.ref(f) for f in rows]
+
+        q = threads.WorkQueue()
+        q.put(refs[0], priority=threads.ModelPriority)
+        q.put_many(refs[:3], priority=threads.PrefetchPriority)
+        q.put(refs[3])
+
+        # Visible items are not moved to the prefetched items
+        q.put(refs[3], priority=threads.PrefetchPriority)
+        self.assertEqual(len(q), 4)
+
+        # Cancelled rows of the model items are put back
+        self.assertEqual(q.cancel([refs[0], refs[1], refs[3]]), 2)
+        self.assertEqual(len(q), 3)
+        self.assertEqual([q.pop() for _ in xrange(3)], [refs[3], refs[2], refs[0]])
+
+    def test_claim(self):
+        import weakref
+        import bookmarks.common as common
+        import bookmarks.threads as threads
+
+        row = common.RowData({common.IdRole: 0})
+        q = threads.WorkQueue()
+        k = q.claim(weakref.ref(row))
+        self.assertIsNotNone(k)
+        self.assertIsNone(q.claim(weakref.ref(row)))
+        q.release(k)
+        self.assertIsNotNone(q.claim(weakref.ref(row)))
+
+    def test_generation(self):
+        import weakref
+        import bookmarks.common as common
+        import bookmarks.threads as threads
+
+        rows = [common.RowData({common.IdRole: n}) for n in xrange(3)]
+
+        q = threads.WorkQueue()
+        generation = q.generation
+        q.put(weakref.ref(rows[0]))
+        self.assertEqual(q.take(), (weakref.ref(rows[0]), generation))
+
+        # Advancing discards the queued items
+        q.put(weakref.ref(rows[1]))
+        self.assertEqual(q.advance(), generation + 1)
+        self.assertEqual(len(q), 0)
+
+        # Items queued for a superseded generation are dropped
+        q.put(weakref.ref(rows[1]), generation=generation)
+        q.put_many([weakref.ref(rows[2])], generation=generation)
+        self.assertEqual(len(q), 0)
+        q.put(weakref.ref(rows[2]), generation=q.generation)
+        self.assertEqual(len(q), 1)
+
+    def test_dedup(self):
+        import weakref
+        import bookmarks.common as common
+        import bookmarks.threads as threads
+
+        rows = [common.RowData({common.IdRole: n}) for n in xrange(3)]
+
+        q = threads.WorkQueue()
+        q.put_many([weakref.ref(f) for f in rows], priority=threads.ModelPriority)
+        q.put_many([weakref.ref(f) for f in rows], priority=threads.ModelPriority)
+        self.assertEqual(len(q), 3)
+
+        # A visible row is moved to the top
+        q.put(weakref.ref(rows[2]))
+        q.put(weakref.ref(rows[1]))
+        q.put(weakref.ref(rows[2]))
+        self.assertEqual(len(q), 3)
+        self.assertEqual([q.pop()() for _ in xrange(3)], [rows[2], rows[1], rows[0]])
+
+        # Dead references are not queued
+        ref = weakref.ref(common.RowData({common.IdRole: 3}))
+        q.put(ref)
+        self.assertEqual(len(q), 0)
+        self.assertNotIn(ref, q)
+
+    def test_stress(self):
+        """Queues a million rows, and the visible rows while scrolling."""
+        import weakref
+        import bookmarks.common as common
+        import bookmarks.threads as threads
+
+        items = 1000000
+        rows = [common.RowData({common.IdRole: n}) for n in xrange(items)]
+
+        q = threads.WorkQueue(99)
+        q.put_many(
+            [weakref.ref(f) for f in rows], priority=threads.ModelPriority)
+        self.assertEqual(len(q), min(items, common.MAXITEMS))
+
+        popped = set()
+        for top in xrange(0, items - 50, 997):
+            visible = [weakref.ref(f) for f in rows[top:top + 50]]
+            q.put_many(visible)
+            self.assertIn(visible[-1], q)
+            for _ in xrange(10):
+                popped.add(q.pop()()[common.IdRole])
+            self.assertIn(top + 49, popped)
+
+        # Rows pushed out of the visible items are still queued, but no row
+        # is returned twice
+        n = len(popped)
+        while True:
+            try:
+                v = q.pop()()[common.IdRole]
+            except IndexError:
+                break
+            self.assertNotIn(v, popped)
+            popped.add(v)
+        self.assertGreater(len(popped), n)
+        self.assertGreaterEqual(len(popped), common.MAXITEMS)
+
+
+class TestQueueStats(BaseCase):
+    def test_percentile(self):
+        import bookmarks.queuestats as queuestats
+
+        values = range(1, 101)
+        self.assertEqual(queuestats.percentile(values, 50), 50)
+        self.assertEqual(queuestats.percentile(values, 95), 95)
+        self.assertEqual(queuestats.percentile([3, ], 95), 3)
+        self.assertIsNone(queuestats.percentile([], 50))
+
+    def test_snapshot(self):
+        import time
+        import bookmarks.queuestats as queuestats
+
+        stats = queuestats.QueueStats()
+        for _ in xrange(3):
+            timer = queuestats.ItemTimer()
+            with timer.phase(u'db'):
+                time.sleep(0.01)
+            stats.record(timer)
+        stats.count(u'stale')
+        stats.count(u'dropped', 2)
+
+        v = stats.snapshot()
+        self.assertEqual(v[u'processed'], 3)
+        self.assertEqual(v[u'stale'], 1)
+        self.assertEqual(v[u'dropped'], 2)
+        self.assertGreater(v[u'rate'], 0.0)
+        self.assertGreaterEqual(v[u'db'][u'p95'], 0.01)
+        self.assertGreaterEqual(v[u'total'][u'p50'], v[u'db'][u'p50'])
+        self.assertEqual(v[u'image'][u'p95'], 0.0)
+
+    def test_dump(self):
+        import json
+        import weakref
+        import bookmarks.common as common
+        import bookmarks.threads as threads
+
+        row = common.RowData({common.IdRole: 0})
+        q = threads.QUEUES[threads.FileInfoQueue]
+        q.put(weakref.ref(row))
+        q.advance()
+
+        path = u'{}/stats.json'.format(self.root_dir)
+        threads.dump_stats(path)
+        with open(path, 'r') as f:
+            v = json.load(f)
+        self.assertIn(u'time', v)
+        stats = v[u'queues'][u'FileInfoQueue']
+        self.assertEqual(stats[u'depth'], 0)
+        self.assertGreaterEqual(stats[u'stale'], 1)
+
+
+class TestScrollTracker(BaseCase):
+    def test_window(self):
+        import bookmarks.prefetch as prefetch
+
+        tracker = prefetch.ScrollTracker()
+        self.assertEqual(list(tracker.window(10, 19, 5, 100)), range(20, 25))
+
+        tracker.update(50, t=0.0)
+        tracker.update(40, t=0.1)
+        self.assertEqual(tracker.direction, -1)
+        self.assertGreater(tracker.velocity, 0.0)
+
+        # Fast scrolling skips the rows scrolled past before they're loaded
+        skip = min(int(tracker.velocity * prefetch.LEAD), 5)
+        self.assertGreater(skip, 0)
+        rows = list(tracker.window(40, 49, 5, 100))
+        self.assertEqual(rows, range(39 - skip, 34 - skip, -1))
+        self.assertEqual(list(tracker.window(2, 11, 5, 100)), [])
+
+        # Stopping resets the velocity
+        tracker.update(40, t=1.0)
+        self.assertEqual(tracker.velocity, 0.0)
+        self.assertEqual(tracker.direction, -1)
+
+        self.assertFalse(tracker.is_far(55, 40, 49, 5))
+        self.assertTrue(tracker.is_far(60, 40, 49, 5))
+        self.assertTrue(tracker.is_far(29, 40, 49, 5))
+
+
+class TestShardedCache(BaseCase):
+    def test_value(self):
+        import bookmarks.shardedcache as shardedcache
+
+        cache = shardedcache.ShardedCache(shards=4)
+        cache.set_value(u'a', 1, 0)
+        cache.set_value(u'a', 2, 1, size=10)
+        cache.set_value(u'a', 3, 1, size=20)
+        self.assertTrue(cache.contains(u'a', 1))
+        self.assertFalse(cache.contains(u'b', 1))
+        self.assertEqual(cache.value(u'a', 0), 1)
+        self.assertEqual(cache.value(u'a', 1, size=20), 3)
+        self.assertIsNone(cache.value(u'a', 1, size=30))
+        self.assertEqual(cache.value(u'a', 1), {10: 2, 20: 3})
+
+        cache.remove(u'a')
+        self.assertIsNone(cache.value(u'a', 0))
+        self.assertEqual(len(cache), 0)
+
+    def test_coalesce_nowait(self):
+        import threading
+        import bookmarks.shardedcache as shardedcache
+
+        cache = shardedcache.ShardedCache()
+        started = threading.Event()
+        release = threading.Event()
+
+        def load():
+            started.set()
+            release.wait()
+            return 1
+
+        thread = threading.Thread(target=cache.coalesce, args=(u'a', load))
+        thread.start()
+        started.wait()
+        try:
+            # A pending call isn't waited for...
+            self.assertIsNone(cache.coalesce(u'a', lambda: 2, wait=False))
+        finally:
+            release.set()
+            thread.join()
+        # ...and without one the function is called
+        self.assertEqual(cache.coalesce(u'a', lambda: 2, wait=False), 2)
+
+    def test_stress(self):
+        import time
+        import threading
+        import collections
+        import bookmarks.shardedcache as shardedcache
+
+        cache = shardedcache.ShardedCache()
+        keys = [u'{}'.format(n) for n in xrange(200)]
+        loads = collections.Counter()
+        errors = []
+        done = threading.Event()
+
+        def load(k):
+            if cache.value(k, 0, size=64) is not None:
+                return cache.value(k, 0, size=64)
+            loads[k] += 1
+            time.sleep(0.001)
+            return cache.set_value(k, (k, 64), 0, size=64)
+
+        def write(n):
+            try:
+                for k in keys[n::4] + keys:
+                    v = cache.value(k, 0, size=64)
+                    if v is None:
+                        v = cache.coalesce(k, load, k)
+                    if v != (k, 64):
+                        errors.append((k, v))
+            except Exception as e:
+                errors.append(e)
+
+        def read():
+            try:
+                while not done.is_set():
+                    for k in keys:
+                        v = cache.value(k, 0, size=64)
+                        if v is not None and v != (k, 64):
+                            errors.append((k, v))
+                        cache.value(k, 0)
+            except Exception as e:
+                errors.append(e)
+
+        readers = [threading.Thread(target=read) for _ in xrange(2)]
+        writers = [threading.Thread(target=write, args=(n,)) for n in xrange(16)]
+        for thread in readers + writers:
+            thread.start()
+        for thread in writers:
+            thread.join()
+        done.set()
+        for thread in readers:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        # Every key was loaded exactly once
+        self.assertEqual(len(loads), len(keys))
+        self.assertEqual(max(loads.values()), 1)
+        self.assertEqual(len(cache), len(keys))
+
+
+class TestRowBatch(BaseCase):
+    def test_batch(self):
+        import bookmarks.common as common
+        import bookmarks.threads as threads
+
+        batch = threads.RowBatch()
+        self.assertTrue(batch.add(3, (common.FileInfoLoaded,)))
+        self.assertFalse(batch.add(1, (common.FileDetailsRole,)))
+        self.assertFalse(batch.add(3))
+        self.assertEqual(len(batch), 2)
+
+        rows, roles = batch.take()
+        self.assertEqual(rows, [1, 3])
+        self.assertEqual(
+            roles, sorted((common.FileInfoLoaded, common.FileDetailsRole)))
+        self.assertEqual(len(batch), 0)
+        self.assertTrue(batch.add(0))
+
+    def test_ranges(self):
+        import bookmarks.threads as threads
+
+        self.assertEqual(threads.get_ranges([]), [])
+        self.assertEqual(threads.get_ranges([4]), [(4, 4)])
+        self.assertEqual(
+            threads.get_ranges([0, 1, 2, 5, 7, 8]),
+            [(0, 2), (5, 5), (7, 8)]
+        )
+
+
+class TestRowData(BaseCase):
+    def test_mapping(self):
+        import weakref
+        from PySide2 import QtCore
+        import bookmarks.common as common
+
+        v = common.RowData({
+            QtCore.Qt.DisplayRole: u'a.ma',
+            common.IdRole: 0,
+        })
+        self.assertEqual(v[QtCore.Qt.DisplayRole], u'a.ma')
+        self.assertEqual(v[0], u'a.ma')
+        self.assertIn(common.IdRole, v)
+        self.assertNotIn(common.TypeRole, v)
+        self.assertIsNone(v.get(common.TypeRole))
+        with self.assertRaises(KeyError):
+            v[common.TypeRole]
+
+        v[common.IdRole] = 1
+        self.assertEqual(v[common.IdRole], 1)
+        del v[common.IdRole]
+        self.assertNotIn(common.IdRole, v)
+
+        # Roles without a slot
+        v[QtCore.Qt.FontRole] = 1
+        self.assertEqual(v.get(QtCore.Qt.FontRole), 1)
+        self.assertEqual(
+            sorted(v.keys()), sorted([QtCore.Qt.DisplayRole, QtCore.Qt.FontRole]))
+
+        ref = weakref.ref(v)
+        self.assertIs(ref(), v)
+        self.assertEqual(common.proxy_path(v), u'a.ma')
+
+
+class TestSequence(BaseCase):
+    def test_match(self):
+        import bookmarks.common as common
+        import bookmarks.sequence as sequence
+
+        paths = [
+            u'//server/job/root/asset/scenes/scene_v001.ma',
+            u'//server/job/root/asset/render/v001/0001.exr',
+            u'//server/job/root/asset/render/shot_beauty.0010.exr',
+            u'//server/job/root/asset/render/shot.exr',
+            u'//server/job/root/asset/render/readme',
+            u'',
+        ]
+        for path, match in zip(paths, sequence.match(paths)):
+            expected = common.get_sequence(path)
+            if expected is None:
+                self.assertIsNone(match)
+                continue
+            self.assertEqual(match.groups(), expected.groups())
+            self.assertEqual(match.group(0), expected.group(0))
+
+    def test_group(self):
+        import bookmarks.sequence as sequence
+
+        paths = [
+            u'shot_0004.exr',
+            u'scene.ma',
+            u'shot_0001.exr',
+            u'shot_0002.exr',
+            u'scene_v01.ma',
+        ]
+        sequences, others = sequence.group(paths)
+        self.assertEqual(others, [1, ])
+        self.assertEqual(len(sequences), 2)
+
+        seq = sequences[0]
+        self.assertEqual(len(seq), 3)
+        self.assertEqual(seq.frames.tolist(), [1, 2, 4])
+        self.assertEqual(seq.indexes.tolist(), [2, 3, 0])
+        self.assertEqual(seq.path(), u'shot_[0].exr')
+        self.assertEqual(seq.ranges(), u'0001-0002,0004')
+        self.assertEqual(seq.startpath(), u'shot_0001.exr')
+        self.assertEqual(seq.endpath(), u'shot_0004.exr')
+        self.assertEqual(seq.collapsed_path(), u'shot_[0001-0002,0004].exr')
+        self.assertEqual(seq.gaps().tolist(), [[3, 3], ])
+        self.assertEqual(seq.missing(), 1)
+        self.assertEqual(seq.group(1), u'shot_')
+        self.assertEqual(seq.group(4), u'exr')
+
+        self.assertEqual(sequences[1].frames.tolist(), [1, ])
+        self.assertEqual(sequences[1].missing(), 0)
+        self.assertEqual(sequence.group([]), ([], []))
+
+        # Non-ascii paths have a printable repr
+        sequences, _ = sequence.group([u'sh\xf6t_0001.exr', u'sh\xf6t_0002.exr'])
+        self.assertIsInstance(repr(sequences[0]), str)
+        match = next(iter(sequence.match([u'sh\xf6t_0001.exr', ])))
+        self.assertIsInstance(repr(match), str)
+
+    def test_get_ranges(self):
+        import bookmarks.common as common
+        import bookmarks.sequence as sequence
+
+        for frames in ([1, 2, 3, 5, 7, 8], [10, ], [3, 1, 2, 2]):
+            self.assertEqual(
+                sequence.get_ranges(frames, 4),
+                common.get_ranges(frames, 4)
+            )
+
+
 class TestDependencies(BaseCase):
     def test_oiio_import(self):
         try:
@@ -202,6 +1019,294 @@ class TestSQLite(BaseCase):
         with self.assertRaises(TypeError):
             self.db.setValue(None, k, id1)
 
+    def test_prefetch(self):
+        import sqlite3
+        import bookmarks.common as common
+        import bookmarks.bookmark_db as bookmark_db
+
+        id1 = u'prefetch.key'
+        self.db.setValue(id1, u'flags', 2)
+        self.assertEqual(self.db.cached_value(id1, u'flags'), 2)
+        self.assertIsNone(self.db.cached_value(u'missing.key', u'todo_count'))
+        self.assertIn(
+            bookmark_db.get_key(common.get_hash(id1)), self.db.prefetch())
+
+        # Our own changes discard the prefetched rows
+        self.db.setValue(id1, u'description', u'hello')
+        self.assertEqual(self.db.cached_value(id1, u'description'), u'hello')
+
+        # Changes made by other connections are picked up using `data_version`
+        connection = sqlite3.connect(
+            self.db._database_path, isolation_level=None)
+        connection.execute(
+            'UPDATE data SET description=\'world\' WHERE id=?',
+            (bookmark_db.get_key(common.get_hash(id1)),))
+        connection.close()
+
+        interval = bookmark_db.CHECK_INTERVAL
+        bookmark_db.CHECK_INTERVAL = 0.0
+        try:
+            self.assertEqual(self.db.cached_value(id1, u'description'), u'world')
+        finally:
+            bookmark_db.CHECK_INTERVAL = interval
+
+        with self.assertRaises(ValueError):
+            self.db.cached_value(id1, u'user')
+
+    def test_row_cache(self):
+        import sqlite3
+        import bookmarks.common as common
+        import bookmarks.bookmark_db as bookmark_db
+
+        id1 = u'row.key'
+        v = u'It\'s "quoted"; DROP TABLE data; --'
+        self.db.setValue(id1, u'notes', v)
+        self.assertEqual(self.db.value(id1, u'notes'), v)
+        self.assertIsNone(self.db.value(id1, u'description'))
+        self.assertIn(
+            (u'notes', bookmark_db.get_key(common.get_hash(id1))), self.db._rows)
+
+        # Setting a value discards the cached row
+        self.db.setValue(id1, u'flags', 4)
+        self.assertEqual(self.db.value(id1, u'flags'), 4)
+        self.assertEqual(self.db.value(id1, u'notes'), v)
+
+        connection = sqlite3.connect(
+            self.db._database_path, isolation_level=None)
+        connection.execute(
+            'UPDATE data SET flags=8 WHERE id=?',
+            (bookmark_db.get_key(common.get_hash(id1)),))
+        connection.close()
+
+        interval = bookmark_db.CHECK_INTERVAL
+        bookmark_db.CHECK_INTERVAL = 0.0
+        try:
+            self.assertEqual(self.db.value(id1, u'flags'), 8)
+        finally:
+            bookmark_db.CHECK_INTERVAL = interval
+
+    def test_queue_value(self):
+        import sqlite3
+        import bookmarks.common as common
+        import bookmarks.bookmark_db as bookmark_db
+
+        self.assertTrue(self.db.flush())
+        writer = self.db._writer
+        generation = writer.generation
+
+        sources = [u'queue.{}.key'.format(n) for n in xrange(300)]
+        for n, source in enumerate(sources):
+            self.db.queue_value(source, u'flags', n)
+            self.db.queue_value(source, u'flags', n + 1)
+        self.db.queue_value(sources[0], u'description', u'queued')
+
+        # The queued values are returned before they're written
+        self.assertEqual(self.db.value(sources[0], u'flags'), 1)
+        self.assertEqual(self.db.value(sources[-1], u'flags'), 300)
+        self.assertEqual(
+            self.db.cached_value(sources[0], u'description'), u'queued')
+
+        self.assertTrue(self.db.flush(10.0))
+        self.assertEqual(len(writer), 0)
+        self.assertGreater(writer.generation, generation)
+        self.assertLess(writer.generation - generation, 10)
+
+        connection = sqlite3.connect(self.db._database_path)
+        for n, source in enumerate(sources):
+            v = connection.execute(
+                'SELECT flags FROM data WHERE id=?',
+                (bookmark_db.get_key(common.get_hash(source)),)).fetchone()
+            self.assertEqual(v[0], n + 1)
+        connection.close()
+        self.assertEqual(self.db.value(sources[-1], u'flags'), 300)
+
+        # Values set directly replace the queued values
+        self.db.queue_value(sources[0], u'notes', u'queued')
+        self.db.setValue(sources[0], u'notes', u'set')
+        self.assertTrue(self.db.flush(10.0))
+        self.assertEqual(self.db.value(sources[0], u'notes'), u'set')
+
+        with self.assertRaises(ValueError):
+            self.db.queue_value(sources[0], u'bogus', 1)
+
+    def test_set_values(self):
+        import bookmarks.common as common
+        import bookmarks.bookmark_db as bookmark_db
+
+        upsert = bookmark_db.UPSERT
+        try:
+            for v in (True, False):
+                bookmark_db.UPSERT = v
+
+                prefix = u'set_values.{}'.format(v)
+                self.db.setValue(prefix + u'.0', u'description', u'kept')
+
+                rows = dict(
+                    (u'{}.{}'.format(prefix, n), {u'flags': n})
+                    for n in xrange(1000)
+                )
+                rows[prefix + u'.0'] = {u'flags': 1, u'notes': u'It\'s'}
+                self.db.setValues(rows)
+
+                self.assertEqual(self.db.value(prefix + u'.0', u'flags'), 1)
+                self.assertEqual(self.db.value(prefix + u'.0', u'notes'), u'It\'s')
+                self.assertEqual(
+                    self.db.value(prefix + u'.0', u'description'), u'kept')
+                self.assertEqual(
+                    self.db.value(prefix + u'.999', u'flags'), 999)
+                self.assertIsNone(
+                    self.db.value(prefix + u'.999', u'description'))
+
+                with self.db.transactions():
+                    self.db.setValues({prefix + u'.1': {u'notes': None}})
+                self.assertIsNone(self.db.value(prefix + u'.1', u'notes'))
+                self.assertEqual(self.db.value(prefix + u'.1', u'flags'), 1)
+        finally:
+            bookmark_db.UPSERT = upsert
+
+        with self.assertRaises(ValueError):
+            self.db.setValues({u'set_values.key': {u'bogus': 1}})
+        with self.assertRaises(TypeError):
+            self.db.setValues({'set_values.key': {u'flags': 1}})
+
+    def test_migrate(self):
+        import os
+        import time
+        import json
+        import base64
+        import sqlite3
+        import bookmarks.common as common
+        import bookmarks.bookmark_db as bookmark_db
+
+        # A database using the version 1 layout
+        path = u'{}/migrate/.bookmark'.format(self.root_dir)
+        os.makedirs(path)
+        v1_path = u'{}/{}'.format(path, bookmark_db.V1_DATABASE)
+        connection = sqlite3.connect(v1_path, isolation_level=None)
+        connection.execute("""
+CREATE TABLE data (
+    id TEXT PRIMARY KEY COLLATE NOCASE,
+    description TEXT,
+    notes TEXT,
+    flags INTEGER DEFAULT 0,
+    thumbnail_stamp REAL,
+    user TEXT
+);
+        """)
+        notes = base64.b64encode(json.dumps({
+            u'0': {u'text': u'todo', u'checked': False},
+            u'1': {u'text': u'done', u'checked': True},
+            u'2': {u'text': u'', u'checked': False},
+        }))
+        sources = [u'migrate.{}.key'.format(n) for n in xrange(10)]
+        for n, source in enumerate(sources):
+            connection.execute(
+                'INSERT INTO data (id, description, notes, flags) VALUES (?, ?, ?, ?)',
+                (common.get_hash(source).upper(), u'Description {}'.format(n),
+                 notes if n % 2 else None, n)
+            )
+        connection.execute('INSERT INTO data (id, description) VALUES (\'invalid\', \'\')')
+        connection.close()
+
+        db = bookmark_db.BookmarkDB(self.server, self.job, u'migrate')
+        version = db.connection().execute('PRAGMA user_version;').fetchone()[0]
+        self.assertEqual(version, bookmark_db.SCHEMA_VERSION)
+        self.assertTrue(os.path.isfile(
+            u'{}/{}'.format(path, bookmark_db.DATABASE)))
+
+        for n, source in enumerate(sources):
+            self.assertEqual(
+                db.value(source, u'description'), u'Description {}'.format(n))
+            self.assertEqual(db.value(source, u'flags'), n)
+            self.assertEqual(db.value(source, u'notes'), notes if n % 2 else None)
+            self.assertEqual(db.value(source, u'todo_count'), 1 if n % 2 else None)
+        self.assertEqual(len(db.values(u'description')), len(sources))
+        self.assertEqual(db.todo_count(), 5)
+
+        # Saving notes updates the number of todos
+        db.setValue(sources[0], u'notes', notes)
+        self.assertEqual(db.value(sources[0], u'todo_count'), 1)
+        self.assertEqual(db.cached_value(sources[0], u'todo_count'), 1)
+        self.assertEqual(db.todo_count(), 6)
+
+        # Opening the migrated database again doesn't change it
+        db = bookmark_db.BookmarkDB(self.server, self.job, u'migrate')
+        self.assertEqual(db.value(sources[1], u'todo_count'), 1)
+        self.assertEqual(db.todo_count(), 6)
+
+        # The version 1 database can still be used by earlier versions
+        connection = sqlite3.connect(v1_path, isolation_level=None)
+        version = connection.execute('PRAGMA user_version;').fetchone()[0]
+        self.assertEqual(version, 0)
+        rows = connection.execute('SELECT id, description FROM data').fetchall()
+        self.assertEqual(len(rows), len(sources) + 1)
+        self.assertIn(
+            (common.get_hash(sources[0]).upper(), u'Description 0'), rows)
+
+        # The rows changed by earlier versions are copied again...
+        db.setValue(sources[2], u'description', u'Version 2')
+        db.setValue(sources[3], u'description', u'Version 2')
+        connection.execute(
+            'UPDATE data SET description=?, notes=? WHERE id=?',
+            (u'Version 1', None, common.get_hash(sources[3]).upper()))
+        connection.close()
+        t = time.time() + 10.0
+        os.utime(v1_path, (t, t))
+
+        self.assertTrue(db.sync())
+        self.assertFalse(db.sync())
+        self.assertEqual(db.value(sources[3], u'description'), u'Version 1')
+        self.assertIsNone(db.value(sources[3], u'notes'))
+        self.assertEqual(db.todo_count(), 5)
+
+        # ...but the unchanged rows keep their version 2 values
+        self.assertEqual(db.value(sources[2], u'description'), u'Version 2')
+        self.assertEqual(db.value(sources[0], u'todo_count'), 1)
+
+        self.assertIsNone(bookmark_db.get_key(u'invalid'))
+        self.assertEqual(bookmark_db.get_key(1), 1)
+        self.assertIsInstance(
+            bookmark_db.get_key(common.get_hash(sources[0])), (int, long))
+
+    def test_thumbnail_stamp(self):
+        import os
+        import time
+        import _scandir
+        from PySide2 import QtCore
+        import bookmarks.common as common
+        import bookmarks.threads as threads
+
+        path = u'{}/{}/stamp.png'.format(self.root_dir, self.bookmarks[0])
+
+        def data():
+            entry = [f for f in _scandir.scandir(os.path.dirname(path))
+                     if f.name == u'stamp.png'][0]
+            return {
+                QtCore.Qt.StatusTipRole: path,
+                common.ParentPathRole: (self.server, self.job, self.bookmarks[0]),
+                common.EntryRole: [entry, ],
+            }
+
+        with open(path, 'w') as f:
+            f.write('a')
+
+        worker = threads.ThumbnailWorker(threads.FileThumbnailQueue)
+        self.assertFalse(worker.is_stale(data(), path))
+        worker.save_stamp(data(), path)
+        self.assertTrue(self.db.flush(10.0))
+        self.assertFalse(worker.is_stale(data(), path))
+
+        # The source is rewritten after its thumbnail was made
+        time.sleep(0.01)
+        with open(path, 'w') as f:
+            f.write('abc')
+        self.assertTrue(worker.is_stale(data(), path))
+
+        # Thumbnails set by the user are kept
+        self.db.queue_value(path, u'mtime', None)
+        self.db.queue_value(path, u'size', None)
+        self.assertFalse(worker.is_stale(data(), path))
+
     def test_db_key(self):
         k = u'description'
         id1 = u'ŰNICÓDE.key'
@@ -552,6 +1657,143 @@ class TestImages(BaseCase):
         self.assertIsInstance(image, QtGui.QImage)
         self.assertNotEqual(image.isNull(), None)
 
+    def test_get_image_threads(self):
+        import threading
+        import bookmarks.common as common
+        import bookmarks.images as images
+        from PySide2 import QtGui
+
+        source = unicode(self.source)
+        hash = common.get_hash(source)
+        images.ImageCache.flush(source)
+
+        results = []
+        def get_image(size):
+            image = images.ImageCache.get_image(source, size)
+            results.append(isinstance(image, QtGui.QImage))
+
+        threads = [
+            threading.Thread(target=get_image, args=(16 + (n % 4), ))
+            for n in xrange(16)
+        ]
+        for thread in threads:
+            thread.start()
+        # Reading from the gui thread while the workers are writing
+        while any(f.is_alive() for f in threads):
+            images.ImageCache.value(hash, images.ImageType, size=16)
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [True, ] * 16)
+        self.assertEqual(
+            sorted(images.ImageCache.value(hash, images.ImageType)),
+            [16, 17, 18, 19]
+        )
+
+    def test_pixmap_uploader(self):
+        import threading
+        import bookmarks.common as common
+        import bookmarks.images as images
+        from PySide2 import QtWidgets
+
+        source = unicode(self.source)
+        hash = common.get_hash(source)
+        images.ImageCache.flush(source)
+        uploader = images.get_uploader()
+        uploader.process(budget=1000)
+
+        # Images loaded by the worker threads are queued...
+        thread = threading.Thread(
+            target=images.ImageCache.get_image, args=(source, 32))
+        thread.start()
+        thread.join()
+        self.assertEqual(len(uploader), 1)
+        self.assertIsNone(
+            images.ImageCache.value(hash, images.PixmapType, size=32))
+
+        # ...and converted by the gui thread
+        QtWidgets.QApplication.instance().processEvents()
+        self.assertTrue(uploader.timer.isActive())
+        self.assertEqual(uploader.process(budget=1000), 1)
+        self.assertFalse(uploader.timer.isActive())
+        pixmap = images.ImageCache.value(hash, images.PixmapType, size=32)
+        self.assertIsNotNone(pixmap)
+
+        # Forced reloads replace the cached pixmap
+        thread = threading.Thread(
+            target=images.ImageCache.get_image, args=(source, 32),
+            kwargs={'force': True})
+        thread.start()
+        thread.join()
+        self.assertEqual(uploader.process(budget=1000), 1)
+        self.assertIsNot(
+            images.ImageCache.value(hash, images.PixmapType, size=32), pixmap)
+
+    def test_thumbnail_farm(self):
+        import os
+        import bookmarks.thumbnailfarm as thumbnailfarm
+
+        farm = thumbnailfarm.Farm(processes=1)
+        destination = u'{}/farm_thumbnail.png'.format(self.root_dir)
+        try:
+            success, rgba = farm.submit(self.source, destination, 64)
+            self.assertTrue(success)
+            self.assertTrue(os.path.isfile(destination))
+            self.assertEqual(len(rgba), 4)
+
+            success, rgba = farm.submit(u'bogus_path.png', destination, 64)
+            self.assertFalse(success)
+            self.assertIsNone(rgba)
+
+            # A dead worker process is replaced by the next job
+            farm._processes[0].process.terminate()
+            farm._processes[0].process.join()
+            success, _ = farm.submit(self.source, destination, 64)
+            self.assertTrue(success)
+        finally:
+            farm.shutdown()
+        self.assertIsNone(farm._processes[0].process)
+
+    def test_thumbnail_farm_host(self):
+        import bookmarks.common as common
+        import bookmarks.settings as settings
+
+        # sys.executable is the host application when not standalone
+        settings.local_settings.setValue(u'preferences/thumbnail_farm', True)
+        standalone = common.STANDALONE
+        try:
+            common.STANDALONE = True
+            self.assertTrue(common.thumbnail_farm())
+            common.STANDALONE = False
+            self.assertFalse(common.thumbnail_farm())
+        finally:
+            common.STANDALONE = standalone
+            settings.local_settings.setValue(
+                u'preferences/thumbnail_farm', False)
+
+    def test_thumbnail_farm_executable(self):
+        import os
+        import sys
+        import bookmarks.thumbnailfarm as thumbnailfarm
+
+        # The standalone launcher on Windows isn't a Python interpreter
+        platform = sys.platform
+        executable = sys.executable
+        try:
+            sys.platform = 'win32'
+            sys.executable = u'{}/bookmarks.exe'.format(self.root_dir)
+            self.assertIsNone(thumbnailfarm.get_executable())
+
+            path = os.path.join(self.root_dir, u'pythonw.exe')
+            open(path, 'w').close()
+            self.assertEqual(thumbnailfarm.get_executable(), path)
+
+            sys.executable = path
+            self.assertEqual(thumbnailfarm.get_executable(), path)
+        finally:
+            sys.platform = platform
+            sys.executable = executable
+
     def test_get_placeholder_path(self):
         import bookmarks.images as images
         from PySide2 import QtGui
@@ -771,6 +2013,17 @@ if __name__ == '__main__':
     cases = (
         loader.loadTestsFromTestCase(TestDependencies),
         loader.loadTestsFromTestCase(TestScandir),
+        loader.loadTestsFromTestCase(TestFileIndex),
+        loader.loadTestsFromTestCase(TestIndexServer),
+        loader.loadTestsFromTestCase(TestRowData),
+        loader.loadTestsFromTestCase(TestLazyFetch),
+        loader.loadTestsFromTestCase(TestWorkQueue),
+        loader.loadTestsFromTestCase(TestRowBatch),
+        loader.loadTestsFromTestCase(TestScrollTracker),
+        loader.loadTestsFromTestCase(TestShardedCache),
+        loader.loadTestsFromTestCase(TestQueueStats),
+        loader.loadTestsFromTestCase(TestSequence),
+        loader.loadTestsFromTestCase(TestStatCache),
         loader.loadTestsFromTestCase(TestImages),
         loader.loadTestsFromTestCase(TestSQLite),
         loader.loadTestsFromTestCase(TestLocalSettings),
@@ -0,0 +1,917 @@
+# -*- coding: utf-8 -*-
+"""Bookmarks benchmarks.
+
+The benchmarks print their timings and only fail when the optimised
+implementation returns different results, or when it is dramatically slower
+than the implementation it replaces.
+
+"""
+import unittest
+import time
+
+
+def timeit(func, *args, **kwargs):
+    """Returns the time it took to run `func` and its return value."""
+    t = time.time()
+    v = func(*args, **kwargs)
+    return time.time() - t, v
+
+
+class BaseBenchmark(unittest.TestCase):
+    """Base benchmark class. Creates and removes a temporary directory."""
+    root_dir = None
+
+    @classmethod
+    def setUpClass(cls):
+        import tempfile
+        cls.root_dir = tempfile.mkdtemp(prefix=u'bookmarks_benchmark_')
+
+    @classmethod
+    def tearDownClass(cls):
+        import shutil
+        shutil.rmtree(cls.root_dir, ignore_errors=True)
+
+    def report(self, label, t, n=None):
+        if n is None:
+            print u'\n{:<48}{:>10.4f}s'.format(label, t),
+        else:
+            print u'\n{:<48}{:>10.4f}s {:>12} items'.format(label, t, n),
+
+
+class TestWalkerBenchmark(BaseBenchmark):
+    """Compares the serial `common.walk` with the concurrent `walker.walk`."""
+    shots = 48
+    folders = (u'render', u'comp', u'plates', u'cache')
+    frames = 24
+
+    @classmethod
+    def setUpClass(cls):
+        import os
+        super(TestWalkerBenchmark, cls).setUpClass()
+
+        for n in xrange(cls.shots):
+            for folder in cls.folders:
+                path = u'{}/sh{:04d}/{}/v001'.format(cls.root_dir, n, folder)
+                os.makedirs(path)
+                for frame in xrange(cls.frames):
+                    name = u'{}/sh{:04d}_{}.{:04d}.exr'.format(
+                        path, n, folder, frame)
+                    open(name, 'w').close()
+
+    def test_walk(self):
+        import bookmarks.common as common
+        import bookmarks.walker as walker
+
+        t, v = timeit(lambda: sorted(f.path for f in common.walk(self.root_dir)))
+        self.report(u'common.walk()', t, len(v))
+        expected = v
+
+        for threads in (1, 4, 16):
+            t, v = timeit(lambda: sorted(
+                f.path for f in walker.walk(self.root_dir, threads=threads)))
+            self.report(u'walker.walk(threads={})'.format(threads), t, len(v))
+            self.assertEqual(v, expected)
+
+    def test_walk_latency(self):
+        """Simulates the round-trip latency of a network share."""
+        import bookmarks.walker as walker
+
+        def visit(path):
+            time.sleep(0.002)
+            return walker._list_dir(path)
+
+        def run(threads):
+            n = 0
+            for files in walker.iterdirs(self.root_dir, visit, threads=threads):
+                n += len(files)
+            return n
+
+        serial, n = timeit(run, 1)
+        self.report(u'walker.iterdirs(threads=1), 2ms latency', serial, n)
+
+        for threads in (4, 16, 32):
+            t, v = timeit(run, threads)
+            self.report(
+                u'walker.iterdirs(threads={}), 2ms latency'.format(threads), t, v)
+            self.assertEqual(v, n)
+        self.assertLess(t, serial)
+
+    def test_interrupt(self):
+        import bookmarks.walker as walker
+
+        n = [0, ]
+
+        def interrupt():
+            return n[0] >= 10
+
+        for _ in walker.walk(self.root_dir, threads=8, interrupt=interrupt):
+            n[0] += 1
+        self.assertLess(n[0], self.shots * len(self.folders) * self.frames)
+
+
+class TestSequenceBenchmark(BaseBenchmark):
+    """Compares matching and grouping a million file names with the
+    per-file regex and `common.get_ranges`.
+
+    """
+    sequences = 1000
+    frames = 1000
+
+    @classmethod
+    def setUpClass(cls):
+        import random
+        super(TestSequenceBenchmark, cls).setUpClass()
+
+        cls.paths = [
+            u'//server/job/root/asset/render/sh{0:04d}/v001/sh{0:04d}_beauty.{1:04d}.exr'.format(
+                n, frame)
+            for n in xrange(cls.sequences) for frame in xrange(cls.frames)
+        ]
+        random.seed(0)
+        random.shuffle(cls.paths)
+
+    def test_group(self):
+        import bookmarks.sequence as sequence
+
+        # The reference implementation
+        regex = sequence.SequenceRegex
+
+        def run():
+            d = {}
+            for path in self.paths:
+                seq = regex.search(path)
+                k = seq.group(1) + u'[0]' + seq.group(3) + u'.' + seq.group(4)
+                if k not in d:
+                    d[k] = []
+                d[k].append(seq.group(2))
+
+            for frames in d.itervalues():
+                intframes = [int(f) for f in frames]
+                padding = len(frames[0])
+                _get_ranges(intframes, padding)
+                min(intframes)
+                max(intframes)
+            return d
+
+        serial, expected = timeit(run)
+        self.report(u'regex.search() and get_ranges()', serial, len(self.paths))
+
+        def run():
+            sequences, _ = sequence.group(self.paths)
+            for seq in sequences:
+                seq.ranges()
+                seq.startpath()
+                seq.endpath()
+            return sequences
+
+        t, sequences = timeit(run)
+        self.report(u'sequence.group() and Sequence.ranges()', t, len(self.paths))
+
+        self.assertEqual(len(sequences), len(expected))
+        for seq in sequences:
+            self.assertEqual(
+                sorted(seq.frames.tolist()),
+                sorted(int(f) for f in expected[seq.path()])
+            )
+        self.assertLess(t, serial)
+
+    def test_match(self):
+        import bookmarks.sequence as sequence
+
+        regex = sequence.SequenceRegex
+        serial, _ = timeit(lambda: [regex.search(f) for f in self.paths])
+        self.report(u'regex.search()', serial, len(self.paths))
+
+        t, _ = timeit(sequence.match, self.paths)
+        self.report(u'sequence.match()', t, len(self.paths))
+        self.assertLess(t, serial)
+
+
+class TestRowDataBenchmark(BaseBenchmark):
+    """Compares the memory used by a million `DataDict` and `RowData` rows."""
+    rows = 1000000
+
+    def _make_rows(self, cls):
+        from PySide2 import QtCore
+        import bookmarks.common as common
+
+        size = QtCore.QSize(1, 40)
+        parent_path = (u'server', u'job', u'root', u'asset', u'render', u'')
+        return [
+            cls({
+                QtCore.Qt.DisplayRole: u'file.ma',
+                QtCore.Qt.EditRole: u'file.ma',
+                QtCore.Qt.StatusTipRole: u'//server/job/root/asset/render/file.ma',
+                QtCore.Qt.SizeHintRole: size,
+                #
+                common.EntryRole: [],
+                common.FlagsRole: 0,
+                common.ParentPathRole: parent_path,
+                common.DescriptionRole: u'',
+                common.TodoCountRole: 0,
+                common.FileDetailsRole: u'',
+                common.SequenceRole: None,
+                common.FramesRole: [],
+                common.FileInfoLoaded: False,
+                common.StartpathRole: None,
+                common.EndpathRole: None,
+                #
+                common.ThumbnailLoaded: False,
+                #
+                common.TypeRole: common.FileItem,
+                #
+                common.SortByNameRole: [],
+                common.SortByLastModifiedRole: 0,
+                common.SortBySizeRole: 0,
+                #
+                common.IdRole: idx
+            }) for idx in xrange(self.rows)
+        ]
+
+    def _measure(self, cls):
+        import gc
+        import psutil
+
+        process = psutil.Process()
+        gc.collect()
+        rss = process.memory_info().rss
+        t, rows = timeit(self._make_rows, cls)
+        mem = process.memory_info().rss - rss
+        self.report(u'{}() memory: {:.1f}MB'.format(
+            cls.__name__, mem / 1024.0 / 1024.0), t, len(rows))
+        return mem, rows
+
+    def test_memory(self):
+        import weakref
+        from PySide2 import QtCore
+        import bookmarks.common as common
+
+        mem, _rows = self._measure(common.DataDict)
+        del _rows
+        _mem, rows = self._measure(common.RowData)
+
+        t, _ = timeit(lambda: [f.get(QtCore.Qt.DisplayRole) for f in rows])
+        self.report(u'RowData.get()', t, len(rows))
+
+        ref = weakref.ref(rows[0])
+        self.assertEqual(ref()[common.IdRole], 0)
+        self.assertLess(_mem, mem)
+
+
+class TestSortBenchmark(BaseBenchmark):
+    """Times sorting and switching the sort role and order of a model."""
+    rows = 200000
+
+    def test_sort(self):
+        import random
+        from PySide2 import QtCore
+        import bookmarks.common as common
+        import bookmarks.lists as lists
+        import bookmarks.threads as threads
+
+        class Model(lists.BaseModel):
+            queue_type = threads.FileInfoQueue
+
+        model = Model(has_threads=False)
+        data = model.model_data()
+
+        random.seed(0)
+        t, _ = timeit(lambda: [
+            common.namekey(u'//server/job/root/asset/file_{}.ma'.format(n))
+            for n in xrange(self.rows)
+        ])
+        self.report(u'common.namekey()', t, self.rows)
+
+        for idx in xrange(self.rows):
+            name = u'file_{}.ma'.format(random.randint(0, self.rows))
+            data[idx] = common.RowData({
+                QtCore.Qt.StatusTipRole: name,
+                common.SortByNameRole: common.namekey(name),
+                common.SortBySizeRole: random.randint(0, 1024 ** 3),
+                common.SortByLastModifiedRole: random.random(),
+                common.IdRole: idx,
+            })
+
+        roles = (
+            common.SortByNameRole,
+            common.SortBySizeRole,
+            common.SortByLastModifiedRole
+        )
+        sort_times = []
+        switch_times = []
+        for times in (sort_times, switch_times):
+            for role in roles:
+                for order in (False, True):
+                    model.set_sort_role(role)
+                    model.set_sort_order(order)
+                    t, _ = timeit(model.sort_data)
+                    times.append(t)
+
+                    data = model.model_data()
+                    keys = [data[n][role] for n in xrange(len(data))]
+                    self.assertEqual(keys, sorted(keys, reverse=order))
+                    self.assertEqual(
+                        [data[n][common.IdRole] for n in xrange(len(data))],
+                        range(len(data))
+                    )
+
+        self.report(u'sort_data()', max(sort_times), self.rows)
+        self.report(u'sort_data(), cached', max(switch_times), self.rows)
+        self.assertLess(max(switch_times), max(sort_times))
+
+
+class TestStatCacheBenchmark(BaseBenchmark):
+    """Compares stat'ing each frame with the batched and cached `statcache`."""
+    dirs = 4
+    frames = 5000
+
+    @classmethod
+    def setUpClass(cls):
+        import os
+        super(TestStatCacheBenchmark, cls).setUpClass()
+
+        cls.paths = []
+        for n in xrange(cls.dirs):
+            path = u'{}/v{:03d}'.format(cls.root_dir, n)
+            os.makedirs(path)
+            for frame in xrange(cls.frames):
+                name = u'{}/shot_beauty.{:04d}.exr'.format(path, frame)
+                with open(name, 'wb') as f:
+                    f.write('x' * (1000 + frame % 100))
+                cls.paths.append(name)
+
+    def setUp(self):
+        import bookmarks.statcache as statcache
+        statcache.reset()
+
+    def _stat(self):
+        import os
+        size = 0
+        mtime = 0
+        for path in self.paths:
+            stat = os.stat(path)
+            size += stat.st_size
+            mtime = stat.st_mtime if stat.st_mtime > mtime else mtime
+        return size, mtime
+
+    def test_stat_sequence(self):
+        import bookmarks.statcache as statcache
+
+        t, expected = timeit(self._stat)
+        self.report(u'os.stat() per frame', t, len(self.paths))
+
+        t, v = timeit(statcache.stat_sequence, self.paths)
+        self.report(u'statcache.stat_sequence(), cold', t, len(self.paths))
+        self.assertEqual(v, expected + (False, ))
+
+        t, v = timeit(statcache.stat_sequence, self.paths)
+        self.report(u'statcache.stat_sequence(), cached', t, len(self.paths))
+        self.assertEqual(v, expected + (False, ))
+
+    def test_sample(self):
+        import bookmarks.statcache as statcache
+
+        size, _ = self._stat()
+        t, v = timeit(statcache.stat_sequence, self.paths, sample=True)
+        self.report(u'statcache.stat_sequence(sample=True)', t, len(self.paths))
+        self.assertTrue(v[2])
+        self.assertAlmostEqual(float(v[0]) / size, 1.0, places=1)
+
+
+class TestWorkQueueBenchmark(BaseBenchmark):
+    """Measures the throughput of a worker pool sharing a `WorkQueue`.
+
+    Each item simulates 2ms of file system latency.
+
+    """
+    items = 1000
+
+    def _run(self, workers):
+        import threading
+        import weakref
+        import bookmarks.common as common
+        import bookmarks.threads as threads
+
+        rows = [common.RowData({common.IdRole: n}) for n in xrange(self.items)]
+        q = threads.WorkQueue()
+        for row in rows:
+            q.put(weakref.ref(row), priority=threads.ModelPriority)
+
+        done = []
+
+        def worker():
+            while True:
+                try:
+                    ref = q.pop()
+                except IndexError:
+                    return
+                k = q.claim(ref)
+                if k is None:
+                    continue
+                time.sleep(0.002)
+                done.append(ref)
+                q.release(k)
+
+        pool = [threading.Thread(target=worker) for _ in xrange(workers)]
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        return len(done)
+
+    def test_pool(self):
+        serial, n = timeit(self._run, 1)
+        self.report(u'WorkQueue, 1 worker', serial, n)
+        self.assertEqual(n, self.items)
+
+        for workers in (2, 4, 8):
+            t, v = timeit(self._run, workers)
+            self.report(u'WorkQueue, {} workers'.format(workers), t, v)
+            self.assertEqual(v, self.items)
+        self.assertLess(t, serial)
+
+
+class TestWorkerLatencyBenchmark(BaseBenchmark):
+    """Measures the time between adding an item to an idle worker's queue and
+    the worker's `updateRow` signal.
+
+    The old workers polled their queue every 333ms. The polling is simulated
+    by a plain thread to compare the two.
+
+    """
+    items = 10
+    interval = 0.333
+
+    @classmethod
+    def setUpClass(cls):
+        from PySide2 import QtWidgets
+        super(TestWorkerLatencyBenchmark, cls).setUpClass()
+        cls.app = QtWidgets.QApplication.instance()
+        if not cls.app:
+            cls.app = QtWidgets.QApplication([])
+
+    def _measure(self, put, emitted):
+        import random
+        latencies = []
+        for n in xrange(self.items):
+            # Let the worker go idle
+            time.sleep(random.uniform(0.05, 0.15))
+            emitted.clear()
+            t = time.time()
+            put(n)
+            self.assertTrue(emitted.wait(5.0))
+            latencies.append(emitted.t - t)
+        return sum(latencies) / len(latencies)
+
+    def _event(self):
+        import threading
+        event = threading.Event()
+        event.t = None
+
+        def emit(*args):
+            event.t = time.time()
+            event.set()
+        event.emit = emit
+        return event
+
+    def test_polling(self):
+        import threading
+        import weakref
+        import bookmarks.common as common
+        import bookmarks.threads as threads
+
+        q = threads.WorkQueue()
+        rows = []
+        emitted = self._event()
+        stop = []
+
+        def poll():
+            while not stop:
+                while len(q):
+                    try:
+                        ref = q.pop()
+                    except IndexError:
+                        break
+                    emitted.emit(ref()[common.IdRole])
+                time.sleep(self.interval)
+
+        thread = threading.Thread(target=poll)
+        thread.start()
+
+        def put(n):
+            rows.append(common.RowData({common.IdRole: n}))
+            q.put(weakref.ref(rows[-1]))
+
+        try:
+            t = self._measure(put, emitted)
+        finally:
+            stop.append(True)
+            thread.join()
+        self.report(u'Polling every {}s, mean latency'.format(self.interval), t, self.items)
+        self.assertGreater(t, 0.01)
+
+    def test_wakeup(self):
+        import weakref
+        from PySide2 import QtCore
+        import bookmarks.common as common
+        import bookmarks.threads as threads
+
+        q = threads.QUEUES[threads.TaskFolderInfoQueue]
+        q.clear()
+        batch = threads.BATCHES[threads.TaskFolderInfoQueue]
+        batch.take()
+        rows = []
+        emitted = self._event()
+
+        # updateRow is only emitted for the first row of a batch
+        def flush(idx):
+            batch.take()
+            emitted.emit(idx)
+
+        worker = threads.BaseWorker(threads.TaskFolderInfoQueue)
+        worker.updateRow.connect(flush, QtCore.Qt.DirectConnection)
+        thread = threads.BaseThread(worker)
+        thread.start()
+        thread.startCheckQueue.emit()
+
+        def put(n):
+            rows.append(common.RowData({common.IdRole: n}))
+            thread.add_to_queue(weakref.ref(rows[-1]))
+
+        try:
+            t = self._measure(put, emitted)
+        finally:
+            thread.quit()
+            thread.wait()
+        self.report(u'Event-driven wakeup, mean latency', t, self.items)
+        self.assertLess(t, 0.05)
+
+
+class TestPixmapUploadBenchmark(BaseBenchmark):
+    """Measures the time spent converting thumbnails to pixmaps in a frame.
+
+    Converting in `ImageCache.get_pixmap()` is compared with converting them
+    beforehand with the `PixmapUploader`, when the gui thread is idle.
+
+    """
+    rows = 48
+    size = 128
+
+    @classmethod
+    def setUpClass(cls):
+        from PySide2 import QtWidgets
+        super(TestPixmapUploadBenchmark, cls).setUpClass()
+        cls.app = QtWidgets.QApplication.instance()
+        if not cls.app:
+            cls.app = QtWidgets.QApplication([])
+
+    def _images(self, prefix):
+        from PySide2 import QtGui
+        import bookmarks.common as common
+        import bookmarks.images as images
+
+        paths = []
+        for n in xrange(self.rows):
+            path = u'{}/{}_{}.png'.format(self.root_dir, prefix, n)
+            image = QtGui.QImage(
+                self.size, self.size, QtGui.QImage.Format_RGB888)
+            image.fill(QtGui.QColor(n, n, n))
+            images.ImageCache.setValue(
+                common.get_hash(path), image, images.ImageType, size=self.size)
+            paths.append(path)
+        return paths
+
+    def _frame(self, paths):
+        import bookmarks.images as images
+        return [images.ImageCache.get_pixmap(f, self.size) for f in paths]
+
+    def test_upload(self):
+        import bookmarks.common as common
+        import bookmarks.images as images
+
+        paths = self._images(u'paint')
+        t, v = timeit(self._frame, paths)
+        self.report(u'Frame converting in paint', t, len(v))
+        before = t
+
+        paths = self._images(u'idle')
+        uploader = images.get_uploader()
+        for path in paths:
+            uploader.request(common.get_hash(path), self.size)
+
+        slices = []
+        while len(uploader):
+            slices.append(timeit(uploader.process)[0])
+        self.report(u'Idle uploads, {} slices, longest'.format(len(slices)), max(slices))
+
+        t, v = timeit(self._frame, paths)
+        self.report(u'Frame after idle uploads', t, len(v))
+        self.assertTrue(all(v))
+        self.assertLess(t, before)
+        self.assertLess(max(slices), images.UPLOAD_BUDGET / 1000.0 * 4)
+
+
+class TestBookmarkDBBenchmark(BaseBenchmark):
+    """Measures `BookmarkDB.value()` calls per second.
+
+    The string formatted queries `value()` used to run are compared with the
+    parameterised statements, with and without the row cache.
+
+    """
+    rows = 500
+    calls = 5
+
+    @classmethod
+    def setUpClass(cls):
+        import os
+        from PySide2 import QtWidgets
+        super(TestBookmarkDBBenchmark, cls).setUpClass()
+        cls.app = QtWidgets.QApplication.instance()
+        if not cls.app:
+            cls.app = QtWidgets.QApplication([])
+        os.makedirs(u'{}/server/job/root'.format(cls.root_dir))
+
+    def test_value(self):
+        import bookmarks.common as common
+        import bookmarks.bookmark_db as bookmark_db
+
+        db = bookmark_db.BookmarkDB(
+            u'{}/server'.format(self.root_dir), u'job', u'root')
+        sources = [u'{}/file_{}.png'.format(self.root_dir, n)
+                   for n in xrange(self.rows)]
+        with db.transactions():
+            for n, source in enumerate(sources):
+                db.setValue(source, u'description', u'Description {}'.format(n))
+
+        def formatted():
+            _cursor = db.connection().cursor()
+            v = []
+            for _ in xrange(self.calls):
+                for source in sources:
+                    sql = u'SELECT description FROM data WHERE id={}'.format(
+                        bookmark_db.get_key(common.get_hash(source)))
+                    _cursor.execute(sql.encode('utf-8'))
+                    res = _cursor.fetchone()
+                    v.append(res[0] if res else None)
+            _cursor.close()
+            return v
+
+        def parameterised():
+            v = []
+            for _ in xrange(self.calls):
+                db._rows.clear()
+                for source in sources:
+                    v.append(db.value(source, u'description'))
+            return v
+
+        def cached():
+            return [db.value(source, u'description')
+                    for _ in xrange(self.calls) for source in sources]
+
+        n = self.rows * self.calls
+        t, expected = timeit(formatted)
+        self.report(u'Formatted value(), calls/s', n / t, n)
+
+        t, v = timeit(parameterised)
+        self.report(u'Parameterised value(), calls/s', n / t, n)
+        self.assertEqual(v, expected)
+
+        t, v = timeit(cached)
+        self.report(u'Cached value(), calls/s', n / t, n)
+        self.assertEqual(v, expected)
+
+    def test_queue_value(self):
+        """Toggles the flags of 300 rows, like archiving a selection."""
+        import bookmarks.bookmark_db as bookmark_db
+
+        db = bookmark_db.get_db(
+            u'{}/server'.format(self.root_dir), u'job', u'root')
+        sources = [u'{}/archive_{}.png'.format(self.root_dir, n)
+                   for n in xrange(300)]
+
+        def transactions(flag):
+            for source in sources:
+                with db.transactions():
+                    db.setValue(source, u'flags', flag)
+
+        def queued(flag):
+            for source in sources:
+                db.queue_value(source, u'flags', flag)
+            return db.flush()
+
+        serial, _ = timeit(transactions, 1)
+        self.report(u'setValue(), a transaction per row', serial, len(sources))
+
+        t, v = timeit(queued, 2)
+        self.report(u'queue_value() and flush()', t, len(sources))
+        self.assertTrue(v)
+        self.assertEqual([db.value(f, u'flags') for f in sources], [2, ] * 300)
+        self.assertLess(t, serial)
+
+    def test_set_values(self):
+        """Archives 1000 rows using the subqueries `setValue()` used to run
+        for every row, and `setValues()`.
+
+        """
+        import bookmarks.common as common
+        import bookmarks.bookmark_db as bookmark_db
+
+        db = bookmark_db.get_db(
+            u'{}/server'.format(self.root_dir), u'job', u'root')
+        sources = [u'{}/bulk_{}.png'.format(self.root_dir, n)
+                   for n in xrange(1000)]
+
+        def subqueries(flag):
+            _cursor = db.connection().cursor()
+            with db.transactions():
+                for source in sources:
+                    hash = bookmark_db.get_key(common.get_hash(source))
+                    values = []
+                    params = [hash, ]
+                    for k in bookmark_db.KEYS[u'data']:
+                        if k == u'flags':
+                            values.append(u'?')
+                            params.append(flag)
+                        else:
+                            values.append(
+                                u'(SELECT ' + k + u' FROM data WHERE id=?)')
+                            params.append(hash)
+                    sql = u'INSERT OR REPLACE INTO data (id, {}) VALUES (?, {});'.format(
+                        u', '.join(bookmark_db.KEYS[u'data']), u', '.join(values))
+                    _cursor.execute(sql, params)
+            _cursor.close()
+
+        def upserts(flag):
+            db.setValues(dict((f, {u'flags': flag}) for f in sources))
+
+        serial, _ = timeit(subqueries, 1)
+        self.report(u'INSERT OR REPLACE with subqueries', serial, len(sources))
+
+        t, _ = timeit(upserts, 2)
+        self.report(
+            u'setValues(), UPSERT={}'.format(bookmark_db.UPSERT), t, len(sources))
+        self.assertEqual([db.value(f, u'flags') for f in sources], [2, ] * 1000)
+        self.assertLess(t, serial)
+
+
+class TestSchemaBenchmark(BaseBenchmark):
+    """Compares the size and the read performance of the version 1 and the
+    migrated version 2 database layouts.
+
+    """
+    rows = 50000
+    reads = 10000
+
+    @classmethod
+    def setUpClass(cls):
+        import os
+        import json
+        import base64
+        import sqlite3
+        from PySide2 import QtWidgets
+        import bookmarks.common as common
+        import bookmarks.bookmark_db as bookmark_db
+        super(TestSchemaBenchmark, cls).setUpClass()
+        cls.app = QtWidgets.QApplication.instance()
+        if not cls.app:
+            cls.app = QtWidgets.QApplication([])
+
+        path = u'{}/server/job/root/.bookmark'.format(cls.root_dir)
+        os.makedirs(path)
+        cls.path = u'{}/{}'.format(path, bookmark_db.V1_DATABASE)
+
+        notes = base64.b64encode(json.dumps(dict(
+            (unicode(n), {u'text': u'Todo item {}'.format(n), u'checked': n % 2 == 0})
+            for n in xrange(5)
+        )))
+        cls.sources = [u'{}/server/job/root/file_{}.exr'.format(cls.root_dir, n)
+                       for n in xrange(cls.rows)]
+
+        connection = sqlite3.connect(cls.path, isolation_level=None)
+        connection.execute("""
+CREATE TABLE data (
+    id TEXT PRIMARY KEY COLLATE NOCASE,
+    description TEXT,
+    notes TEXT,
+    flags INTEGER DEFAULT 0,
+    thumbnail_stamp REAL,
+    user TEXT,
+    shotgun_id INTEGER,
+    shotgun_name TEXT,
+    shotgun_type TEXT,
+    cut_duration INT,
+    cut_in INT,
+    cut_out INT,
+    url1 TEXT,
+    url2 TEXT
+);
+        """)
+        connection.execute(u'BEGIN')
+        connection.executemany(
+            u'INSERT INTO data (id, description, notes, flags) VALUES (?, ?, ?, ?)',
+            [(common.get_hash(f), u'Description', notes if n % 10 == 0 else None, n)
+             for n, f in enumerate(cls.sources)]
+        )
+        connection.commit()
+        connection.execute(u'VACUUM')
+        connection.close()
+
+    def test_schema(self):
+        import os
+        import json
+        import base64
+        import random
+        import sqlite3
+        import bookmarks.common as common
+        import bookmarks.bookmark_db as bookmark_db
+
+        random.seed(0)
+        sources = random.sample(self.sources, self.reads)
+        hashes = [common.get_hash(f) for f in sources]
+
+        connection = sqlite3.connect(self.path)
+        size_v1 = os.path.getsize(self.path)
+        self.report(u'Version 1 database size (MB)', size_v1 / 1024.0 / 1024.0)
+
+        def read_v1():
+            return [connection.execute(
+                u'SELECT * FROM data WHERE id=?', (f,)).fetchone()[1]
+                for f in hashes]
+
+        def todos_v1():
+            n = 0
+            for v in connection.execute(u'SELECT notes FROM data'):
+                if not v[0]:
+                    continue
+                d = json.loads(base64.b64decode(v[0]))
+                n += len([k for k in d if d[k][u'text'] and not d[k][u'checked']])
+            return n
+
+        read_serial, expected = timeit(read_v1)
+        self.report(u'Version 1 row reads', read_serial, self.reads)
+        todos_serial, todos = timeit(todos_v1)
+        self.report(u'Version 1 todo count', todos_serial, self.rows)
+        connection.close()
+
+        t, db = timeit(
+            bookmark_db.BookmarkDB,
+            u'{}/server'.format(self.root_dir), u'job', u'root')
+        self.report(u'Migration to version {}'.format(
+            bookmark_db.SCHEMA_VERSION), t, self.rows)
+        size_v2 = os.path.getsize(db._database_path)
+        self.report(u'Version 2 database size (MB)', size_v2 / 1024.0 / 1024.0)
+        self.assertLess(size_v2, size_v1)
+
+        keys = [bookmark_db.get_key(f) for f in hashes]
+        connection = db.connection()
+
+        def read_v2():
+            return [connection.execute(
+                u'SELECT * FROM data WHERE id=?', (f,)).fetchone()[1]
+                for f in keys]
+
+        t, v = timeit(read_v2)
+        self.report(u'Version 2 row reads', t, self.reads)
+        self.assertEqual(v, expected)
+        self.assertLess(t, read_serial)
+
+        t, v = timeit(db.todo_count)
+        self.report(u'Version 2 todo count', t, self.rows)
+        self.assertEqual(v, todos)
+        self.assertLess(t, todos_serial)
+
+
+def _get_ranges(arr, padding):
+    """A copy of `common.get_ranges`, which can't be imported without Qt."""
+    arr = sorted(list(set(arr)))
+    blocks = {}
+    k = 0
+    for idx, n in enumerate(arr):  # blocks
+        zfill = unicode(n).zfill(padding)
+
+        if k not in blocks:
+            blocks[k] = []
+        blocks[k].append(zfill)
+
+        if idx + 1 != len(arr):
+            if arr[idx + 1] != n + 1:  # break coming up
+                k += 1
+    return u','.join([u'-'.join(sorted(list(set([blocks[k][0], blocks[k][-1]])))) for k in blocks])
+
+
+if __name__ == '__main__':
+    loader = unittest.TestLoader()
+    cases = (
+        loader.loadTestsFromTestCase(TestWalkerBenchmark),
+        loader.loadTestsFromTestCase(TestSequenceBenchmark),
+        loader.loadTestsFromTestCase(TestRowDataBenchmark),
+        loader.loadTestsFromTestCase(TestSortBenchmark),
+        loader.loadTestsFromTestCase(TestStatCacheBenchmark),
+        loader.loadTestsFromTestCase(TestWorkQueueBenchmark),
+        loader.loadTestsFromTestCase(TestWorkerLatencyBenchmark),
+        loader.loadTestsFromTestCase(TestPixmapUploadBenchmark),
+        loader.loadTestsFromTestCase(TestBookmarkDBBenchmark),
+        loader.loadTestsFromTestCase(TestSchemaBenchmark),
+    )
+    suite = unittest.TestSuite(cases)
+    unittest.TextTestRunner(verbosity=3).run(suite)